@@ -109,6 +109,18 @@ class Globals:
         self.use_cache = None
         self.pre_test_callback = None
         self.post_test_callback = None
+        self.result_callback = None
+        self.tests = None
+        self.in_subinterpreter = False
+        self.threads = None
+        self.record_footprints = False
+        # The test and conftest files found, and if any of them had to be loaded to run tests, see hammett.manifest
+        self.collected_files = []
+        self.ran_tests = False
+        # The test files that got new results in this run, see hammett.shared_cache
+        self.stored_files = set()
+        # time.monotonic() of the last write_result_db
+        self.result_db_written_at = 0
 
     def reset(self):
         self.__init__()
@@ -267,20 +279,14 @@ class Request:
 
 
 def parse_markers(markers):
+    """
+    Compile the -m expression, see hammett.expression.
+    """
     if markers is None:
         return None
 
-    def parse_one(s):
-        if '[' not in s:
-            return s, None
-
-        assert s.endswith(']')
-        base_name, _, name_plus_end_bracket = s.partition('[')
-        return base_name, name_plus_end_bracket[:-1]
-
-    # So far let's do something stupidly simple
-    markers = markers.split(';')
-    return dict(parse_one(m.strip()) for m in markers)
+    from hammett.expression import compile_expression
+    return compile_expression(markers, 'markers')
 
 
 def guess_modules_and_source_path():
@@ -311,93 +317,231 @@ def is_test_file(f):
     return not f.startswith('.') and f.endswith('.py') and (f.endswith('__tests.py') or f.startswith('test_') or f.endswith('_test.py'))
 
 
-def handle_dir(result, conftest_files, d):
-    for root, dirs, files in os.walk(d):
-        for f in files:
-            if is_test_file(f):
-                result.append(join(root, f) )
-            if f == 'conftest.py':
-                conftest_files.append(join(root, f))
+def test_roots():
+    """
+    The directories where test files are looked for when no files are given.
+    """
+    return ['tests', 'test', 'docs'] + [join(g.source_location, module_name) for module_name in g.modules]
 
 
-def collect_files(filenames):
+def collect_files(filenames, scanned=None):
+    """
+    Returns the test files and the conftest files. Without filenames they're taken from scanned, if it's the scan of
+    the test_roots, see hammett.scan.
+    """
+    from hammett.scan import scan
+    if filenames is None:
+        if scanned is None:
+            scanned = scan(test_roots())
+        return list(scanned.test_files), list(scanned.conftest_files)
+
     result = []
     conftest_files = []
-    if filenames is None:
-        handle_dir(result, conftest_files, f'tests{os.sep}')
-        handle_dir(result, conftest_files, f'test{os.sep}')
-        handle_dir(result, conftest_files, f'docs{os.sep}')
-        for module_name in g.modules:
-            handle_dir(result, conftest_files, join(g.source_location, module_name))
-    else:
-        for filename in filenames:
-            if os.path.exists(filename):
-                if os.path.isdir(filename):
-                    handle_dir(result, conftest_files, filename)
-                else:
-                    result.append(filename)
+    directories = []
+    for filename in filenames:
+        if os.path.exists(filename):
+            if os.path.isdir(filename):
+                directories.append(filename)
             else:
-                # This is a symbol, module or function/class? Try module first.
-                symbol_path = join(g.source_location, filename.replace('.', os.sep))
-                if os.path.exists(symbol_path + '.py'):
-                    result.append(symbol_path + '__tests.py')
-
+                result.append(filename)
+        else:
+            # This is a symbol, module or function/class? Try module first.
+            symbol_path = join(g.source_location, filename.replace('.', os.sep))
+            if os.path.exists(symbol_path + '.py'):
+                result.append(symbol_path + '__tests.py')
+
+    if directories:
+        scanned = scan(directories)
+        result += scanned.test_files
+        conftest_files += scanned.conftest_files
     return result, conftest_files
 
 
-def collect_file_data(path):
+# Hash in threads when there are more files than this to hash
+PARALLEL_HASH_THRESHOLD = 64
+
+
+def hash_file(filename):
+    from hashlib import blake2b
+    with open(filename, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return blake2b(digest_size=16).digest()
+        import mmap
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return blake2b(m, digest_size=16).digest()
+
+
+IGNORED_DIRECTORIES = ['venv', 'env', '__pycache__', 'node_modules']
+
+
+def is_ignored_directory(name):
+    return name.startswith('.') or name in IGNORED_DIRECTORIES
+
+
+def collect_file_data(path, old_file_data=None, scanned=None):
+    """
+    Returns a dict from filename to (size, nanosecond modification time, content hash) for the python files under
+    path. The hashes in old_file_data are reused for files whose size and modification time are the same, so only
+    files that have been touched are read. Pass a scan with path as its data root (see hammett.scan) to use it instead
+    of walking path again.
+    """
+    if scanned is None:
+        from hammett.scan import scan
+        scanned = scan([], path)
+    return file_data_from_stats(scanned.files, old_file_data)
+
+
+def file_data_of(filenames, old_file_data=None):
+    """
+    The file data, as in collect_file_data, of the given files. Files that don't exist are left out.
+    """
+    stats = {}
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            continue
+        stats[filename] = (stat.st_size, stat.st_mtime_ns)
+    return file_data_from_stats(stats, old_file_data)
+
+
+def file_data_from_stats(stats, old_file_data=None):
+    """
+    The file data from a dict of filename -> (size, nanosecond modification time), hashing the files that have changed
+    since old_file_data.
+    """
+    if old_file_data is None:
+        old_file_data = {}
+
     data = {}
-    for root, dirs, files in os.walk(path):
-        dirs[:] = [x for x in dirs if not x.startswith('.') and x not in ['venv', 'env', '__pycache__']]
-        for filename in files:
-            if not filename.endswith('.py'):
-                continue
-            full_path = join(root, filename)
-            if full_path.startswith(f'.{os.sep}'):
-                full_path = full_path[2:]
-            data[full_path] = os.stat(full_path).st_mtime_ns
+    to_hash = []
+    for filename, stat in stats.items():
+        old = old_file_data.get(filename)
+        if old is not None and old[:2] == stat:
+            data[filename] = old
+        else:
+            data[filename] = (*stat, None)
+            to_hash.append(filename)
+
+    if len(to_hash) > PARALLEL_HASH_THRESHOLD:
+        # hashlib releases the GIL while hashing
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor() as executor:
+            hashes = list(executor.map(hash_file, to_hash))
+    else:
+        hashes = [hash_file(x) for x in to_hash]
+
+    for filename, h in zip(to_hash, hashes):
+        data[filename] = data[filename][:2] + (h,)
     return data
 
 
-DB_VERSION = 2
+def current_file_data(result_db, scanned=None):
+    """
+    Collect the file data of the source files. With change_detection=git in the settings only the files git reports
+    as changed since the last run are looked at.
+    """
+    if g.settings.get('change_detection') == 'git':
+        from hammett.git import collect_file_data_from_git
+        file_data = collect_file_data_from_git(g.source_location, result_db)
+        if file_data is not None:
+            return file_data
+        scanned = None
+    return collect_file_data(g.source_location, result_db['file_data'], scanned)
+
+
+def file_changed(old, new):
+    """
+    Compare two file_data entries. Only the contents matter, a checkout or cache restore touching a file doesn't.
+    """
+    return old[2] != new[2]
+
+
+DB_VERSION = 11
 DB_FILENAME = '.hammett-db'
+DAEMON_SOCKET_FILENAME = '.hammett-daemon'
 
 
 def write_result_db(results):
     """
-    The results database is a simple pickled dict with some keys:
+    Save what has changed in the results database since the last save. It's a dict with some keys, stored in sqlite
+    (see hammett.store):
 
     db_version: the version. So we can change the format and throw away an old db if needed
-    test_results: dict from filename -> (dict from test_name -> dict(stdout=str, stderr=str, status=str))
-    file_data: dict filename -> nanosecond modification date
+    test_results: dict from filename -> (dict from test_name -> Result)
+    file_data: dict filename -> (size, nanosecond modification date, content hash), see collect_file_data
+    durations: dict from filename -> (dict from test_name -> seconds). This history is kept when test results are
+               thrown away, since it's used to schedule the tests that need to run.
+    load_footprints: dict from filename -> the project files executed when loading the test module
+    import_graph: dict from filename -> the project files it imports values from, see hammett.import_graph
+    stale_tests: dict from filename -> set of test names that need to run again, for test files that otherwise have
+                 valid results
+    git: the state of the git checkout file_data was collected at with change_detection=git, see hammett.git
+    inventories: dict from filename -> (fingerprint, the tests found in it without importing it), see hammett.collect
     """
     if not g.use_cache:
         return
 
+    from time import monotonic
+    from hammett.store import save_changes
+    save_changes(results, DB_FILENAME)
+    g.result_db_written_at = monotonic()
+
+
+# Results are saved after each test file, and at least this often in seconds while tests run
+WRITE_INTERVAL = 1
+
+
+def write_result_db_periodically():
+    """
+    Save the results if the last save was more than WRITE_INTERVAL seconds ago. One transaction per test is too slow,
+    and this keeps what a crashed or interrupted run got done anyway.
+    """
+    from time import monotonic
+    if g.use_cache and monotonic() - g.result_db_written_at > WRITE_INTERVAL:
+        write_result_db(g.result_db)
+
+
+def save_result_db(results, filename=DB_FILENAME):
+    """
+    Replace the db in filename with results.
+    """
+    from hammett.store import save
     results['db_version'] = DB_VERSION
-    from pickle import dump
-    with open(DB_FILENAME, 'wb') as f:
-        dump(results, f)
+    save(results, filename)
 
 
 def new_result_db():
-    return dict(
+    from hammett.store import ResultDb
+    result_db = ResultDb(dict(
         db_version=DB_VERSION,
         test_results=defaultdict(dict),
         file_data=None,
-    )
+        durations=defaultdict(dict),
+        load_footprints={},
+        import_graph={},
+        stale_tests=defaultdict(set),
+        inventories={},
+        git=None,
+    ))
+    # Saving a new db replaces whatever was there
+    result_db.replaced.update(result_db)
+    return result_db
 
 
 def read_result_db():
     if not g.use_cache:
         return new_result_db()
-    from pickle import load
-    try:
-        with open(DB_FILENAME, 'rb') as f:
-            results = load(f)
-            if results['db_version'] != DB_VERSION:
-                raise FileNotFoundError()
-    except FileNotFoundError:
+    return load_result_db()
+
+
+def load_result_db(filename=DB_FILENAME):
+    """
+    Read the result db from disk, whether the cache is used or not.
+    """
+    from hammett.store import load
+    results = load(filename)
+    if results is None:
         return new_result_db()
     return results
 
@@ -407,6 +551,7 @@ def drop_cache_for_filename(result_db, filename):
         del result_db['test_results'][filename]
     except KeyError:
         pass
+    result_db['stale_tests'].pop(filename, None)
 
 
 def update_result_db(result_db, new_file_data):
@@ -418,43 +563,123 @@ def update_result_db(result_db, new_file_data):
         assert not result_db['test_results']
         return result_db
 
-    # Clear out test results when the test file or the tested module has changed
+    # Forget the files that have been deleted
+    for filename in set(result_db['file_data']) - set(new_file_data):
+        drop_cache_for_filename(result_db, filename)
+        for x in ('durations', 'load_footprints', 'import_graph', 'inventories'):
+            result_db[x].pop(filename, None)
+
+    drop_stale_results(result_db, new_file_data)
+
+
+def drop_stale_results(result_db, new_file_data):
+    """
+    Clear out test results when the test file or the code it uses has changed. Tests with a footprint (see
+    hammett.footprints) only run again if they executed a changed file, or if the test module did when it was loaded.
+    Executing or importing a file also depends on everything it imports values from (see hammett.import_graph).
+    The tests that need to run again in otherwise valid test files are recorded in result_db['stale_tests'].
+    """
+    from hammett.import_graph import dependencies
+
     old_file_data = result_db['file_data']
-    clear_all_non_module_tests = False
-    for filename, modification_time in old_file_data.items():
-        if filename in new_file_data and modification_time != new_file_data[filename]:
-            if filename.endswith('__tests.py') or filename.startswith('test_'):
-                # The test has been changed
+    changed = {
+        filename
+        for filename, data in old_file_data.items()
+        if filename in new_file_data and file_changed(data, new_file_data[filename])
+    }
+    changed_test_files = {x for x in changed if is_test_file(basename(x))}
+    changed_sources = changed - changed_test_files
+
+    for filename in changed_test_files:
+        drop_cache_for_filename(result_db, filename)
+
+    if changed_sources:
+        graph = result_db['import_graph']
+        closures = {}
+        # Fixtures and hooks in conftest files can affect any test
+        drop_all = any(basename(x) == 'conftest.py' for x in changed_sources)
+        for filename, results in list(result_db['test_results'].items()):
+            load_footprint = result_db['load_footprints'].get(filename)
+            if drop_all or load_footprint is None or filename not in graph or not dependencies(graph, load_footprint | {filename}, closures).isdisjoint(changed_sources):
                 drop_cache_for_filename(result_db, filename)
-            else:
-                # The module has been changed so translate the filename to the possible test files
-                drop_cache_for_filename(result_db, filename[:-(len('.py'))] + '__tests.py')
-                _, filename_only = split(filename)
-                drop_cache_for_filename(result_db, f"tests{os.sep}{filename[:-(len('.py'))]}" + '__tests.py')
-                clear_all_non_module_tests = True
-                # TODO: this doesn't clear the db for module__function__tests.py
+                continue
+
+            for test_name, result in list(results.items()):
+                if result.footprint is None or not dependencies(graph, result.footprint, closures).isdisjoint(changed_sources):
+                    del results[test_name]
+                    result_db['stale_tests'][filename].add(test_name)
+
+    # Updated in place, so only the entries that changed are saved
+    file_data = result_db['file_data']
+    for filename in set(file_data) - set(new_file_data):
+        del file_data[filename]
+    for filename, data in new_file_data.items():
+        if file_data.get(filename) != data:
+            file_data[filename] = data
 
-    if clear_all_non_module_tests:
-        from pathlib import Path
-        non_module_filenames = [x for x in result_db['test_results'].keys() if Path(x).stem.startswith('test_')]
-        for x in non_module_filenames:
-            del result_db['test_results'][x]
 
-    result_db['file_data'] = new_file_data
+def merge_result_dbs(result_dbs):
+    """
+    Merge result dbs, for example from the shards of a CI run. When the dbs disagree on the contents of a file the
+    version with the newest modification time wins, and results recorded against other versions are dropped like a
+    run would after the file changed. When several dbs have a result or duration for the same test, the last one wins.
+    """
+    file_data = {}
+    for result_db in result_dbs:
+        for filename, data in (result_db['file_data'] or {}).items():
+            file_data[filename] = max(data, file_data.get(filename, data), key=lambda x: x[1])
+
+    merged = new_result_db()
+    for result_db in result_dbs:
+        if result_db['file_data'] is None:
+            continue
+
+        # Don't modify the dbs passed in
+        result_db = dict(
+            result_db,
+            file_data=dict(result_db['file_data']),
+            test_results={filename: dict(results) for filename, results in result_db['test_results'].items()},
+            stale_tests=defaultdict(set, {filename: set(names) for filename, names in result_db['stale_tests'].items()}),
+        )
+        drop_stale_results(result_db, file_data)
+        for filename, results in result_db['test_results'].items():
+            merged['test_results'][filename].update(results)
+        for filename, durations in result_db['durations'].items():
+            merged['durations'][filename].update(durations)
+        merged['load_footprints'].update(result_db['load_footprints'])
+        merged['import_graph'].update(result_db['import_graph'])
+        # Through items(), so the lazily loaded entries are read from the db they come from
+        merged['inventories'].update(result_db['inventories'].items())
+        for filename, names in result_db['stale_tests'].items():
+            merged['stale_tests'][filename] |= names
+
+    # Tests that are stale in one db might have a valid result from another
+    for filename, names in list(merged['stale_tests'].items()):
+        names -= set(merged['test_results'].get(filename, ()))
+        if not names or filename not in merged['test_results']:
+            del merged['stale_tests'][filename]
+
+    merged['file_data'] = file_data or None
+    return merged
+
+
+def merge_db_files(filenames, output=DB_FILENAME):
+    from hammett.manifest import remove_manifest
+    remove_manifest()
+    save_result_db(merge_result_dbs([load_result_db(filename) for filename in filenames]), output)
 
 
 def finish():
-    for x in g.result_db['test_results'].values():
-        for y in x.values():
-            g.results[y.status] += 1
+    for status, count in g.result_db['test_results'].status_counts().items():
+        g.results[status] += count
 
 
-def main(verbose=False, fail_fast=False, quiet=False, filenames=None, drop_into_debugger=False, match=None, durations=False, markers=None, disable_assert_analyze=False, module_unload=False, cwd=None, use_cache=False, pre_test_callback=None, post_test_callback=None):
-    params = main_setup(verbose=verbose, fail_fast=fail_fast, quiet=quiet, filenames=filenames, drop_into_debugger=drop_into_debugger, durations=durations, markers=markers, disable_assert_analyze=disable_assert_analyze, cwd=cwd, use_cache=use_cache, pre_test_callback=pre_test_callback, post_test_callback=post_test_callback)
+def main(verbose=False, fail_fast=False, quiet=False, filenames=None, drop_into_debugger=False, match=None, durations=False, markers=None, disable_assert_analyze=False, module_unload=False, cwd=None, use_cache=False, pre_test_callback=None, post_test_callback=None, threads=None, shard=None):
+    params = main_setup(verbose=verbose, fail_fast=fail_fast, quiet=quiet, filenames=filenames, drop_into_debugger=drop_into_debugger, durations=durations, markers=markers, disable_assert_analyze=disable_assert_analyze, cwd=cwd, use_cache=use_cache, pre_test_callback=pre_test_callback, post_test_callback=post_test_callback, threads=threads, shard=shard)
     return main_run_tests(match=match, module_unload=module_unload, **params)
 
 
-def main_setup(verbose=False, fail_fast=False, quiet=False, filenames=None, drop_into_debugger=False, durations=False, markers=None, disable_assert_analyze=False, cwd=None, use_cache=False, pre_test_callback=None, post_test_callback=None):
+def main_setup(verbose=False, fail_fast=False, quiet=False, filenames=None, drop_into_debugger=False, durations=False, markers=None, disable_assert_analyze=False, cwd=None, use_cache=False, pre_test_callback=None, post_test_callback=None, threads=None, shard=None):
     import sys
     if sys.version_info[:2] < (3, 6):
         print('hammett requires python 3.6 or later')
@@ -486,8 +711,10 @@ def main_setup(verbose=False, fail_fast=False, quiet=False, filenames=None, drop
     g.durations = durations
     g.disable_assert_analyze = disable_assert_analyze
     g.use_cache = use_cache
+    set_record_footprints(bool(use_cache))
     g.pre_test_callback = pre_test_callback
     g.post_test_callback = post_test_callback
+    g.threads = threads
 
     from hammett.impl import read_settings
     read_settings()
@@ -502,10 +729,32 @@ def main_setup(verbose=False, fail_fast=False, quiet=False, filenames=None, drop
         g.modules = m
 
     g.result_db = read_result_db()
-    update_result_db(g.result_db, collect_file_data(g.source_location))
-    write_result_db(g.result_db)
 
-    filenames, conftest_files = collect_files(filenames)
+    # The test files and the source files are found in the same walk
+    from hammett.scan import scan
+    data_root = g.source_location if g.use_cache and g.settings.get('change_detection') != 'git' else None
+    scanned = scan(test_roots() if filenames is None else [], data_root)
+
+    if g.use_cache:
+        # This run might change the results, the manifest is written again at the end if it doesn't
+        from hammett.manifest import remove_manifest
+        remove_manifest()
+        update_result_db(g.result_db, current_file_data(g.result_db, scanned if data_root is not None else None))
+        write_result_db(g.result_db)
+
+    filenames, conftest_files = collect_files(filenames, scanned)
+    g.collected_files = filenames + conftest_files
+
+    if shard is not None:
+        # This happens before anything is imported, so each shard only pays for loading its own test modules
+        from hammett.scheduling import shard_filenames
+        index, count = shard
+        recorded_durations = (g.result_db if g.use_cache else load_result_db())['durations']
+        filenames = shard_filenames(filenames, index, count, recorded_durations)
+
+    if g.use_cache:
+        from hammett.shared_cache import fetch
+        fetch(filenames)
 
     return dict(
         filenames=filenames,
@@ -515,7 +764,26 @@ def main_setup(verbose=False, fail_fast=False, quiet=False, filenames=None, drop
     )
 
 
-def main_run_tests(filenames, conftest_files, markers, clean_up_sys_path, match=None, module_unload=False, tests=None):
+def main_preload(filenames, conftest_files, **_):
+    """
+    Load plugins, conftests and test modules up front. This is for long lived processes (like the daemon) that fork
+    off children to run the tests: the children inherit everything imported here.
+    """
+    from hammett.impl import (
+        load_conftests,
+        load_plugins,
+        should_stop,
+    )
+    load_plugins()
+    if should_stop():
+        return False
+    load_conftests(conftest_files)
+    for test_filename in sorted(filenames):
+        preload_module(test_module_name(test_filename), test_filename)
+    return not should_stop()
+
+
+def main_run_tests(filenames, conftest_files, markers, clean_up_sys_path, match=None, module_unload=False, tests=None, plugins_loaded=False, conftests_loaded=False):
     if not filenames:
         print('No module to test found.')
         print('''You might need to add `modules` and `source_location` item under [hammett] in setup.cfg  like:
@@ -529,10 +797,16 @@ source_location=.
         return 3
 
     g.results.update(dict(success=0, failed=0, skipped=0, abort=0))
+    if tests is not None:
+        tests = set(tests)
+    g.tests = tests
+
+    from hammett.collect import skip_unselected
+    filenames = skip_unselected(filenames, markers, match, tests)
+
+    from hammett.impl import selected_by
 
-    plugins_loaded = False
-    conftests_loaded = False
-    from os.path import split, sep
+    from os.path import split
 
     session_request = Request(scope='session', parent=None)
 
@@ -544,16 +818,22 @@ source_location=.
         if dirname.startswith(f'.{os.sep}'):
             dirname = dirname[2:]
 
-        module_name = f'{dirname.replace(sep, ".")}.{filename.replace(".py", "")}'
+        module_name = test_module_name(test_filename)
         # if module_name in sys.modules:
         #     del sys.modules[module_name]
 
         cache_filename = join(dirname, filename)
+        file_tests = tests
         if cache_filename in g.result_db['test_results']:
-            from hammett.impl import print_status
-            for test_name, result in g.result_db['test_results'][cache_filename].items():
-                print_status(test_name, result)
-            continue
+            from hammett.impl import print_cached_status
+            print_cached_status(cache_filename)
+
+            # Only the tests affected by changes need to run again
+            file_tests = {f'{cache_filename}::{x}' for x in g.result_db['stale_tests'].get(cache_filename, ())}
+            if tests is not None:
+                file_tests = {x for x in file_tests if not tests.isdisjoint(selected_by(x))}
+            if not file_tests:
+                continue
 
         # We do this here because if all test results are up to date, we want to avoid loading slow plugins!
         if not plugins_loaded:
@@ -569,7 +849,9 @@ source_location=.
             load_conftests(conftest_files)
             conftests_loaded = True
 
-        run_tests_for_filename(test_filename, session_request, markers, match, module_name, tests)
+        g.tests = file_tests
+        run_tests_for_filename(test_filename, session_request, markers, match, module_name, file_tests)
+        write_result_db(g.result_db)
 
         # if module_unload:
         #     del sys.modules[module_name]
@@ -579,6 +861,13 @@ source_location=.
 
     session_request.teardown()
 
+    return main_finish(clean_up_sys_path)
+
+
+def main_finish(clean_up_sys_path):
+    """
+    Print the summary, write the result db and return the exit code.
+    """
     if not g.verbose:
         print()
 
@@ -613,22 +902,107 @@ source_location=.
     print(f'{color}{g.results["success"]} succeeded, {g.results["failed"]} failed, {g.results["skipped"]} skipped{RESET_COLOR}')
     os.chdir(g.orig_cwd)
 
+    if g.record_footprints:
+        from hammett.import_graph import recorded_edges
+        g.result_db['import_graph'].update(recorded_edges())
+
     if g.results['abort']:
         write_result_db(g.result_db)
         return 2
 
+    if g.use_cache and g.stored_files:
+        from hammett.shared_cache import publish
+        publish(g.stored_files)
+
     write_result_db(g.result_db)
     return 1 if g.results['failed'] else 0
 
 
+def test_module_name(test_filename):
+    dirname, filename = split(test_filename)
+    if dirname.startswith(f'.{os.sep}'):
+        dirname = dirname[2:]
+    return f'{dirname.replace(os.sep, ".")}.{filename.replace(".py", "")}'
+
+
+# Test modules imported ahead of time by main_preload: abspath -> (mtime, module, fixtures registered by the module)
+_preloaded_modules = {}
+
+
+def preload_module(module_name, test_filename):
+    from hammett.impl import fixtures, fixture_scope
+    fixtures_before = dict(fixtures)
+    aborts_before = g.results['abort']
+    module = load_module(module_name, test_filename)
+    if g.results['abort'] != aborts_before:
+        # Let the actual run report the failure
+        g.results['abort'] = aborts_before
+        del sys.modules[module_name]
+        return
+
+    registered_fixtures = {
+        name: (f, fixture_scope.get(name, 'function'))
+        for name, f in fixtures.items()
+        if fixtures_before.get(name) is not f
+    }
+    from hammett.scheduling import db_filename
+    load_footprint = g.result_db['load_footprints'].get(db_filename(test_filename))
+    _preloaded_modules[abspath(test_filename)] = (os.stat(test_filename).st_mtime_ns, module, registered_fixtures, load_footprint)
+
+
+def set_record_footprints(record_footprints):
+    """
+    Record the footprints of tests and the imports between project files (see hammett.footprints and
+    hammett.import_graph). Workers do this when the process that collects their results does.
+    """
+    g.record_footprints = record_footprints
+    if record_footprints:
+        from hammett.import_graph import install
+        install()
+
+
 def load_module(module_name, test_filename):
+    from hammett.scheduling import db_filename
+    preloaded = _preloaded_modules.get(abspath(test_filename))
+    if preloaded is not None:
+        mtime, module, registered_fixtures, load_footprint = preloaded
+        if mtime == os.stat(test_filename).st_mtime_ns:
+            # The fixtures of the module might have been shadowed by other preloaded modules since
+            from hammett.impl import fixtures, fixture_scope
+            for name, (f, scope) in registered_fixtures.items():
+                fixtures[name] = f
+                fixture_scope[name] = scope
+            sys.modules[module_name] = module
+            if load_footprint is not None and g.record_footprints:
+                g.result_db['load_footprints'][db_filename(test_filename)] = load_footprint
+            return module
+
     import importlib.util
     spec = importlib.util.spec_from_file_location(module_name, test_filename)
     module = importlib.util.module_from_spec(spec)
     sys.modules[module_name] = module
+    recording = False
+    if g.record_footprints:
+        from hammett import footprints
+        from hammett.import_graph import add_edges
+        # The test module is in the graph even if it imports nothing from the project
+        add_edges({db_filename(test_filename): ()})
+        recording = footprints.start()
     try:
-        spec.loader.exec_module(module)
-    except Exception:
+        try:
+            spec.loader.exec_module(module)
+        finally:
+            if recording:
+                load_footprint = footprints.stop(include_modules=False)
+        if recording:
+            g.result_db['load_footprints'][db_filename(test_filename)] = load_footprint
+    except Exception as e:
+        if g.in_subinterpreter:
+            from hammett.subinterpreters import is_unsupported_in_subinterpreter
+            if is_unsupported_in_subinterpreter(e):
+                # The file will be run in a worker process instead
+                del sys.modules[module_name]
+                raise
         print(f'Failed to load module {module_name}:')
         import traceback
         print(traceback.format_exc())
@@ -637,6 +1011,12 @@ def load_module(module_name, test_filename):
 
 
 def run_tests_for_filename(test_filename, session_request, markers, match, module_name, tests):
+    g.ran_tests = True
+
+    from hammett.collect import record_static_skips
+    if record_static_skips(test_filename, markers, match, tests):
+        return
+
     module = load_module(module_name, test_filename)
 
     if g.results['abort']:
@@ -644,17 +1024,47 @@ def run_tests_for_filename(test_filename, session_request, markers, match, modul
 
     module_request = Request(scope='module', parent=session_request)
 
+    from hammett.impl import execute_test_function, execute_test_class, execute_tests_in_threads, is_thread_safe
+    from hammett.impl import should_stop
+    # Tests marked thread_safe are run concurrently after the others when running with threads
+    thread_safe_tests = []
+    for full_name, f, is_test_function in iter_tests_of_module(module, test_filename, markers, match, tests):
+        if g.results['abort']:
+            break
+
+        if g.threads and is_thread_safe(f):
+            thread_safe_tests.append((full_name, f, is_test_function))
+            continue
+
+        if is_test_function:
+            execute_test_function(full_name, f, module_request)
+        else:
+            execute_test_class(full_name, f, module_request)
+
+        if should_stop():
+            break
+
+    if thread_safe_tests and not should_stop() and not g.results['abort']:
+        execute_tests_in_threads(thread_safe_tests, module_request)
+
+    module_request.teardown()
+
+
+def iter_tests_of_module(module, test_filename, markers, match, tests):
+    """
+    Yields (full_name, f, is_test_function) for the selected test functions and test classes of a module.
+    """
     module_markers = getattr(module, 'pytestmark', [])
     if not isinstance(module_markers, list):
         module_markers = [module_markers]
 
-    from hammett.impl import execute_test_function, execute_test_class
     from unittest import TestCase
-    from hammett.impl import should_stop
-    for name, f in list(module.__dict__.items()):
-        if g.results['abort']:
-            break
+    from hammett.expression import compile_expression
+    from hammett.impl import selected_by
 
+    if tests is not None:
+        selected_symbols = set().union(*(selected_by(x) for x in tests))
+    for name, f in list(module.__dict__.items()):
         full_name = f'{test_filename}::{name}'.replace('./', '')
 
         is_test_function = name.startswith('test_') and callable(f)
@@ -664,110 +1074,153 @@ def run_tests_for_filename(test_filename, session_request, markers, match, modul
             continue
 
         if match is not None:
-            if match not in name:
+            if not compile_expression(match, 'keywords').matches_name(name):
                 continue
 
         if tests is not None:
-            if full_name not in tests:
+            if full_name not in selected_symbols:
                 continue
 
         for m in module_markers:
             f = m(f)
 
         if markers is not None:
-            keep = False
-            for f_marker in getattr(f, 'hammett_markers', []):
-                if f_marker.name in markers:
-                    arg = markers[f_marker.name]
-                    if arg is not None:
-                        assert len(f_marker.args) == 1, 'hammett only supports filtering on single arguments to markers right now'
-                        if str(f_marker.args[0]) == arg:
-                            keep = True
-                            break
-                    else:
-                        keep = True
-                        break
-            if not keep:
+            if not markers.matches_markers([(x.name, x.args, x.kwargs) for x in getattr(f, 'hammett_markers', [])]):
                 continue
 
-        if is_test_function:
-            execute_test_function(full_name, f, module_request)
-        elif is_test_class:
-            execute_test_class(full_name, f, module_request)
+        yield full_name, f, is_test_function
 
-        if should_stop():
-            break
 
-    module_request.teardown()
+def collect_test_names(test_filename, markers, match):
+    """
+    Returns the full names of the selected tests in a test file, one per parametrized case and test method.
+    """
+    aborts_before = g.results['abort']
+    module = load_module(test_module_name(test_filename), test_filename)
+    if g.results['abort'] != aborts_before:
+        return []
+
+    from hammett.impl import test_names
+    return [
+        name
+        for full_name, f, is_test_function in iter_tests_of_module(module, test_filename, markers, match, tests=None)
+        for name in test_names(full_name, f, is_test_function)
+    ]
 
 
 def hookimpl(*_, **__):
     return lambda f: f
 
 
-def multi_process_main(*, match, module_unload=False, **kwargs):
-    import os
+def __getattr__(name):
+    # Imported lazily to keep startup fast
+    if name == 'ForkServer':
+        from hammett.fork_server import ForkServer
+        return ForkServer
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-    # key == filename
 
-    # manual fork
-    result_by_key = {}
+def multi_process_main(*, match, module_unload=False, processes=None, **kwargs):
+    from hammett.pool import run_pool
+    return run_pool(match=match, processes=processes, **main_setup(**kwargs))
 
-    def read_one_child_exit_status():
-        pid, status = os.wait()
-        result_by_key[key_from_pid[pid]] = (0xFF00 & status) >> 8  # The high byte contains the exit code
 
-    hammett_kwargs = main_setup(**kwargs)
+def subinterpreters_main(*, match, module_unload=False, processes=None, **kwargs):
+    from hammett.subinterpreters import run_subinterpreters
+    return run_subinterpreters(match=match, processes=processes, setup_kwargs=kwargs, **main_setup(**kwargs))
 
-    key_from_pid = {}
-    running_children = 0
-    max_children = 160
 
-    for key in hammett_kwargs['filenames']:
-        pid = os.fork()
-        if not pid:
-            # In the child
+def collect_only_main(*, match, module_unload=False, **kwargs):
+    from hammett.collect import collect_only
+    return collect_only(match=match, **main_setup(**kwargs))
 
-            # this is needed for non-memory DBs
-            Config.workerinput = dict(workerinput=f'_{key}')
 
-            hammett_kwargs['filenames'] = [key]
+def coordinator_main(*, match, address, module_unload=False, **kwargs):
+    from hammett.distributed import run_coordinator
+    return run_coordinator(match=match, address=address, setup_kwargs=kwargs, **main_setup(**kwargs))
 
-            _orig_print('start:', key)
 
-            result = main_run_tests(**hammett_kwargs, match=match, module_unload=module_unload)
-            _orig_print('end:', key)
-            if result != 0:
-                # TODO: write failure information to stdout?
-                pass
-            os._exit(result)
-        else:
-            key_from_pid[pid] = key
-            running_children += 1
+def parse_shard(s):
+    """
+    Parse i/n, for the ith out of n shards (counting from 1).
+    """
+    from argparse import ArgumentTypeError
+    index, _, count = s.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ArgumentTypeError(f'expected i/n, got {s!r}')
+    if not 1 <= index <= count:
+        raise ArgumentTypeError(f'the shard number must be between 1 and {count}')
+    return index, count
 
-        if running_children >= max_children:
-            read_one_child_exit_status()
-            running_children -= 1
 
-    try:
-        while True:
-            read_one_child_exit_status()
-    except ChildProcessError:
-        pass
+def expression_argument(kind):
+    """
+    An argparse type that checks that the -k or -m expression compiles. The source is kept, it's what's sent to the
+    daemon and workers.
+    """
+    def parse(s):
+        from argparse import ArgumentTypeError
+        from hammett.expression import (
+            ExpressionError,
+            compile_expression,
+        )
+        try:
+            compile_expression(s, kind)
+        except ExpressionError as e:
+            raise ArgumentTypeError(str(e))
+        return s
+
+    return parse
+
+
+def merge_db_cli(args):
+    from argparse import ArgumentParser
+    parser = ArgumentParser(prog='hammett merge-db', description='Merge result dbs, for example from sharded CI runs.')
+    parser.add_argument(dest='filenames', nargs='+')
+    parser.add_argument('-o', dest='output', default=DB_FILENAME)
+    args = parser.parse_args(args)
+
+    for filename in args.filenames:
+        if not os.path.exists(filename):
+            _orig_print(f'{filename} does not exist')
+            return 2
+
+    merge_db_files(args.filenames, args.output)
     return 0
 
 
 def main_cli(args=None):
     if args is None:
         args = sys.argv[1:]
+    if args[:1] == ['merge-db']:
+        return merge_db_cli(args[1:])
+
+    # When nothing has changed since the last run we're done before argparse is even imported
+    from hammett.manifest import cached_run
+    exit_code = cached_run(args)
+    if exit_code is not None:
+        return exit_code
+
+    cli_args = args
     from argparse import ArgumentParser
     parser = ArgumentParser(prog='hammett')
     parser.add_argument('-v', '--verbose', dest='verbose', action='store_true', default=False)
     parser.add_argument('-x', dest='fail_fast', action='store_true', default=False)
     parser.add_argument('-q', dest='quiet', action='store_true', default=False)
     parser.add_argument('--multi-experimental', dest='multi_process', action='store_true', default=False)
-    parser.add_argument('-k', dest='match', default=None)
-    parser.add_argument('-m', dest='markers', default=None)
+    parser.add_argument('-n', dest='processes', type=int, default=None, help='Run tests in this many worker processes. Implies --multi-experimental. Defaults to the number of CPUs.')
+    parser.add_argument('--daemon', dest='daemon', action='store_true', default=False, help=f'Start a server that keeps plugins and test modules loaded. Runs in the same directory will use it while {DAEMON_SOCKET_FILENAME} exists.')
+    parser.add_argument('--watch', dest='watch', action='store_true', default=False, help='Keep running and rerun the tests affected by each change to the source files. Implies --use-cache.')
+    parser.add_argument('--subinterpreters', dest='subinterpreters', type=int, default=None, metavar='N', help='Run test files in N subinterpreters with their own GIL. Needs Python 3.12 or later, falls back to worker processes.')
+    parser.add_argument('--coordinator', dest='coordinator', default=None, metavar='HOST:PORT', help='Listen on HOST:PORT and hand out the test files to workers started with --worker.')
+    parser.add_argument('--worker', dest='worker', default=None, metavar='HOST:PORT', help='Run tests for the coordinator at HOST:PORT.')
+    parser.add_argument('--threads', dest='threads', type=int, default=None, metavar='N', help='Run tests marked thread_safe in N threads. Best used with a free-threaded Python.')
+    parser.add_argument('--shard', dest='shard', type=parse_shard, default=None, metavar='I/N', help='Run only the Ith out of N parts of the test files. The parts are balanced on the durations in the result db.')
+    parser.add_argument('--collect-only', dest='collect_only', action='store_true', default=False, help='Print the names of the selected tests without running them. Test files are only imported when that\'s needed to find their tests.')
+    parser.add_argument('-k', dest='match', type=expression_argument('keywords'), default=None, help='Only run tests whose names match the expression, like "foo and not bar".')
+    parser.add_argument('-m', dest='markers', type=expression_argument('markers'), default=None, help='Only run tests whose markers match the expression, like "slow and not db(5)".')
     parser.add_argument('--use-cache', dest='use_cache', default=False, help='The cache is an experimental feature to run only relevant changes based on looking at what files have been changed.')
     parser.add_argument('--durations', dest='durations', action='store_true', default=False)
     parser.add_argument('--no-assert-analyze', dest='disable_assert_analyze', action='store_true', default=False)
@@ -775,11 +1228,69 @@ def main_cli(args=None):
     parser.add_argument(dest='filenames', nargs='*')
     args = parser.parse_args(args)
 
+    if args.daemon:
+        from hammett.daemon import serve
+        return serve(
+            verbose=args.verbose,
+            quiet=args.quiet,
+            use_cache=args.use_cache,
+        )
+
+    if args.watch:
+        from hammett.watch import watch
+        return watch(
+            verbose=args.verbose,
+            fail_fast=args.fail_fast,
+            quiet=args.quiet,
+            filenames=args.filenames or None,
+            match=args.match,
+            durations=args.durations,
+            markers=args.markers,
+            disable_assert_analyze=args.disable_assert_analyze,
+            threads=args.threads,
+        )
+
+    if args.worker:
+        from hammett.distributed import run_worker
+        return run_worker(args.worker)
+
+    if args.processes is not None:
+        args.multi_process = True
+
+    # A child forked by the daemon can't drive an interactive pdb over the socket
+    if not args.multi_process and args.subinterpreters is None and args.coordinator is None and not args.collect_only and not args.drop_into_debugger and os.path.exists(DAEMON_SOCKET_FILENAME):
+        from hammett.daemon import run_via_daemon
+        exit_code = run_via_daemon(
+            verbose=args.verbose,
+            fail_fast=args.fail_fast,
+            quiet=args.quiet,
+            filenames=args.filenames or None,
+            match=args.match,
+            durations=args.durations,
+            markers=args.markers,
+            disable_assert_analyze=args.disable_assert_analyze,
+            use_cache=args.use_cache,
+            threads=args.threads,
+            shard=args.shard,
+        )
+        if exit_code is not None:
+            return exit_code
+
     m = main
-    if args.multi_process:
+    extra_kwargs = {}
+    if args.collect_only:
+        m = collect_only_main
+    elif args.coordinator is not None:
+        m = coordinator_main
+        extra_kwargs['address'] = args.coordinator
+    elif args.subinterpreters is not None:
+        m = subinterpreters_main
+        extra_kwargs['processes'] = args.subinterpreters
+    elif args.multi_process:
         m = multi_process_main
+        extra_kwargs['processes'] = args.processes
 
-    return m(
+    exit_code = m(
         verbose=args.verbose,
         fail_fast=args.fail_fast,
         quiet=args.quiet,
@@ -790,8 +1301,17 @@ def main_cli(args=None):
         markers=args.markers,
         disable_assert_analyze=args.disable_assert_analyze,
         use_cache=args.use_cache,
+        threads=args.threads,
+        shard=args.shard,
+        **extra_kwargs,
     )
 
+    if args.use_cache and m is main and not g.ran_tests and exit_code in (0, 1):
+        from hammett.manifest import write_manifest
+        write_manifest(cli_args, g.collected_files, exit_code)
+
+    return exit_code
+
 
 if __name__ == '__main__':
     exit(main_cli())
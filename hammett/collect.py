@@ -0,0 +1,737 @@
+"""
+Static test collection: find the tests of a test file by parsing it with ast instead of importing it. Importing is
+most of the cost of a run with -k or -m on a big suite, and with this the files where nothing is selected are never
+imported. It's also what --collect-only lists.
+
+The rules are those of iter_tests_of_module: module level names starting with test_ are test functions, names starting
+with Test and subclasses of TestCase are test classes. Markers are found in decorators like @pytest.mark.foo(...) and in
+pytestmark, and @parametrize with literal arguments gives the names of the cases.
+
+Anything that can't be decided by looking at the code, like a name imported from somewhere else or a decorator that
+isn't a marker, makes the answer "maybe", and then the file is imported as before. Decorators are assumed to keep
+functions functions and classes classes.
+
+With --use-cache what is found is kept in the result db, so only the test files that have changed are parsed again.
+"""
+import ast
+import operator
+import os
+import sys
+from dataclasses import dataclass
+from typing import (
+    List,
+    Optional,
+)
+
+import hammett
+
+# Functions that can add names to a module behind our back
+DYNAMIC_FUNCTIONS = {'globals', 'vars', 'locals', 'exec', 'eval', '__import__', 'setattr'}
+
+
+@dataclass
+class StaticTest:
+    name: str
+    lineno: int
+    # None if it might not be a test at all, for example a name imported from somewhere else
+    is_test: Optional[bool]
+    is_test_function: bool
+    # [(name, args)], with args None when they aren't literals. None if there are decorators that aren't markers
+    markers: Optional[list]
+    # The names of the tests after the module name, one per parametrized case and test method, or None if not known
+    test_names: Optional[List[str]]
+
+
+@dataclass
+class Inventory:
+    tests: List[StaticTest]
+    # [(name, args)] from pytestmark, None if it couldn't be read
+    module_markers: Optional[list]
+
+
+class NotStatic(Exception):
+    pass
+
+
+def literal(node):
+    """
+    Like ast.literal_eval, but also understands param(...) and range(...) in parametrize arguments.
+    """
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [literal(x) for x in node.elts]
+        return values if isinstance(node, ast.List) else tuple(values)
+    if isinstance(node, ast.Call) and attribute_name(node.func) == 'param' and not node.keywords:
+        return tuple(literal(x) for x in node.args)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'range' and not node.keywords:
+        args = [literal(x) for x in node.args]
+        if not all(type(x) is int for x in args):
+            raise NotStatic()
+        return range(*args)
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        raise NotStatic()
+
+
+# What skipif conditions can use without importing the test module: things that don't change while the interpreter runs
+ENVIRONMENT_ATTRIBUTES = {
+    'sys': {'version_info', 'platform', 'implementation', 'maxsize', 'byteorder', 'hexversion'},
+    'os': {'name', 'sep'},
+    'platform': {'system', 'python_implementation'},
+}
+
+# Those evaluate to the same thing for the same values of this, so an inventory is only valid for the same value
+ENVIRONMENT = (sys.implementation.cache_tag, tuple(sys.version_info), sys.platform, os.name)
+
+PLAIN_TYPES = {bool, int, float, complex, str, bytes, tuple, list, dict, set, frozenset, range, type(None)}
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+
+class EnvironmentModule:
+    """
+    One of the modules of ENVIRONMENT_ATTRIBUTES in an expression.
+    """
+    def __init__(self, name):
+        self.name = name
+
+
+def environment_attribute(module, attribute):
+    if attribute not in ENVIRONMENT_ATTRIBUTES[module]:
+        raise NotStatic()
+    import importlib
+    return getattr(importlib.import_module(module), attribute)
+
+
+def environment_names(bindings):
+    """
+    The names the module binds to the modules of ENVIRONMENT_ATTRIBUTES, or their attributes, with an import. Returns
+    a dict from name to (module, attribute or None).
+    """
+    result = {}
+    for name, statements in bindings.items():
+        if len(statements) != 1:
+            continue
+        statement = statements[0]
+        if isinstance(statement, ast.Import):
+            for alias in statement.names:
+                module = alias.name if alias.asname else alias.name.partition('.')[0]
+                if (alias.asname or module) == name and module in ENVIRONMENT_ATTRIBUTES:
+                    result[name] = (module, None)
+        elif isinstance(statement, ast.ImportFrom) and not statement.level and statement.module in ENVIRONMENT_ATTRIBUTES:
+            for alias in statement.names:
+                if (alias.asname or alias.name) == name and alias.name in ENVIRONMENT_ATTRIBUTES[statement.module]:
+                    result[name] = (statement.module, alias.name)
+    return result
+
+
+def evaluate(node, names):
+    """
+    Evaluate a literal, or an expression like sys.version_info < (3, 8) or sys.platform.startswith('win') over the
+    ENVIRONMENT_ATTRIBUTES. names are the environment_names of the module.
+    """
+    if isinstance(node, ast.Name) and node.id in names:
+        module, attribute = names[node.id]
+        return EnvironmentModule(module) if attribute is None else environment_attribute(module, attribute)
+
+    if isinstance(node, ast.Attribute):
+        value = evaluate(node.value, names)
+        if isinstance(value, EnvironmentModule):
+            return environment_attribute(value.name, node.attr)
+        # The parts of sys.version_info and sys.implementation
+        if node.attr in ('major', 'minor', 'micro', 'releaselevel', 'name') and not isinstance(value, str):
+            try:
+                return getattr(value, node.attr)
+            except AttributeError:
+                pass
+        raise NotStatic()
+
+    if isinstance(node, ast.Call):
+        if node.keywords:
+            raise NotStatic()
+        if isinstance(node.func, ast.Attribute) and node.func.attr in ('startswith', 'endswith'):
+            value = evaluate(node.func.value, names)
+            if not isinstance(value, str):
+                raise NotStatic()
+            return getattr(value, node.func.attr)(*[literal(x) for x in node.args])
+        f = evaluate(node.func, names)
+        # Only the functions of ENVIRONMENT_ATTRIBUTES get here
+        if not callable(f) or node.args:
+            raise NotStatic()
+        return f()
+
+    if isinstance(node, ast.Subscript):
+        value = evaluate(node.value, names)
+        index = node.slice
+        if isinstance(index, ast.Slice):
+            index = slice(*[None if x is None else literal(x) for x in (index.lower, index.upper, index.step)])
+        else:
+            index = literal(getattr(index, 'value', index) if type(index).__name__ == 'Index' else index)
+        try:
+            return value[index]
+        except (TypeError, IndexError, KeyError):
+            raise NotStatic()
+
+    if isinstance(node, ast.Compare):
+        left = evaluate(node.left, names)
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in COMPARISONS:
+                raise NotStatic()
+            right = evaluate(comparator, names)
+            try:
+                if not COMPARISONS[type(op)](left, right):
+                    return False
+            except TypeError:
+                raise NotStatic()
+            left = right
+        return True
+
+    if isinstance(node, ast.BoolOp):
+        for x in node.values:
+            value = evaluate(x, names)
+            if isinstance(node.op, ast.And) != bool(value):
+                return value
+        return value
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return not evaluate(node.operand, names)
+
+    return literal(node)
+
+
+def attribute_name(node):
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return None
+
+
+def is_mark(node):
+    """
+    Is node something.mark or mark?
+    """
+    return attribute_name(node) == 'mark'
+
+
+def read_decorator(node, names):
+    """
+    Returns ('marker', (name, args)), ('parametrize', (argnames, argvalues)) or None if it's something else. names are
+    the environment_names of the module.
+    """
+    call = None
+    if isinstance(node, ast.Call):
+        call, node = node, node.func
+
+    if attribute_name(node) == 'parametrize' and (not isinstance(node, ast.Attribute) or is_mark(node.value) or attribute_name(node.value) in ('hammett', 'pytest')):
+        if call is None:
+            return None
+        args = list(call.args[:2]) + [x.value for x in call.keywords if x.arg in ('argnames', 'argvalues')]
+        if len(args) != 2:
+            return None
+        try:
+            return 'parametrize', (literal(args[0]), literal(args[1]))
+        except NotStatic:
+            return None
+
+    if not isinstance(node, ast.Attribute) or not is_mark(node.value) or node.attr == 'parametrize':
+        return None
+
+    args = ()
+    if call is not None:
+        try:
+            args = tuple(evaluate(x, names) for x in call.args)
+        except NotStatic:
+            args = None
+        # Only values that can be stored with the inventory, not for example a module or sys.version_info itself
+        if args is not None and any(type(x) not in PLAIN_TYPES for x in args):
+            args = None
+    return 'marker', (node.attr, args)
+
+
+def read_decorators(decorator_list, names):
+    """
+    Returns (markers, parametrize_stack), each None if not known.
+    """
+    markers = []
+    stack = []
+    # Decorators are applied from the bottom up
+    for decorator in reversed(decorator_list):
+        x = read_decorator(decorator, names)
+        if x is None:
+            return None, None
+        kind, value = x
+        if kind == 'marker':
+            markers.append(value)
+        else:
+            stack.append(value)
+    return markers, stack
+
+
+def case_names(name, stack):
+    if stack is None:
+        return None
+    if not stack:
+        return [name]
+    from hammett.impl import parametrize_cases
+    try:
+        return [case_name for case_name, _ in parametrize_cases(name, stack)]
+    except Exception:
+        return None
+
+
+def may_be_class(name):
+    # An imported name or a value we can't evaluate. By convention only classes start with upper case, but constants are
+    # all upper case.
+    return name.startswith('test_') or name[:1].isupper() and not name.isupper()
+
+
+def class_test_names(node, names, assigned_attributes):
+    """
+    The names of the tests of a test class, or None if the class might inherit some or get some assigned later, like
+    TestFoo.test_bar = ... (the names in assigned_attributes).
+    """
+    if node.name in assigned_attributes:
+        return None
+    for base in node.bases:
+        if attribute_name(base) not in ('object', 'TestCase'):
+            return None
+    if node.keywords:
+        return None
+
+    method_names_by_name = []
+    for statement in node.body:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if statement.name.startswith('test_'):
+                _, stack = read_decorators(statement.decorator_list, names)
+                method_names = case_names(f'{node.name}.{statement.name}', stack)
+                if method_names is None:
+                    return None
+                method_names_by_name.append((statement.name, method_names))
+        elif not isinstance(statement, (ast.Expr, ast.Pass)):
+            for name in bound_names(statement):
+                if name.startswith('test_'):
+                    return None
+
+    # The methods are found with dir(), so they come sorted, and a method defined twice is only there once
+    return [x for _, method_names in sorted(dict(method_names_by_name).items()) for x in method_names]
+
+
+def target_names(target):
+    if isinstance(target, ast.Name):
+        return [target.id]
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return [name for x in target.elts for name in target_names(x)]
+    if isinstance(target, ast.Starred):
+        return target_names(target.value)
+    return []
+
+
+def bound_names(statement):
+    """
+    The names a statement binds in the scope it's in, not counting the bodies of compound statements.
+    """
+    if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [statement.name]
+    if isinstance(statement, ast.Assign):
+        return [name for target in statement.targets for name in target_names(target)]
+    if isinstance(statement, (ast.AnnAssign, ast.AugAssign)):
+        if isinstance(statement, ast.AnnAssign) and statement.value is None:
+            return []
+        return target_names(statement.target)
+    if isinstance(statement, (ast.For, ast.AsyncFor)):
+        return target_names(statement.target)
+    if isinstance(statement, (ast.With, ast.AsyncWith)):
+        return [name for item in statement.items if item.optional_vars is not None for name in target_names(item.optional_vars)]
+    if isinstance(statement, ast.Import):
+        return [(x.asname or x.name).partition('.')[0] for x in statement.names]
+    if isinstance(statement, ast.ImportFrom):
+        return [x.asname or x.name for x in statement.names]
+    if isinstance(statement, ast.Delete):
+        return [name for target in statement.targets for name in target_names(target)]
+    return []
+
+
+def module_statements(body):
+    """
+    Yields the statements that run at module level, including those in if, try, with and loops.
+    """
+    for statement in body:
+        yield statement
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        for field in ('body', 'orelse', 'finalbody'):
+            yield from module_statements(getattr(statement, field, None) or [])
+        for handler in getattr(statement, 'handlers', None) or []:
+            yield from module_statements(handler.body)
+
+
+def read_module_markers(node, names):
+    values = node.elts if isinstance(node, (ast.List, ast.Tuple)) else [node]
+    markers = []
+    for value in values:
+        x = read_decorator(value, names)
+        if x is None or x[0] != 'marker':
+            return None
+        markers.append(x[1])
+    return markers
+
+
+def static_test(statement, name, names, assigned_attributes):
+    """
+    A StaticTest for name bound by statement, or None if it's certainly not a test.
+    """
+    is_test_function = name.startswith('test_')
+    lineno = statement.lineno
+
+    if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        if not is_test_function and not name.startswith('Test'):
+            return None
+        markers, stack = read_decorators(statement.decorator_list, names)
+        # A function named Test... is run like a test class, which finds no test methods in it
+        return StaticTest(name, lineno, True, is_test_function, markers, case_names(name, stack) if is_test_function else [])
+
+    if isinstance(statement, ast.ClassDef):
+        if name.startswith('Test') or any(attribute_name(x) == 'TestCase' for x in statement.bases):
+            is_test = True
+        elif not statement.bases or all(attribute_name(x) == 'object' for x in statement.bases):
+            return None
+        else:
+            # Might inherit from TestCase
+            is_test = None
+        markers, _ = read_decorators(statement.decorator_list, names)
+        if any(attribute_name(x) not in ('object', 'TestCase') for x in statement.bases):
+            # Markers are inherited too
+            markers = None
+        return StaticTest(name, lineno, is_test, False, markers, class_test_names(statement, names, assigned_attributes))
+
+    if isinstance(statement, ast.Import):
+        # A module, which is neither callable nor a class
+        return None
+
+    if isinstance(statement, ast.Assign):
+        try:
+            literal(statement.value)
+            return None
+        except NotStatic:
+            pass
+        if isinstance(statement.value, ast.Lambda):
+            if not is_test_function:
+                return None
+            return StaticTest(name, lineno, True, True, [], [name])
+
+    if not may_be_class(name):
+        return None
+    return StaticTest(name, lineno, None, is_test_function, None, None)
+
+
+def parse(source, filename='<test>'):
+    """
+    Returns the Inventory of a test module, or None if it can't be read without running it.
+    """
+    try:
+        tree = ast.parse(source, filename)
+    except (SyntaxError, ValueError):
+        return None
+
+    # Names that get attributes assigned or deleted, like TestFoo.test_bar = ...
+    assigned_attributes = set()
+    # One walk over the whole tree, this is most of the time spent here
+    for node in ast.walk(tree):
+        node_type = type(node)
+        if node_type is ast.Attribute:
+            if type(node.ctx) is not ast.Load and type(node.value) is ast.Name:
+                assigned_attributes.add(node.value.id)
+        elif node_type is ast.Call:
+            if type(node.func) is ast.Name and node.func.id in DYNAMIC_FUNCTIONS:
+                return None
+        elif node_type is ast.ImportFrom:
+            if any(x.name == '*' for x in node.names):
+                return None
+        elif node_type is ast.Global:
+            if any(may_be_class(x) or x.startswith('Test') for x in node.names):
+                # A function can bind module level names
+                return None
+
+    bindings = {}
+    module_markers = []
+    for statement in module_statements(tree.body):
+        for name in bound_names(statement):
+            bindings.setdefault(name, []).append(statement)
+
+    names = environment_names(bindings)
+    tests = []
+    for name, statements in bindings.items():
+        if name == 'pytestmark':
+            if len(statements) == 1 and isinstance(statements[0], ast.Assign):
+                module_markers = read_module_markers(statements[0].value, names)
+            else:
+                module_markers = None
+            continue
+
+        if len(statements) == 1 and not isinstance(statements[0], ast.Delete):
+            test = static_test(statements[0], name, names, assigned_attributes)
+        elif may_be_class(name) or name.startswith('Test'):
+            # Bound more than once, so which one is left depends on how it runs
+            test = StaticTest(name, statements[0].lineno, None, name.startswith('test_'), None, None)
+        else:
+            test = None
+        if test is not None:
+            tests.append(test)
+
+    return Inventory(tests=tests, module_markers=module_markers)
+
+
+def read_source(test_filename):
+    if not test_filename.endswith('.py'):
+        return None
+    try:
+        with open(test_filename, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def parse_file(test_filename):
+    source = read_source(test_filename)
+    if source is None:
+        return None
+    return parse(source, test_filename)
+
+
+def fingerprint(test_filename):
+    """
+    The content hash of the file if we have one, otherwise its size and modification time.
+    """
+    from hammett.scheduling import db_filename
+    data = (hammett.g.result_db['file_data'] or {}).get(db_filename(test_filename))
+    if data is not None:
+        return data[2]
+    try:
+        stat = os.stat(test_filename)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def cached_inventory(test_filename, needle=None):
+    """
+    The Inventory of a test file, from the result db if the file hasn't changed since it was last parsed. With needle,
+    a file that has to be parsed is only parsed if needle is in its source, otherwise None is returned.
+    """
+    from hammett.scheduling import db_filename
+    filename = db_filename(test_filename)
+    key = fingerprint(test_filename)
+    if key is not None:
+        key = (key, ENVIRONMENT)
+    inventories = hammett.g.result_db['inventories']
+    cached = inventories.get(filename)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    if needle is None:
+        inventory = parse_file(test_filename)
+    else:
+        source = read_source(test_filename)
+        if source is None or needle not in source:
+            return None
+        inventory = parse(source, test_filename)
+    if key is not None:
+        inventories[filename] = (key, inventory)
+    return inventory
+
+
+def static_markers(test, inventory):
+    """
+    The markers of a test as hammett.expression wants them: [(name, args, kwargs)], or None if they aren't known.
+    Keyword arguments of markers aren't kept in the inventory.
+    """
+    if test.markers is None or inventory.module_markers is None:
+        return None
+    return [(name, args, None) for name, args in test.markers + inventory.module_markers]
+
+
+def select(inventory, test_filename, markers, match, tests):
+    """
+    Yields (test, selected) for the tests in inventory, where selected is True, or None when only importing the file can
+    tell. Tests that are certainly not selected are left out.
+    """
+    from hammett.expression import compile_expression
+    from hammett.impl import selected_by
+    from hammett.scheduling import db_filename
+
+    if match is not None:
+        match = compile_expression(match, 'keywords')
+    if tests is not None:
+        selected_symbols = set().union(*(selected_by(x) for x in tests))
+    for test in inventory.tests:
+        selected = test.is_test
+        if selected is False:
+            continue
+
+        if match is not None and not match.matches_name(test.name):
+            continue
+
+        if tests is not None and f'{db_filename(test_filename)}::{test.name}' not in selected_symbols:
+            continue
+
+        if markers is not None:
+            x = markers.matches_markers(static_markers(test, inventory))
+            if x is False:
+                continue
+            if x is None:
+                selected = None
+
+        yield test, selected
+
+
+def might_select(test_filename, markers, match, tests=None):
+    """
+    False if it's certain that nothing in the test file is selected.
+    """
+    inventory = cached_inventory(test_filename)
+    if inventory is None:
+        return True
+    return any(True for _ in select(inventory, test_filename, markers, match, tests))
+
+
+def is_skipped(test_markers):
+    """
+    Like should_skip: True, False or None if it can't be known.
+    """
+    result = False
+    for name, args in test_markers:
+        if name == 'skip':
+            return True
+        if name == 'skipif':
+            if not args:
+                result = None
+            elif args[0]:
+                return True
+    return result
+
+
+def statically_skipped(test_filename, markers, match, tests):
+    """
+    The full names of the selected tests of a test file if it's known without importing it that all of them are
+    skipped, otherwise None.
+    """
+    from hammett.impl import selected_by
+    from hammett.scheduling import db_filename
+
+    # This is tried for every test file before it's imported, so files that can't have skip markers aren't parsed
+    inventory = cached_inventory(test_filename, needle=b'skip')
+    if inventory is None or inventory.module_markers is None:
+        return None
+    names = []
+    for test, selected in select(inventory, test_filename, markers, match, tests):
+        # Markers on a class aren't checked when its methods run, so only test functions are skipped this way
+        if selected is None or not test.is_test_function or test.markers is None or test.test_names is None:
+            return None
+        if not is_skipped(test.markers + inventory.module_markers):
+            return None
+        names.extend(f'{db_filename(test_filename)}::{x}' for x in test.test_names)
+    if tests is not None:
+        tests = set(tests)
+        names = [x for x in names if not tests.isdisjoint(selected_by(x))]
+    return names
+
+
+def record_static_skips(test_filename, markers, match, tests):
+    """
+    If all the selected tests of a test file are known to be skipped, record them as skipped without importing the
+    file and return True.
+    """
+    names = statically_skipped(test_filename, markers, match, tests)
+    if names is None:
+        return False
+
+    from hammett.impl import (
+        Result,
+        SKIPPED,
+        inc_test_result,
+    )
+    footprint = None
+    if hammett.g.record_footprints:
+        from hammett.import_graph import add_edges
+        from hammett.scheduling import db_filename
+        # Nothing was executed, so only a change to the file itself can change the results
+        filename = db_filename(test_filename)
+        add_edges({filename: ()})
+        hammett.g.result_db['load_footprints'][filename] = frozenset()
+        footprint = frozenset()
+    for name in names:
+        inc_test_result(name, None, Result(status=SKIPPED, footprint=footprint))
+    return True
+
+
+def skip_unselected(filenames, markers, match, tests=None):
+    """
+    Leave out the test files where nothing is selected by -k or -m, so they are never imported. Files with results in
+    the result db are kept, since those results are printed.
+    """
+    if markers is None and match is None and tests is None:
+        return filenames
+
+    from hammett.scheduling import db_filename
+    test_results = hammett.g.result_db['test_results']
+    return [
+        x
+        for x in filenames
+        if db_filename(x) in test_results or might_select(x, markers, match, tests)
+    ]
+
+
+def static_names(test_filename, markers, match):
+    """
+    The full names of the selected tests in a test file, like collect_test_names, or None if the file has to be
+    imported to know them.
+    """
+    from hammett.scheduling import db_filename
+
+    inventory = cached_inventory(test_filename)
+    if inventory is None:
+        return None
+    names = []
+    for test, selected in select(inventory, test_filename, markers, match, tests=None):
+        if selected is None or test.test_names is None:
+            return None
+        names.extend(f'{db_filename(test_filename)}::{x}' for x in test.test_names)
+    return names
+
+
+def collect_only(filenames, conftest_files, markers, clean_up_sys_path, match=None):
+    """
+    Print the names of the selected tests, one per line. Plugins and conftests are only loaded if some test file has
+    to be imported.
+    """
+    plugins_loaded = False
+    for test_filename in sorted(filenames):
+        names = static_names(test_filename, markers, match)
+        if names is None:
+            if not plugins_loaded:
+                from hammett.impl import (
+                    load_conftests,
+                    load_plugins,
+                )
+                load_plugins()
+                load_conftests(conftest_files)
+                plugins_loaded = True
+            names = hammett.collect_test_names(test_filename, markers, match)
+        for name in names:
+            hammett.print(name)
+
+    if clean_up_sys_path:
+        import sys
+        del sys.path[0]
+    hammett.write_result_db(hammett.g.result_db)
+    return 2 if hammett.g.results['abort'] else 0
@@ -0,0 +1,175 @@
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+from os.path import abspath
+
+import hammett
+from hammett.ipc import exit_code_from_status
+
+SOCKET_FILENAME = hammett.DAEMON_SOCKET_FILENAME
+
+# Passed over exec() when the daemon restarts itself because already imported code changed
+LISTENER_FD_ENV = 'HAMMETT_DAEMON_LISTENER_FD'
+PENDING_FD_ENV = 'HAMMETT_DAEMON_PENDING_FD'
+
+EXIT_CODE_FORMAT = '!i'
+EXIT_CODE_SIZE = struct.calcsize(EXIT_CODE_FORMAT)
+
+# The subset of main() arguments a client can send with a run request
+REQUEST_KEYS = {'verbose', 'fail_fast', 'quiet', 'filenames', 'drop_into_debugger', 'match', 'durations', 'markers', 'disable_assert_analyze', 'use_cache', 'threads', 'shard'}
+
+
+def imported_files():
+    return {
+        abspath(m.__file__)
+        for m in list(sys.modules.values())
+        if getattr(m, '__file__', None)
+    }
+
+
+def stale_imports(file_data):
+    """
+    Returns the files the warm process has imported that have changed since file_data was collected. Test modules are
+    excluded since load_module handles reimporting those.
+    """
+    new_file_data = hammett.collect_file_data(hammett.g.source_location, file_data)
+    changed = {
+        abspath(filename)
+        for filename, data in file_data.items()
+        if filename not in new_file_data or hammett.file_changed(data, new_file_data[filename])
+    }
+    preloaded = set(hammett._preloaded_modules)
+    return (changed & imported_files()) - preloaded
+
+
+def run_request(conn, request):
+    """
+    Executed in a forked child: runs the tests with stdout and stderr pointing to the client connection.
+    """
+    exit_code = 2
+    try:
+        os.dup2(conn.fileno(), 1)
+        os.dup2(conn.fileno(), 2)
+        match = request.pop('match', None)
+        params = hammett.main_setup(**request)
+        exit_code = hammett.main_run_tests(match=match, plugins_loaded=True, conftests_loaded=True, **params)
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 2
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        sys.__stdout__.flush()
+        sys.__stderr__.flush()
+        os._exit(exit_code)
+
+
+def handle_connection(conn):
+    line = conn.makefile('rb').readline()
+    request = {k: v for k, v in json.loads(line).items() if k in REQUEST_KEYS}
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if not pid:
+        run_request(conn, request)
+
+    _, status = os.waitpid(pid, 0)
+    conn.sendall(struct.pack(EXIT_CODE_FORMAT, exit_code_from_status(status)))
+
+
+def restart(listener, conn):
+    hammett._orig_print('hammett daemon: imported code has changed, restarting')
+    listener.set_inheritable(True)
+    conn.set_inheritable(True)
+    os.environ[LISTENER_FD_ENV] = str(listener.fileno())
+    os.environ[PENDING_FD_ENV] = str(conn.fileno())
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, [sys.executable, '-m', 'hammett'] + sys.argv[1:])
+
+
+def serve(socket_path=SOCKET_FILENAME, **kwargs):
+    """
+    Keep plugins, conftests and test modules imported and run each request from a client in a fresh forked child.
+    """
+    params = hammett.main_setup(**kwargs)
+    if not hammett.main_preload(**params):
+        return 2
+    file_data = hammett.collect_file_data(hammett.g.source_location)
+    socket_path = abspath(socket_path)
+
+    # Make sure we clean up the socket file when killed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    pending = None
+    if LISTENER_FD_ENV in os.environ:
+        listener = socket.socket(fileno=int(os.environ.pop(LISTENER_FD_ENV)))
+        pending = socket.socket(fileno=int(os.environ.pop(PENDING_FD_ENV)))
+        listener.set_inheritable(False)
+        pending.set_inheritable(False)
+    else:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+        listener.listen()
+        hammett._orig_print(f'hammett daemon listening on {socket_path}')
+
+    try:
+        while True:
+            if pending is not None:
+                conn, pending = pending, None
+            else:
+                conn, _ = listener.accept()
+
+            if stale_imports(file_data):
+                restart(listener, conn)
+
+            with conn:
+                try:
+                    handle_connection(conn)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+    except (KeyboardInterrupt, SystemExit):
+        return 0
+    finally:
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def run_via_daemon(socket_path=SOCKET_FILENAME, **request):
+    """
+    Send a run request to a daemon listening on socket_path and stream its output to stdout.
+
+    Returns the exit code of the run, or None if there is no daemon running.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+
+    with client:
+        client.sendall(json.dumps(request).encode() + b'\n')
+        out = sys.stdout.buffer
+        # The last bytes of the stream is the exit code, so hold them back until we know we've seen them
+        tail = b''
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            data = tail + data
+            out.write(data[:-EXIT_CODE_SIZE])
+            out.flush()
+            tail = data[-EXIT_CODE_SIZE:]
+
+    if len(tail) != EXIT_CODE_SIZE:
+        hammett._orig_print('hammett daemon: connection closed unexpectedly')
+        return 2
+    return struct.unpack(EXIT_CODE_FORMAT, tail)[0]
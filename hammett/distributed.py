@@ -0,0 +1,197 @@
+"""
+Run tests on several machines. A coordinator (`hammett --coordinator host:port`) hands out test files, longest
+first according to the durations in its result db, to workers (`hammett --worker host:port`) that connect to it over
+TCP. The workers need a checkout of the same project in their working directory. They send back results and output
+with the same messages as the local worker pool, and the results end up in the result db of the coordinator.
+"""
+import select
+import socket
+import time
+
+import hammett
+from hammett.ipc import (
+    REPORT_MESSAGES,
+    MessageReader,
+    read_message,
+    receive_report,
+    report_to,
+    write_message,
+)
+
+# The main_setup() arguments of the coordinator that are passed on to the workers
+WORKER_SETUP_KEYS = {'verbose', 'fail_fast', 'markers', 'disable_assert_analyze', 'threads'}
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+class Connection:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.reader = MessageReader(sock.fileno())
+        self.write_f = sock.makefile('wb')
+        # The (filename, tests) the worker is running right now
+        self.unit = None
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, message):
+        try:
+            write_message(self.write_f, message)
+        except (BrokenPipeError, ConnectionResetError):
+            # The worker is gone, we'll see the EOF on the next round
+            pass
+
+    def close(self):
+        try:
+            self.write_f.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.sock.close()
+
+
+def run_coordinator(filenames, conftest_files, markers, clean_up_sys_path, address, setup_kwargs, match=None):
+    """
+    Hand out the test files to the workers that connect to address until all of them have been run.
+    """
+    from hammett.collect import skip_unselected
+    from hammett.impl import FAILED
+    from hammett.pool import print_cached_results
+    from hammett.scheduling import estimate_file_durations
+
+    to_run = print_cached_results(skip_unselected(filenames, markers, match))
+    if not to_run:
+        return hammett.main_finish(clean_up_sys_path)
+
+    estimates = estimate_file_durations([filename for filename, _ in to_run], hammett.g.result_db['durations'])
+    # Workers ask for more work when they're done, so handing out the longest files first balances the load
+    work = sorted(to_run, key=lambda unit: estimates[unit[0]], reverse=True)
+    worker_settings = dict(
+        match=match,
+        record_footprints=hammett.g.record_footprints,
+        setup_kwargs={k: v for k, v in setup_kwargs.items() if k in WORKER_SETUP_KEYS},
+    )
+
+    listener = socket.create_server(parse_address(address))
+    hammett.print(f'hammett coordinator listening on {address}, waiting for workers')
+
+    stopping = False
+    connections = {}
+    try:
+        while connections or (work and not stopping):
+            readable, _, _ = select.select([listener, *connections.values()], [], [])
+            for x in readable:
+                if x is listener:
+                    sock, worker_address = listener.accept()
+                    connection = Connection(sock, worker_address)
+                    connections[connection.fileno()] = connection
+                    connection.send(['setup', worker_settings])
+                    continue
+
+                connection = x
+                try:
+                    messages = connection.reader.read_available()
+                except ConnectionResetError:
+                    messages = None
+                if messages is None:
+                    # Workers stop on their own after a failure with -x
+                    if connection.unit is not None and not stopping:
+                        hammett.print(f'Lost connection to worker {connection.address[0]} while running {connection.unit[0]}')
+                        hammett.g.results['abort'] += 1
+                    del connections[connection.fileno()]
+                    connection.close()
+                    continue
+
+                for message in messages:
+                    if message[0] in REPORT_MESSAGES:
+                        result = receive_report(message)
+                        if hammett.g.fail_fast and result is not None and result.status == FAILED:
+                            stopping = True
+                    elif message[0] == 'abort':
+                        hammett.g.results['abort'] += 1
+                        stopping = True
+                    else:
+                        assert message[0] == 'ready'
+                        connection.unit = None
+                        if stopping or not work:
+                            # Closing the connection tells the worker to stop
+                            del connections[connection.fileno()]
+                            connection.close()
+                            break
+                        connection.unit = work.pop(0)
+                        connection.send(connection.unit)
+    finally:
+        for connection in connections.values():
+            connection.close()
+        listener.close()
+
+    return hammett.main_finish(clean_up_sys_path)
+
+
+def connect(address, timeout):
+    """
+    Connect to the coordinator at address, waiting up to timeout seconds for it to start.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return socket.create_connection(parse_address(address))
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def run_worker(address, cwd=None, timeout=30):
+    """
+    Run the test files the coordinator at address sends us until it closes the connection.
+    """
+    try:
+        sock = connect(address, timeout)
+    except OSError as e:
+        hammett._orig_print(f'hammett worker: failed to connect to {address}: {e}')
+        return 2
+
+    hammett._orig_print(f'hammett worker: connected to {address}')
+    with sock, sock.makefile('rb') as read_f, sock.makefile('wb') as write_f:
+        message = read_message(read_f)
+        if message is None:
+            return 0
+        assert message[0] == 'setup'
+        settings = message[1]
+        match = settings['match']
+
+        # Everything printed is sent to the coordinator
+        params = hammett.main_setup(cwd=cwd, quiet=True, **settings['setup_kwargs'])
+        hammett.set_record_footprints(settings['record_footprints'])
+        send_output = report_to(write_f)
+
+        from hammett.impl import (
+            load_conftests,
+            load_plugins,
+            should_stop,
+        )
+        load_plugins()
+        load_conftests(params['conftest_files'])
+
+        session_request = hammett.Request(scope='session', parent=None)
+        while not should_stop() and not hammett.g.results['abort']:
+            send_output()
+            write_message(write_f, ['ready'])
+            unit = read_message(read_f)
+            if unit is None:
+                break
+            filename, tests = unit
+            hammett.g.tests = set(tests) if tests is not None else None
+            hammett.run_tests_for_filename(filename, session_request, params['markers'], match, hammett.test_module_name(filename), tests)
+        session_request.teardown()
+        send_output()
+
+        if hammett.g.results['abort']:
+            write_message(write_f, ['abort'])
+            return 2
+    return 0
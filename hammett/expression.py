@@ -0,0 +1,265 @@
+"""
+The expressions of -k and -m, with the syntax of pytest:
+
+    expression: (term | 'not' expression | '(' expression ')') (('and' | 'or') expression)*
+
+`and` binds tighter than `or`. For -k a term is a part of the name of a test. For -m a term is a marker name,
+optionally with arguments like `db(5, using='other')`, which have to be literals and match the first arguments and
+the given keyword arguments of the marker. The old `db[5]` works too, it compares the first argument as a string, and so
+does separating markers with `;`, which means the same as `or`.
+
+An expression is compiled once to a predicate that takes a function saying if a term matches a test. That function can
+answer None if it can't know, like when the markers of a test come from reading its file without importing it. The
+predicate then answers None too, unless the rest of the expression decides it anyway (None and False is False).
+"""
+import ast
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import (
+    Optional,
+    Tuple,
+)
+
+KEYWORDS = {'and', 'or', 'not'}
+
+# Like pytest, names in -k can have the characters of parametrized names and paths in them
+KEYWORD_TERM = re.compile(r'(?:\w|:|\+|-|\.|\[|\]|\\|/)+')
+MARKER_NAME = re.compile(r'\w+')
+
+
+class ExpressionError(Exception):
+    def __init__(self, source, column, message):
+        super().__init__(f'{message} at column {column + 1} in {source!r}')
+
+
+@dataclass(frozen=True)
+class MarkerTerm:
+    name: str
+    args: Tuple = ()
+    kwargs: Optional[Tuple] = None
+    # db[5]: the first argument as a string is 5
+    as_string: bool = False
+
+
+def tokenize(source, kind):
+    """
+    Yields (column, token, term), where token is one of the KEYWORDS, '(', ')' or 'term'.
+    """
+    i = 0
+    while i < len(source):
+        c = source[i]
+        if c.isspace():
+            i += 1
+            continue
+        if c in '()':
+            yield i, c, None
+            i += 1
+            continue
+        if c == ';' and kind == 'markers':
+            yield i, 'or', None
+            i += 1
+            continue
+
+        m = (KEYWORD_TERM if kind == 'keywords' else MARKER_NAME).match(source, i)
+        if m is None:
+            raise ExpressionError(source, i, f'unexpected character {c!r}')
+        if m.group() in KEYWORDS:
+            yield i, m.group(), None
+            i = m.end()
+            continue
+
+        if kind == 'keywords':
+            yield i, 'term', m.group()
+            i = m.end()
+            continue
+
+        term, end = marker_term(source, m.group(), m.end())
+        yield i, 'term', term
+        i = end
+
+
+def marker_term(source, name, i):
+    """
+    Read the arguments, if any, of the marker name that ends at i. Returns the MarkerTerm and where it ends.
+    """
+    if source.startswith('[', i):
+        end = source.find(']', i)
+        if end == -1:
+            raise ExpressionError(source, i, 'missing ]')
+        return MarkerTerm(name, (source[i + 1:end].strip(),), as_string=True), end + 1
+
+    if not source.startswith('(', i):
+        return MarkerTerm(name), i
+
+    # The arguments end at the first ) that makes them valid python, parentheses can be in strings
+    end = source.find(')', i)
+    while end != -1:
+        try:
+            call = ast.parse(f'f{source[i:end + 1]}', mode='eval').body
+        except SyntaxError:
+            end = source.find(')', end + 1)
+            continue
+        try:
+            args = tuple(ast.literal_eval(x) for x in call.args)
+            kwargs = tuple(sorted((x.arg, ast.literal_eval(x.value)) for x in call.keywords))
+        except (ValueError, TypeError):
+            raise ExpressionError(source, i, f'the arguments of {name} have to be literals')
+        if any(x is None for x, _ in kwargs):
+            raise ExpressionError(source, i, f'the arguments of {name} have to be literals')
+        return MarkerTerm(name, args, kwargs or None), end + 1
+    raise ExpressionError(source, i, 'missing )')
+
+
+class Parser:
+    def __init__(self, source, kind):
+        self.source = source
+        self.tokens = list(tokenize(source, kind))
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][1]
+        return None
+
+    def take(self, token):
+        if self.peek() != token:
+            column = self.tokens[self.position][0] if self.position < len(self.tokens) else len(self.source)
+            raise ExpressionError(self.source, column, f'expected {token or "end of input"}, got {self.peek() or "end of input"}')
+        if token is None:
+            return None
+        self.position += 1
+        return self.tokens[self.position - 1][2]
+
+    def parse(self):
+        if not self.tokens:
+            return lambda matches: True
+        result = self.or_expression()
+        self.take(None)
+        return result
+
+    def or_expression(self):
+        result = self.and_expression()
+        while self.peek() == 'or':
+            self.take('or')
+            result = or_predicate(result, self.and_expression())
+        return result
+
+    def and_expression(self):
+        result = self.not_expression()
+        while self.peek() == 'and':
+            self.take('and')
+            result = and_predicate(result, self.not_expression())
+        return result
+
+    def not_expression(self):
+        if self.peek() == 'not':
+            self.take('not')
+            return not_predicate(self.not_expression())
+        if self.peek() == '(':
+            self.take('(')
+            result = self.or_expression()
+            self.take(')')
+            return result
+        term = self.take('term')
+        return lambda matches: matches(term)
+
+
+def and_predicate(a, b):
+    def predicate(matches):
+        x = a(matches)
+        if x is False:
+            return False
+        y = b(matches)
+        if y is False:
+            return False
+        return True if x and y else None
+    return predicate
+
+
+def or_predicate(a, b):
+    def predicate(matches):
+        x = a(matches)
+        if x is True:
+            return True
+        y = b(matches)
+        if y is True:
+            return True
+        return False if x is False and y is False else None
+    return predicate
+
+
+def not_predicate(a):
+    def predicate(matches):
+        x = a(matches)
+        return None if x is None else not x
+    return predicate
+
+
+class Expression:
+    def __init__(self, source, kind):
+        self.source = source
+        self.kind = kind
+        self.predicate = Parser(source, kind).parse()
+
+    def __repr__(self):
+        return f'<Expression {self.source!r}>'
+
+    def __reduce__(self):
+        # The predicate is made of closures, so it's compiled again on the other side
+        return compile_expression, (self.source, self.kind)
+
+    def evaluate(self, matches):
+        """
+        True, False or None if it can't be known, with matches(term) answering the same for each term.
+        """
+        return self.predicate(matches)
+
+    def matches_name(self, name):
+        return self.predicate(lambda term: term in name)
+
+    def matches_markers(self, markers):
+        """
+        markers is [(name, args, kwargs)] where args and kwargs are None if they aren't known, or markers is None if
+        the markers themselves aren't known.
+        """
+        return self.predicate(lambda term: marker_matches(term, markers))
+
+
+@lru_cache(maxsize=None)
+def compile_expression(source, kind):
+    """
+    Compile the source of a -k (kind='keywords') or -m (kind='markers') expression. Raises ExpressionError if it isn't
+    valid.
+    """
+    return Expression(source, kind)
+
+
+def marker_matches(term, markers):
+    if markers is None:
+        return None
+    result = False
+    for name, args, kwargs in markers:
+        if name != term.name:
+            continue
+        if term.as_string:
+            if args is None:
+                result = None
+            elif args and str(args[0]) == term.args[0]:
+                return True
+            continue
+
+        if term.args:
+            if args is None:
+                result = None
+                continue
+            if tuple(args[:len(term.args)]) != term.args:
+                continue
+        if term.kwargs:
+            if kwargs is None:
+                result = None
+                continue
+            if any(key not in kwargs or kwargs[key] != value for key, value in term.kwargs):
+                continue
+        return True
+    return result
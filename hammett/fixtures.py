@@ -13,8 +13,9 @@ _capsys_result = namedtuple('_capsys_result', ['out', 'err'])
 def capsys():
     class CaptureFixture:
         def readouterr(self):
-            import hammett
-            return _capsys_result(hammett.g.hijacked_stdout.getvalue(), hammett.g.hijacked_stderr.getvalue())
+            from hammett.impl import captured_output
+            stdout, stderr = captured_output()
+            return _capsys_result(stdout.getvalue(), stderr.getvalue())
 
     return CaptureFixture()
 
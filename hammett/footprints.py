@@ -0,0 +1,120 @@
+"""
+Record the footprint of tests: the project source files they execute. With --use-cache a change to a source file then
+only reruns the tests that executed it.
+
+Python 3.12+ uses sys.monitoring, where each function only reports its first call per test. Older versions use
+sys.settrace with call events only.
+
+The footprint of loading a test module is recorded too. It leaves out the module level code of the modules imported
+for the first time, since which test module happens to do that is arbitrary. What the test module imports is tracked
+by hammett.import_graph instead.
+"""
+import os
+import sys
+from os.path import (
+    abspath,
+    relpath,
+)
+
+import hammett
+
+# Directories that aren't part of the project, the same as collect_file_data skips
+EXCLUDED_DIRS = {'venv', 'env', '__pycache__', 'site-packages'}
+
+_files = set()
+_module_files = set()
+_project_files = {}
+_project_root = None
+_tool_id = None
+_prev_trace = None
+
+
+def project_file(filename):
+    """
+    The name of filename as used in the result db, or None if it's not a source file of the project.
+    """
+    global _project_root
+    root = hammett.g.orig_cwd
+    if root != _project_root:
+        _project_files.clear()
+        _project_root = root
+
+    try:
+        return _project_files[filename]
+    except KeyError:
+        pass
+
+    result = None
+    if filename.endswith('.py'):
+        path = relpath(abspath(filename), root)
+        directories = path.split(os.sep)[:-1]
+        if not path.startswith('..') and not any(x.startswith('.') or x in EXCLUDED_DIRS for x in directories):
+            # The names are shared by lots of footprints, interning them means pickle stores each name once
+            result = sys.intern(path)
+    _project_files[filename] = result
+    return result
+
+
+def _on_py_start(code, instruction_offset):
+    (_module_files if code.co_name == '<module>' else _files).add(code.co_filename)
+    return sys.monitoring.DISABLE
+
+
+def _trace(frame, event, arg):
+    code = frame.f_code
+    (_module_files if code.co_name == '<module>' else _files).add(code.co_filename)
+
+
+def _use_monitoring():
+    """
+    Returns True if we have a sys.monitoring tool id registered for recording.
+    """
+    global _tool_id
+    if _tool_id is None:
+        _tool_id = False
+        if hasattr(sys, 'monitoring'):
+            # Stay clear of the ids reserved for debuggers, coverage, profilers and optimizers
+            for tool_id in (3, 4):
+                try:
+                    sys.monitoring.use_tool_id(tool_id, 'hammett')
+                except ValueError:
+                    continue
+                sys.monitoring.register_callback(tool_id, sys.monitoring.events.PY_START, _on_py_start)
+                _tool_id = tool_id
+                break
+    return _tool_id is not False
+
+
+def start():
+    """
+    Start recording. Returns False if recording isn't possible, for example because a debugger is tracing.
+    """
+    global _prev_trace
+    _files.clear()
+    _module_files.clear()
+    if hasattr(sys, 'monitoring'):
+        if not _use_monitoring():
+            return False
+        # Functions that were already called in an earlier test need to report again
+        sys.monitoring.restart_events()
+        sys.monitoring.set_events(_tool_id, sys.monitoring.events.PY_START)
+        return True
+
+    _prev_trace = sys.gettrace()
+    if _prev_trace is not None:
+        return False
+    sys.settrace(_trace)
+    return True
+
+
+def stop(include_modules=True):
+    """
+    Stop recording and return the project files that were executed since start(). With include_modules=False the
+    module level code of imported modules doesn't count.
+    """
+    if hasattr(sys, 'monitoring'):
+        sys.monitoring.set_events(_tool_id, 0)
+    else:
+        sys.settrace(_prev_trace)
+    files = _files | _module_files if include_modules else _files
+    return frozenset(x for x in map(project_file, files) if x is not None)
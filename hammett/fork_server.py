@@ -0,0 +1,88 @@
+import gc
+import os
+import sys
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import Dict
+
+import hammett
+from hammett.impl import Result
+from hammett.ipc import (
+    exit_code_from_status,
+    read_message,
+    result_from_message,
+    result_to_message,
+    write_message,
+)
+
+
+@dataclass
+class RunResult:
+    exit_code: int
+    results: Dict[str, Result] = field(default_factory=dict)
+
+
+class ForkServer:
+    """
+    Set up hammett and import plugins, conftests and test modules once, then run tests in forked copy-on-write
+    children. This is much cheaper than calling hammett.main() for each run, which matters for mutation testing.
+
+    Usage:
+
+        server = ForkServer(cwd=project_dir)
+        for mutant in mutants:
+            os.environ['MUTANT_UNDER_TEST'] = mutant
+            run_result = server.run(tests=tests_for_mutant[mutant])
+    """
+
+    def __init__(self, cwd=None, filenames=None, markers=None, quiet=True, fail_fast=False, pre_test_callback=None, post_test_callback=None, **kwargs):
+        self.params = hammett.main_setup(cwd=cwd, filenames=filenames, markers=markers, quiet=quiet, fail_fast=fail_fast, pre_test_callback=pre_test_callback, post_test_callback=post_test_callback, **kwargs)
+        if not hammett.main_preload(**self.params):
+            raise RuntimeError('hammett failed to load plugins, conftests or test modules')
+        if hasattr(gc, 'freeze'):
+            # Keep the garbage collector from touching (and thereby copying) the pages of the parent in the children
+            gc.freeze()
+
+    def run(self, tests=None, match=None) -> RunResult:
+        """
+        Run the tests named in `tests` (`filename::test_name`, see `selected_by`), or all tests if None, in a fresh
+        child process.
+        """
+        read_fd, write_fd = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if not pid:
+            os.close(read_fd)
+            self._run_child(os.fdopen(write_fd, 'wb'), tests=tests, match=match)
+
+        os.close(write_fd)
+        results = {}
+        with os.fdopen(read_fd, 'rb') as f:
+            while True:
+                message = read_message(f)
+                if message is None:
+                    break
+                name, result = message
+                results[name] = result_from_message(result)
+
+        _, status = os.waitpid(pid, 0)
+        return RunResult(exit_code=exit_code_from_status(status), results=results)
+
+    def _run_child(self, f, tests, match):
+        exit_code = 2
+        try:
+            hammett.g.result_callback = lambda name, result: write_message(f, [name, result_to_message(result)])
+            exit_code = hammett.main_run_tests(tests=tests, match=match, plugins_loaded=True, conftests_loaded=True, **self.params)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 2
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            f.close()
+            sys.__stdout__.flush()
+            sys.__stderr__.flush()
+            os._exit(exit_code)
@@ -0,0 +1,125 @@
+"""
+Change detection with git, for large repositories where walking and stat-ing every source file is what makes a cached
+run slow. Enable it with `change_detection=git` in the [hammett] section of setup.cfg.
+
+The result db remembers the commit HEAD pointed to and the files that had uncommitted changes at the last run. The
+files that can have changed since then are the ones that differ between that commit and HEAD, the ones that have
+uncommitted changes now and the ones that had them last time. Only those are looked at, the file data of the rest is
+reused as is.
+
+Files that git ignores aren't noticed. Outside a git checkout, or if git fails, hammett falls back to looking at all
+files.
+"""
+import os
+import subprocess
+from os.path import (
+    join,
+    realpath,
+    relpath,
+)
+
+import hammett
+
+
+def git(*args):
+    """
+    The output of the git command, or None if it failed.
+    """
+    try:
+        result = subprocess.run(['git', *args], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=False)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return os.fsdecode(result.stdout)
+
+
+def head():
+    """
+    Returns (top level directory, HEAD commit) of the checkout we're in, or None.
+    """
+    output = git('rev-parse', '--show-toplevel', '--verify', 'HEAD')
+    if output is None:
+        return None
+    lines = output.splitlines()
+    if len(lines) != 2:
+        return None
+    return lines[0], lines[1]
+
+
+def uncommitted_files():
+    """
+    The modified, staged, deleted and untracked files of the checkout, relative to the top level directory.
+    """
+    output = git('status', '--porcelain=v1', '-z', '--untracked-files=all', '--no-renames')
+    if output is None:
+        return None
+    # Each entry is "XY path"
+    return {entry[3:] for entry in output.split('\0') if entry}
+
+
+def changed_files(old_head, new_head):
+    """
+    The files that differ between two commits, relative to the top level directory.
+    """
+    if old_head == new_head:
+        return set()
+    output = git('diff', '--name-only', '-z', '--no-renames', old_head, new_head)
+    if output is None:
+        return None
+    return {x for x in output.split('\0') if x}
+
+
+def is_source_file(filename, path):
+    """
+    Is filename, relative to the working directory, one of the files collect_file_data would find under path?
+    """
+    if not filename.endswith('.py'):
+        return False
+    prefix = relpath(path)
+    if prefix != '.':
+        if not filename.startswith(prefix + os.sep):
+            return False
+        filename = filename[len(prefix) + 1:]
+    if any(hammett.is_ignored_directory(x) for x in filename.split(os.sep)[:-1]):
+        return False
+    from hammett.scan import is_excluded
+    return not is_excluded(filename)
+
+
+def collect_file_data_from_git(path, result_db):
+    """
+    Returns the same as collect_file_data(path, ...), looking only at the files git says can have changed since the
+    last run, or None if git can't tell us. Updates the git state in result_db.
+    """
+    current = head()
+    if current is None:
+        return None
+    toplevel, commit = current
+
+    uncommitted = uncommitted_files()
+    if uncommitted is None:
+        return None
+
+    old_state = result_db.get('git')
+    candidates = None
+    if old_state is not None and old_state['toplevel'] == toplevel and result_db['file_data']:
+        committed = changed_files(old_state['head'], commit)
+        if committed is not None:
+            candidates = committed | uncommitted | old_state['uncommitted']
+
+    new_state = dict(toplevel=toplevel, head=commit, uncommitted=frozenset(uncommitted))
+    if new_state != old_state:
+        result_db['git'] = new_state
+
+    if candidates is None:
+        # Nothing to compare with, so this run looks at everything
+        return hammett.collect_file_data(path, result_db['file_data'])
+
+    # git reports real paths, the working directory can be behind a symlink
+    cwd = realpath(os.getcwd())
+    candidates = {relpath(join(toplevel, x), cwd) for x in candidates}
+    candidates = {x for x in candidates if is_source_file(x, path)}
+    file_data = {k: v for k, v in result_db['file_data'].items() if k not in candidates}
+    file_data.update(hammett.file_data_of(candidates, result_db['file_data']))
+    return file_data
@@ -1,6 +1,7 @@
 import importlib
 import os
 import sys
+import threading
 from collections.abc import Iterable
 from warnings import catch_warnings
 
@@ -104,6 +105,10 @@ fixtures = {}
 auto_use_fixtures = set()
 fixture_scope = {}
 
+# Fixture setup is serialized so session and module fixtures are only created once when running tests in threads
+fixtures_lock = threading.RLock()
+results_lock = threading.RLock()
+
 
 def fixture_function_name(f):
     r = f.__name__
@@ -265,6 +270,16 @@ def should_stop():
     return hammett.g.should_stop
 
 
+def selected_by(name):
+    """
+    The names that select the test name when passed in `tests`: the name itself, the function of a parametrized test
+    and the class of a test method.
+    """
+    base = name.partition('[')[0]
+    filename, _, symbol = base.partition('::')
+    return {name, base, f'{filename}::{symbol.partition(".")[0]}'}
+
+
 def should_skip(_f):
 
     try:
@@ -453,13 +468,15 @@ class Result:
     stderr: str = ''
     stack_trace: str = ''
     feedback_for_exception: str = ''
+    # The project files the test executed, see hammett.footprints
+    footprint: Optional[frozenset] = None
 
 
 def print_status(_name, result: Result):
     verbose = hammett.g.verbose
     message = MESSAGES[result.status]['v' if verbose else 's']
     if verbose:
-        hammett.print(_name + ' ' + message + (str(result.duration) if result.duration else ''))
+        hammett.print(_name + ' ' + message + (str(result.duration) if result.duration and hammett.g.durations else ''))
     else:
         hammett.print(message, end='', flush=True)
 
@@ -485,22 +502,100 @@ def print_status(_name, result: Result):
 
         hammett.print(RESET_COLOR)
 
-    if result.feedback_for_exception:
-        hammett.print(result.feedback_for_exception)
+        if result.feedback_for_exception:
+            hammett.print(result.feedback_for_exception)
 
 
-def inc_test_result(_name, _f, result):
-    print_status(_name, result)
+def print_cached_status(filename):
+    """
+    Print the status of the cached results of filename. Unless we're verbose or a test failed that's just the dots,
+    which the status counts of the result db give without reading the results.
+    """
+    test_results = hammett.g.result_db['test_results']
+    counts = test_results.status_counts(filename)
+    if hammett.g.verbose or counts[FAILED]:
+        for test_name, result in test_results[filename].items():
+            print_status(f'{filename}::{test_name}', result)
+        return
+
+    for status in (SUCCESS, SKIPPED):
+        if counts[status]:
+            hammett.print(MESSAGES[status]['s'] * counts[status], end='', flush=True)
 
-    if hammett.g.fail_fast and result.status not in ('success', 'skipped'):
-        hammett.g.should_stop = True
 
-    filename = _f.__module__.replace('.', os.sep) + '.py'
-    _name = _name[len(_f.__module__) + 1:]
-    hammett.g.result_db['test_results'][filename][_name] = result
+def inc_test_result(_name, _f, result):
+    with results_lock:
+        print_status(_name, result)
+
+        if hammett.g.fail_fast and result.status not in ('success', 'skipped'):
+            hammett.g.should_stop = True
+
+        if hammett.g.result_callback is not None:
+            hammett.g.result_callback(_name, result)
+
+        store_result(_name, result)
+
+
+def store_result(_name, result):
+    filename, _, test_name = _name.partition('::')
+    hammett.g.result_db['test_results'][filename][test_name] = result
+    hammett.g.stored_files.add(filename)
+    stale_tests = hammett.g.result_db['stale_tests']
+    if filename in stale_tests:
+        stale_tests[filename].discard(test_name)
+        if not stale_tests[filename]:
+            del stale_tests[filename]
+    if result.duration:
+        hammett.g.result_db['durations'][filename][test_name] = result.duration.total_seconds()
+    # Saved as the tests run, so a crash or an interrupted run doesn't lose it
+    hammett.write_result_db_periodically()
+
+
+class ThreadLocalStream:
+    """
+    Stands in for sys.stdout or sys.stderr when running tests in threads, so each test captures only its own output.
+    """
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def current(self):
+        return getattr(self.local, 'stream', self.default)
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+
+def redirect_output(stdout, stderr):
+    """
+    Point sys.stdout and sys.stderr to new streams (for the current thread only when running tests in threads) and
+    return the previous ones.
+    """
+    if isinstance(sys.stdout, ThreadLocalStream):
+        prev = sys.stdout.current(), sys.stderr.current()
+        sys.stdout.local.stream = stdout
+        sys.stderr.local.stream = stderr
+        return prev
+
+    prev = sys.stdout, sys.stderr
+    sys.stdout = stdout
+    sys.stderr = stderr
+    return prev
+
+
+def captured_output():
+    """
+    The streams capturing the output of the test running in the current thread.
+    """
+    if isinstance(sys.stdout, ThreadLocalStream):
+        return sys.stdout.current(), sys.stderr.current()
+    return hammett.g.hijacked_stdout, hammett.g.hijacked_stderr
 
 
 def run_test(_name, _f, _module_request, **kwargs):
+    if hammett.g.tests is not None and hammett.g.tests.isdisjoint(selected_by(_name)):
+        return
+
     if should_skip(_f):
         inc_test_result(_name, _f, Result(status=SKIPPED))
         return
@@ -515,31 +610,39 @@ def run_test(_name, _f, _module_request, **kwargs):
     def request():
         return req
 
-    register_fixture(request, module_name='', autouse=True)
+    with fixtures_lock:
+        register_fixture(request, module_name='', autouse=True)
     del request
 
-    hammett.g.hijacked_stdout = StringIO()
-    hammett.g.hijacked_stderr = StringIO()
-    prev_stdout = sys.stdout
-    prev_stderr = sys.stderr
+    hijacked_stdout = StringIO()
+    hijacked_stderr = StringIO()
+    if not isinstance(sys.stdout, ThreadLocalStream):
+        hammett.g.hijacked_stdout = hijacked_stdout
+        hammett.g.hijacked_stderr = hijacked_stderr
 
     status = None
-    duration = None
     start = None
     setup_time = None
     stack_trace = None
     feedback_for_exception = None
 
-    if hammett.g.verbose:
+    # The name is printed again with the result, and would get mixed up with the output of other threads
+    if hammett.g.verbose and not isinstance(sys.stdout, ThreadLocalStream):
         hammett.print(_name + '...', end='', flush=True)
+    # Footprints can't be told apart when several tests run at the same time
+    recording = hammett.g.record_footprints and not isinstance(sys.stdout, ThreadLocalStream)
+    if recording:
+        from hammett import footprints
+        recording = footprints.start()
+
+    test_start = datetime.now()
+    prev_output = redirect_output(hijacked_stdout, hijacked_stderr)
     try:
-        sys.stdout = hammett.g.hijacked_stdout
-        sys.stderr = hammett.g.hijacked_stderr
-
         if hammett.g.durations:
             start = datetime.now()
 
-        resolved_function, resolved_kwargs = dependency_injection(_f, fixtures, request=req)
+        with fixtures_lock:
+            resolved_function, resolved_kwargs = dependency_injection(_f, fixtures, request=req)
         resolved_kwargs = {**resolved_kwargs, **kwargs}
 
         if hammett.g.durations:
@@ -549,15 +652,14 @@ def run_test(_name, _f, _module_request, **kwargs):
         resolved_function(**resolved_kwargs)
 
         if hammett.g.durations:
-            duration = datetime.now() - start
-            hammett.g.durations_results.append((_name, duration, setup_time))
+            hammett.g.durations_results.append((_name, datetime.now() - start, setup_time))
 
-        sys.stdout = prev_stdout
-        sys.stderr = prev_stderr
+        redirect_output(*prev_output)
         status = SUCCESS
     except KeyboardInterrupt:
-        sys.stdout = prev_stdout
-        sys.stderr = prev_stderr
+        redirect_output(*prev_output)
+        if recording:
+            footprints.stop()
 
         hammett.print()
         hammett.print('ABORTED')
@@ -565,13 +667,11 @@ def run_test(_name, _f, _module_request, **kwargs):
         hammett.g.should_stop = True
         return
     except SkipTest:
-        sys.stdout = prev_stdout
-        sys.stderr = prev_stderr
+        redirect_output(*prev_output)
 
         status = SKIPPED
     except:
-        sys.stdout = prev_stdout
-        sys.stderr = prev_stderr
+        redirect_output(*prev_output)
 
         import traceback
         stack_trace = traceback.format_exc()
@@ -583,13 +683,18 @@ def run_test(_name, _f, _module_request, **kwargs):
 
     assert status is not None
 
+    # This includes fixture setup, since that is what matters for scheduling
+    duration = datetime.now() - test_start
+    footprint = footprints.stop() if recording else None
+
     result = Result(
         status=status,
         duration=duration,
-        stdout=hammett.g.hijacked_stdout.getvalue(),
-        stderr=hammett.g.hijacked_stderr.getvalue(),
+        stdout=hijacked_stdout.getvalue(),
+        stderr=hijacked_stderr.getvalue(),
         stack_trace=stack_trace,
         feedback_for_exception=feedback_for_exception,
+        footprint=footprint,
     )
 
     inc_test_result(_name, _f, result=result)
@@ -610,11 +715,14 @@ def run_test(_name, _f, _module_request, **kwargs):
 
 
 
-def execute_parametrize(_name, _f, _stack, _module_request, **kwargs):
+def parametrize_cases(_name, _stack, **kwargs):
+    """
+    Yields (name, kwargs) for each case of a parametrized test.
+    """
     if not _stack:
         param_names = [f'{k}={v!r}' for k, v in kwargs.items()]
-        _name = f'{_name}[{", ".join(param_names)}]'
-        return run_test(_name, _f, _module_request=_module_request, **kwargs)
+        yield f'{_name}[{", ".join(param_names)}]', kwargs
+        return
 
     names, param_list = _stack[0]
     if isinstance(names, str):
@@ -625,7 +733,12 @@ def execute_parametrize(_name, _f, _stack, _module_request, **kwargs):
     for params in param_list:
         if not isinstance(params, (list, tuple)):
             params = [params]
-        execute_parametrize(_name, _f, _stack[1:], _module_request, **{**dict(zip(names, params)), **kwargs})
+        yield from parametrize_cases(_name, _stack[1:], **{**dict(zip(names, params)), **kwargs})
+
+
+def execute_parametrize(_name, _f, _stack, _module_request):
+    for name, kwargs in parametrize_cases(_name, _stack):
+        run_test(name, _f, _module_request=_module_request, **kwargs)
         if should_stop():
             break
 
@@ -637,6 +750,59 @@ def execute_test_function(_name, _f, module_request):
         return run_test(_name, _f, module_request)
 
 
+def test_names(_name, _f, is_test_function):
+    """
+    The names of the tests execute_test_function or execute_test_class will run for _f.
+    """
+    if not is_test_function:
+        return [
+            name
+            for member_name in dir(_f)
+            if member_name.startswith('test_')
+            for name in test_names(f'{_name}.{member_name}', getattr(_f, member_name), is_test_function=True)
+        ]
+
+    if getattr(_f, 'hammett_parametrize_stack', None):
+        return [name for name, _ in parametrize_cases(_name, _f.hammett_parametrize_stack)]
+    return [_name]
+
+
+def is_thread_safe(_f):
+    return any(marker.name == 'thread_safe' for marker in getattr(_f, 'hammett_markers', []))
+
+
+def execute_tests_in_threads(tests, module_request):
+    """
+    Run (name, f, is_test_function) tests concurrently in hammett.g.threads threads. Each case of a parametrized test is
+    run separately, test classes are run one class per thread.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run_unless_stopped(f, *args, **kwargs):
+        if not should_stop():
+            f(*args, **kwargs)
+
+    prev_output = sys.stdout, sys.stderr
+    sys.stdout = ThreadLocalStream(sys.stdout)
+    sys.stderr = ThreadLocalStream(sys.stderr)
+    try:
+        with ThreadPoolExecutor(max_workers=hammett.g.threads) as executor:
+            futures = []
+            for _name, _f, is_test_function in tests:
+                if not is_test_function:
+                    futures.append(executor.submit(run_unless_stopped, execute_test_class, _name, _f, module_request))
+                elif getattr(_f, 'hammett_parametrize_stack', None):
+                    for name, kwargs in parametrize_cases(_name, _f.hammett_parametrize_stack):
+                        futures.append(executor.submit(run_unless_stopped, run_test, name, _f, module_request, **kwargs))
+                else:
+                    futures.append(executor.submit(run_unless_stopped, run_test, _name, _f, module_request))
+
+            for future in futures:
+                future.result()
+    finally:
+        sys.stdout, sys.stderr = prev_output
+
+
 def execute_test_class(_name, _c, module_request):
     test_case = _c()
     try:
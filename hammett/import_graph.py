@@ -0,0 +1,98 @@
+"""
+Record which project files import values from which other project files, by wrapping builtins.__import__. With
+--use-cache a changed file invalidates the tests that depend on it through these imports, see drop_stale_results.
+
+Importing only functions from a module doesn't make an edge: a test that calls them has the module in its footprint
+(see hammett.footprints) anyway.
+"""
+import builtins
+import sys
+import types
+from collections import defaultdict
+from importlib.util import resolve_name
+
+import hammett
+from hammett.footprints import project_file
+
+# project directory -> (importer -> imported), for the imports that happened in this process
+_edges = defaultdict(lambda: defaultdict(set))
+_orig_import = None
+
+
+def _record(globals, name, fromlist, level):
+    importer = project_file((globals or {}).get('__file__') or '')
+    if importer is None:
+        return
+    edges = _edges[hammett.g.orig_cwd][importer]
+
+    try:
+        module_name = resolve_name('.' * level + name, globals.get('__package__')) if level else name
+    except (ImportError, ValueError):
+        return
+
+    imported = []
+    if not fromlist:
+        imported.append(module_name)
+    else:
+        module = sys.modules.get(module_name)
+        for x in fromlist:
+            if f'{module_name}.{x}' in sys.modules:
+                imported.append(f'{module_name}.{x}')
+            elif not isinstance(getattr(module, x, None), types.FunctionType):
+                imported.append(module_name)
+
+    for x in imported:
+        filename = getattr(sys.modules.get(x), '__file__', None)
+        if filename:
+            filename = project_file(filename)
+            if filename is not None and filename != importer:
+                edges.add(filename)
+
+
+def _import(name, globals=None, locals=None, fromlist=(), level=0):
+    result = _orig_import(name, globals, locals, fromlist, level)
+    if hammett.g.record_footprints:
+        _record(globals, name, fromlist, level)
+    return result
+
+
+def install():
+    global _orig_import
+    if _orig_import is None:
+        _orig_import = builtins.__import__
+        builtins.__import__ = _import
+
+
+def recorded_edges():
+    return {importer: frozenset(imported) for importer, imported in _edges[hammett.g.orig_cwd].items()}
+
+
+def add_edges(edges):
+    """
+    Add edges recorded in another process.
+    """
+    for importer, imported in edges.items():
+        _edges[hammett.g.orig_cwd][sys.intern(importer)].update(imported)
+
+
+def dependencies(graph, filenames, cache=None):
+    """
+    The files that filenames import values from, directly or indirectly, including filenames themselves. Pass the same
+    dict as cache to reuse the work between calls with the same graph.
+    """
+    if cache is None:
+        cache = {}
+
+    result = set()
+    for filename in filenames:
+        if filename not in cache:
+            closure = {filename}
+            stack = [filename]
+            while stack:
+                for x in graph.get(stack.pop(), ()):
+                    if x not in closure:
+                        closure.add(x)
+                        stack.append(x)
+            cache[filename] = frozenset(closure)
+        result |= cache[filename]
+    return result
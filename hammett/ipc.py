@@ -0,0 +1,151 @@
+"""
+Helpers for passing messages and test results between hammett processes. Messages are newline separated JSON, so
+they're safe to read from other machines too.
+"""
+import json
+import os
+import sys
+from datetime import timedelta
+
+import hammett
+from hammett.impl import (
+    Result,
+    store_result,
+)
+
+# The messages sent by report_to, to be handled with receive_report
+REPORT_MESSAGES = {'output', 'result', 'load_footprint', 'import_graph'}
+
+
+def write_message(f, message):
+    f.write(json.dumps(message).encode() + b'\n')
+    f.flush()
+
+
+def read_message(f):
+    """
+    Returns None when the other end has closed the connection.
+    """
+    line = f.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def result_to_message(result: Result):
+    duration = result.duration.total_seconds() if isinstance(result.duration, timedelta) else result.duration
+    return dict(
+        status=result.status,
+        duration=duration,
+        stdout=result.stdout,
+        stderr=result.stderr,
+        stack_trace=result.stack_trace,
+        feedback_for_exception=result.feedback_for_exception,
+        footprint=sorted(result.footprint) if result.footprint is not None else None,
+    )
+
+
+def result_from_message(message) -> Result:
+    duration = message['duration']
+    if duration:
+        duration = timedelta(seconds=duration)
+    footprint = message.get('footprint')
+    if footprint is not None:
+        footprint = frozenset(map(sys.intern, footprint))
+    return Result(**{**message, 'duration': duration, 'footprint': footprint})
+
+
+def report_to(f):
+    """
+    Send the test results and everything printed by hammett in this process to f. Returns a function to call to send
+    output printed outside of tests.
+    """
+    sent_output = len(hammett.g.output)
+    sent_load_footprints = set()
+    sent_edges = {}
+
+    def send_output():
+        nonlocal sent_output
+        output = [[str(arg), end] for arg, end, _ in hammett.g.output[sent_output:]]
+        sent_output = len(hammett.g.output)
+        if output:
+            write_message(f, ['output', output])
+
+        for filename, load_footprint in hammett.g.result_db['load_footprints'].items():
+            if filename not in sent_load_footprints:
+                sent_load_footprints.add(filename)
+                write_message(f, ['load_footprint', filename, sorted(load_footprint)])
+
+        from hammett.import_graph import recorded_edges
+        edges = {
+            importer: sorted(imported)
+            for importer, imported in recorded_edges().items()
+            if sent_edges.get(importer) != imported
+        }
+        if edges:
+            sent_edges.update({importer: frozenset(imported) for importer, imported in edges.items()})
+            write_message(f, ['import_graph', edges])
+
+    def result_callback(name, result):
+        # The output of a test (status, failure information) is sent before the result so it's printed in one piece
+        send_output()
+        write_message(f, ['result', name, result_to_message(result)])
+
+    hammett.g.result_callback = result_callback
+    return send_output
+
+
+def receive_report(message):
+    """
+    Print the output or store the result sent by report_to. Returns the Result for result messages.
+    """
+    if message[0] == 'output':
+        for arg, end in message[1]:
+            hammett.print(arg, end=end)
+        sys.__stdout__.flush()
+        return None
+
+    if message[0] == 'import_graph':
+        from hammett.import_graph import add_edges
+        add_edges({importer: map(sys.intern, imported) for importer, imported in message[1].items()})
+        return None
+
+    if message[0] == 'load_footprint':
+        _, filename, load_footprint = message
+        hammett.g.result_db['load_footprints'][filename] = frozenset(map(sys.intern, load_footprint))
+        return None
+
+    _, name, result = message
+    result = result_from_message(result)
+    store_result(name, result)
+    return result
+
+
+def exit_code_from_status(status):
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return 2
+
+
+class MessageReader:
+    """
+    Reads messages from a file descriptor without blocking on partial lines, for use with select().
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.buffer = b''
+
+    def fileno(self):
+        return self.fd
+
+    def read_available(self):
+        """
+        Returns the complete messages available, or None when the other end has closed the connection.
+        """
+        data = os.read(self.fd, 65536)
+        if not data:
+            return None
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = lines.pop()
+        return [json.loads(line) for line in lines]
@@ -0,0 +1,118 @@
+"""
+The startup manifest makes a run where every result is cached almost free. A --use-cache run that didn't have to run
+any tests writes what it printed and its exit code to the manifest, together with the size and modification time of
+every file that could change that (the source files, the test files and setup.cfg) and the contents of the directories
+where new ones would show up. The next run with the same arguments checks those first (see main_cli) and if nothing has
+changed it prints the output again and exits, before anything else is imported or read.
+
+Only os, sys and marshal are used here, since this runs before anything else.
+"""
+import marshal
+import os
+import sys
+
+MANIFEST_FILENAME = '.hammett-manifest'
+MANIFEST_VERSION = 1
+
+
+def fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def directory_fingerprint(path):
+    """
+    The names in a directory. Hidden files are left out, since the result db and the manifest are among them.
+    """
+    try:
+        return tuple(sorted(x for x in os.listdir(path) if not x.startswith('.') and x != '__pycache__'))
+    except OSError:
+        return None
+
+
+def manifest_key(args):
+    """
+    The things besides the files that need to be the same for the output to be the same.
+    """
+    import hammett
+    return MANIFEST_VERSION, hammett.__version__, sys.executable, sys.version, os.getcwd(), tuple(args)
+
+
+def cached_run(args):
+    """
+    If the manifest says that a run with these arguments would only print cached results, print them and return the
+    exit code. Returns None otherwise.
+    """
+    try:
+        with open(MANIFEST_FILENAME, 'rb') as f:
+            manifest = marshal.load(f)
+        if manifest['key'] != manifest_key(args):
+            return None
+        files = manifest['files']
+        directories = manifest['directories']
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+        return None
+
+    for path, x in files.items():
+        if fingerprint(path) != x:
+            return None
+    for path, x in directories.items():
+        if directory_fingerprint(path) != x:
+            return None
+
+    sys.stdout.write(manifest['output'])
+    sys.stdout.flush()
+    return manifest['exit_code']
+
+
+def remove_manifest():
+    try:
+        os.remove(MANIFEST_FILENAME)
+    except FileNotFoundError:
+        pass
+
+
+def watched_directories(filenames):
+    """
+    The directories where new test or source files would be found.
+    """
+    from hammett import (
+        g,
+        is_ignored_directory,
+    )
+    roots = [f'tests{os.sep}', f'test{os.sep}', f'docs{os.sep}'] + [os.path.join(g.source_location, x) for x in g.modules]
+    directories = {'.', g.source_location}
+    for root in roots:
+        for path, dirs, _ in os.walk(root):
+            dirs[:] = [x for x in dirs if x != '__pycache__']
+            directories.add(os.path.normpath(path))
+    for path, dirs, _ in os.walk(g.source_location):
+        dirs[:] = [x for x in dirs if not is_ignored_directory(x)]
+        directories.add(os.path.normpath(path))
+    directories.update(os.path.dirname(x) or '.' for x in filenames)
+    return directories
+
+
+def write_manifest(args, filenames, exit_code):
+    """
+    Write the manifest for a run with args that found everything cached. filenames are the test and conftest files.
+    """
+    from hammett import g
+
+    directories = {path: directory_fingerprint(path) for path in watched_directories(filenames)}
+    files = {path: fingerprint(path) for path in [*filenames, 'setup.cfg']}
+    # These were recorded when the files were hashed, so a change during the run isn't missed
+    for path, data in (g.result_db['file_data'] or {}).items():
+        files[path] = data[:2]
+
+    output = '' if g.quiet else ''.join(f'{arg}{end}' for arg, end, _ in g.output)
+    manifest = dict(key=manifest_key(args), files=files, directories=directories, output=output, exit_code=exit_code)
+
+    # Written to a temporary file first, so a concurrent run never reads half of it
+    tmp_filename = f'{MANIFEST_FILENAME}.{os.getpid()}'
+    with open(tmp_filename, 'wb') as f:
+        marshal.dump(manifest, f)
+    os.replace(tmp_filename, MANIFEST_FILENAME)
@@ -0,0 +1,245 @@
+import os
+import select
+import sys
+from collections import deque
+
+import hammett
+from hammett.ipc import (
+    REPORT_MESSAGES,
+    MessageReader,
+    exit_code_from_status,
+    read_message,
+    receive_report,
+    report_to,
+    write_message,
+)
+from hammett.scheduling import lpt_assign
+
+
+def make_work_units(test_names_by_filename, processes, estimates=None):
+    """
+    Split the tests into work units of (filename, test names) of roughly equal expected duration. The tests of a file
+    are kept together as far as possible so module fixtures aren't set up in more workers than needed.
+    """
+    def cost(name):
+        return 1 if estimates is None else estimates[name]
+
+    total = sum(cost(name) for names in test_names_by_filename.values() for name in names)
+    target = total / (processes * 4)
+
+    units = []
+    for filename, names in test_names_by_filename.items():
+        chunk = []
+        chunk_cost = 0
+        for name in names:
+            chunk.append(name)
+            chunk_cost += cost(name)
+            if chunk_cost >= target:
+                units.append((filename, chunk))
+                chunk = []
+                chunk_cost = 0
+        if chunk:
+            units.append((filename, chunk))
+    return units
+
+
+class WorkQueues:
+    """
+    One queue of work units per worker. The units are distributed longest first (see lpt_assign) and each worker
+    takes work from the front of its own queue. When that is empty it steals from the back of the queue with the most
+    work left.
+    """
+
+    def __init__(self, units, count, cost=lambda unit: 1):
+        self.cost = cost
+        buckets, self.loads = lpt_assign(units, count, cost)
+        self.queues = [deque(x) for x in buckets]
+
+    def next_for(self, index):
+        if not self.queues[index]:
+            index = max(range(len(self.queues)), key=lambda i: (bool(self.queues[i]), self.loads[i]))
+            if not self.queues[index]:
+                return None
+            unit = self.queues[index].pop()
+        else:
+            unit = self.queues[index].popleft()
+        self.loads[index] -= self.cost(unit)
+        return unit
+
+
+class Worker:
+    def __init__(self, index, pid, reader, write_fd):
+        self.index = index
+        self.pid = pid
+        self.reader = reader
+        self.write_f = os.fdopen(write_fd, 'wb')
+
+    def fileno(self):
+        return self.reader.fd
+
+
+def worker_main(index, read_f, write_f, markers, match):
+    """
+    The loop of a forked worker: ask the parent for work, run it, repeat until the parent closes the pipe. Results and
+    everything printed are sent to the parent.
+    """
+    from hammett.impl import should_stop
+
+    # xdist emulation, this is needed for non-memory DBs
+    hammett.Config.workerinput = dict(workerid=f'gw{index}')
+
+    # The parent saves the results we send it
+    hammett.g.use_cache = False
+    send_output = report_to(write_f)
+
+    session_request = hammett.Request(scope='session', parent=None)
+    while not should_stop() and not hammett.g.results['abort']:
+        send_output()
+        write_message(write_f, ['ready'])
+        message = read_message(read_f)
+        if message is None:
+            break
+        filename, tests = message
+        hammett.g.tests = set(tests)
+        hammett.run_tests_for_filename(filename, session_request, markers, match, hammett.test_module_name(filename), tests)
+    session_request.teardown()
+    send_output()
+
+    return 2 if hammett.g.results['abort'] else 0
+
+
+def start_worker(index, workers, markers, match):
+    to_worker_read, to_worker_write = os.pipe()
+    from_worker_read, from_worker_write = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if not pid:
+        exit_code = 2
+        try:
+            os.close(to_worker_write)
+            os.close(from_worker_read)
+            # The pipes of the other workers must be closed, or they won't see the parent closing them
+            for worker in workers:
+                worker.write_f.close()
+                os.close(worker.reader.fd)
+            # Printing goes through the parent
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, 1)
+            os.close(devnull)
+            with os.fdopen(to_worker_read, 'rb') as read_f, os.fdopen(from_worker_write, 'wb') as write_f:
+                exit_code = worker_main(index, read_f, write_f, markers, match)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            sys.__stdout__.flush()
+            sys.__stderr__.flush()
+            os._exit(exit_code)
+
+    os.close(to_worker_read)
+    os.close(from_worker_write)
+    return Worker(index, pid, MessageReader(from_worker_read), to_worker_write)
+
+
+def print_cached_results(filenames):
+    """
+    Print the cached results of the test files that have them. Returns (filename, tests) for the files that need to
+    run, where tests is None to run all of the file or else the full names of the stale tests in it.
+    """
+    from hammett.impl import print_cached_status
+    from hammett.scheduling import db_filename
+
+    result_db = hammett.g.result_db
+    to_run = []
+    for test_filename in sorted(filenames):
+        cache_filename = db_filename(test_filename)
+        if cache_filename in result_db['test_results']:
+            print_cached_status(cache_filename)
+            stale = result_db['stale_tests'].get(cache_filename)
+            if stale:
+                to_run.append((test_filename, sorted(f'{cache_filename}::{x}' for x in stale)))
+        else:
+            to_run.append((test_filename, None))
+    return to_run
+
+
+def run_pool(filenames, conftest_files, markers, clean_up_sys_path, match=None, processes=None):
+    """
+    Run the tests in a pool of forked workers. The parent loads plugins, conftests and test modules and collects the
+    individual tests before forking so the workers don't have to.
+    """
+    if not filenames:
+        return hammett.main_run_tests(filenames, conftest_files, markers, clean_up_sys_path)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    from hammett.collect import skip_unselected
+    filenames = skip_unselected(filenames, markers, match)
+
+    if not hammett.main_preload(filenames, conftest_files):
+        return 2
+
+    from hammett.impl import FAILED
+
+    test_names_by_filename = {}
+    for test_filename, tests in print_cached_results(filenames):
+        names = hammett.collect_test_names(test_filename, markers, match)
+        if tests is not None:
+            names = [x for x in names if x in tests]
+        test_names_by_filename[test_filename] = names
+
+    from hammett.scheduling import estimate_durations
+    estimates = estimate_durations(
+        [name for names in test_names_by_filename.values() for name in names],
+        hammett.g.result_db['durations'],
+    )
+    queues = WorkQueues(
+        make_work_units(test_names_by_filename, processes, estimates),
+        processes,
+        cost=lambda unit: sum(estimates[name] for name in unit[1]),
+    )
+
+    workers = []
+    for index in range(processes):
+        workers.append(start_worker(index, workers, markers, match))
+
+    stopping = False
+    running = {worker.fileno(): worker for worker in workers}
+    while running:
+        readable, _, _ = select.select(list(running.values()), [], [])
+        for worker in readable:
+            messages = worker.reader.read_available()
+            if messages is None:
+                if not worker.write_f.closed:
+                    # The worker stopped on its own: fail fast or an abort
+                    stopping = True
+                    worker.write_f.close()
+                os.close(worker.reader.fd)
+                del running[worker.fileno()]
+                continue
+
+            for message in messages:
+                if message[0] in REPORT_MESSAGES:
+                    result = receive_report(message)
+                    if hammett.g.fail_fast and result is not None and result.status == FAILED:
+                        stopping = True
+                else:
+                    assert message[0] == 'ready'
+                    unit = None if stopping else queues.next_for(worker.index)
+                    if unit is None:
+                        worker.write_f.close()
+                        continue
+                    try:
+                        write_message(worker.write_f, unit)
+                    except BrokenPipeError:
+                        # The worker crashed, we'll see the EOF on the next round
+                        pass
+
+    for worker in workers:
+        _, status = os.waitpid(worker.pid, 0)
+        if exit_code_from_status(status):
+            hammett.g.results['abort'] += 1
+
+    return hammett.main_finish(clean_up_sys_path)
@@ -0,0 +1,259 @@
+"""
+One walk over the project that finds both the test files and the python files whose contents the result db keeps track
+of (see collect_file_data). The walk uses os.scandir, so the type of each entry comes from the directory listing, and
+skips the directories that can't have anything of ours in them: hidden directories, virtualenvs, __pycache__,
+node_modules, everything .gitignore files ignore, and whatever matches the patterns of `exclude` in the [hammett]
+section of setup.cfg (one per line, with the syntax of .gitignore).
+
+On a slow network file system the directories below the top level can be walked in several threads with `scan_threads`
+in setup.cfg. os.scandir and os.stat release the GIL while waiting for the file system.
+"""
+import os
+import re
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+import hammett
+
+GITIGNORE_FILENAME = '.gitignore'
+
+
+@dataclass
+class Scan:
+    # filename -> (size, nanosecond modification time) for the python files under the file data root
+    files: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    test_files: List[str] = field(default_factory=list)
+    conftest_files: List[str] = field(default_factory=list)
+
+
+def glob_to_regex(pattern):
+    """
+    Translate a pattern of a .gitignore file, without the leading / and trailing /, to a regex.
+    """
+    result = ''
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            result += '(?:.*/)?'
+            i += 3
+            continue
+        if pattern.startswith('/**', i) and i + 3 == len(pattern):
+            result += '/.*'
+            i += 3
+            continue
+        if c == '*':
+            result += '.*' if pattern.startswith('**', i) else '[^/]*'
+            i += 2 if pattern.startswith('**', i) else 1
+            continue
+        if c == '?':
+            result += '[^/]'
+        elif c == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                result += re.escape(c)
+            else:
+                content = pattern[i + 1:end]
+                if content.startswith('!'):
+                    content = '^' + content[1:]
+                result += f'[{content}]'
+                i = end
+        elif c == '\\' and i + 1 < len(pattern):
+            i += 1
+            result += re.escape(pattern[i])
+        else:
+            result += re.escape(c)
+        i += 1
+    return re.compile(result + r'\Z')
+
+
+def parse_rules(lines, base):
+    """
+    Returns the rules of the lines of a .gitignore file in the directory base (relative to the working directory, ''
+    for the working directory itself), as (base, regex, negated, only directories, matches the full path).
+    """
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line.endswith('\\ '):
+            line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        only_directories = line.endswith('/')
+        line = line.rstrip('/')
+        # A pattern with a slash at the start or in the middle is relative to the directory of the .gitignore file
+        anchored = '/' in line
+        line = line.lstrip('/')
+        if not line:
+            continue
+        rules.append((base, glob_to_regex(line), negated, only_directories, anchored))
+    return rules
+
+
+def read_rules(directory, base):
+    try:
+        with open(os.path.join(directory, GITIGNORE_FILENAME)) as f:
+            return parse_rules(f.readlines(), base)
+    except (OSError, UnicodeDecodeError):
+        return []
+
+
+def setting_rules():
+    return parse_rules(hammett.g.settings.get('exclude', '').strip().split('\n'), '')
+
+
+def is_ignored(path, is_dir, rules):
+    """
+    Is path (relative to the working directory, with / as separator) ignored by rules? The last rule that matches
+    decides, like in git.
+    """
+    ignored = False
+    name = path.rpartition('/')[2]
+    for base, regex, negated, only_directories, anchored in rules:
+        if only_directories and not is_dir:
+            continue
+        if base:
+            if not path.startswith(base + '/'):
+                continue
+            relative = path[len(base) + 1:]
+        else:
+            relative = path
+        if regex.match(relative if anchored else name):
+            ignored = not negated
+    return ignored
+
+
+def is_excluded(filename):
+    """
+    Is filename, relative to the working directory, excluded by the exclude setting?
+    """
+    path = filename.replace(os.sep, '/')
+    rules = setting_rules()
+    parts = path.split('/')
+    return any(is_ignored('/'.join(parts[:i]), i < len(parts), rules) for i in range(1, len(parts) + 1))
+
+
+def normalize(path):
+    path = os.path.normpath(path)
+    return '' if path == '.' else path
+
+
+def is_within(path, root):
+    return root == '' or path == root or path.startswith(root + os.sep)
+
+
+def initial_rules(directory):
+    """
+    The rules of the .gitignore files in the directories from the working directory down to, but not including,
+    directory. Those in directory itself are read by walk.
+    """
+    if not directory or os.path.isabs(directory) or directory.startswith(os.pardir):
+        return []
+    rules = read_rules('.', '')
+    parts = directory.split(os.sep)
+    for i in range(1, len(parts)):
+        base = os.sep.join(parts[:i])
+        rules += read_rules(base, base.replace(os.sep, '/'))
+    return rules
+
+
+def walk(jobs, test_roots, data_root, excludes, result, descend=True):
+    """
+    Walk the (directory, .gitignore rules) in jobs and everything below them, adding what's found to result. With
+    descend=False only the directories in jobs are read, and the directories below them are returned instead.
+    """
+    def ignored(path, is_dir):
+        path = path.replace(os.sep, '/')
+        # The exclude setting can't be overridden by a .gitignore file
+        return is_ignored(path, is_dir, rules) or is_ignored(path, is_dir, excludes)
+
+    stack = list(jobs)
+    not_walked = []
+    while stack:
+        directory, rules = stack.pop()
+        try:
+            entries = list(os.scandir(directory or '.'))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+        if any(x.name == GITIGNORE_FILENAME for x in entries):
+            # The rules of nested .gitignore files come after those of their parents, so they win
+            rules = rules + read_rules(directory or '.', directory.replace(os.sep, '/'))
+        in_tests = any(is_within(directory, x) for x in test_roots)
+        in_data = data_root is not None and is_within(directory, data_root)
+
+        for entry in entries:
+            path = os.path.join(directory, entry.name) if directory else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if hammett.is_ignored_directory(entry.name) or ignored(path, True):
+                        continue
+                    if in_tests or in_data:
+                        (stack if descend else not_walked).append((path, rules))
+                    continue
+
+                if not entry.name.endswith('.py') or ignored(path, False):
+                    continue
+                if in_tests:
+                    if hammett.is_test_file(entry.name):
+                        result.test_files.append(path)
+                    elif entry.name == 'conftest.py':
+                        result.conftest_files.append(path)
+                if in_data:
+                    stat = entry.stat()
+                    result.files[path] = (stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                continue
+    return not_walked
+
+
+def scan(test_roots, data_root=None):
+    """
+    Walk the test_roots, to find the test and conftest files, and data_root, to find the python files and their size
+    and modification time, in one pass.
+    """
+    test_roots = [normalize(x) for x in test_roots]
+    if data_root is not None:
+        data_root = normalize(data_root)
+    roots = set(test_roots) | ({data_root} if data_root is not None else set())
+    # Roots inside other roots are walked as part of those
+    jobs = [
+        (x, initial_rules(x))
+        for x in sorted(roots)
+        if not any(x != y and is_within(x, y) for y in roots) and os.path.isdir(x or '.')
+    ]
+
+    excludes = setting_rules()
+    result = Scan()
+    threads = int(hammett.g.settings.get('scan_threads', 1))
+    if threads > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        def walk_subdirectory(job):
+            part = Scan()
+            walk([job], test_roots, data_root, excludes, part)
+            return part
+
+        subdirectories = walk(jobs, test_roots, data_root, excludes, result, descend=False)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for part in executor.map(walk_subdirectory, subdirectories):
+                result.files.update(part.files)
+                result.test_files.extend(part.test_files)
+                result.conftest_files.extend(part.conftest_files)
+    else:
+        walk(jobs, test_roots, data_root, excludes, result)
+
+    result.test_files.sort()
+    # Like a top down walk, so the conftests of a directory are loaded before those below it
+    result.conftest_files.sort(key=lambda x: (x.count(os.sep), x))
+    return result
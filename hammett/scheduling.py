@@ -0,0 +1,108 @@
+"""
+Scheduling of tests over parallel workers, based on the durations of earlier runs recorded in the result db.
+"""
+import heapq
+import os
+import zlib
+from collections import defaultdict
+from statistics import (
+    mean,
+    median,
+)
+
+# Used when there is no history at all, which makes the scheduling count based
+DEFAULT_DURATION = 1.0
+
+
+def estimate_durations(test_names, durations):
+    """
+    Returns a dict from full test name to its expected duration in seconds. Tests that have no recorded duration get
+    the mean of the other cases of the same parametrized test, or else the mean of the tests in the same file, or
+    else the median of all known tests.
+    """
+    all_known = [d for x in durations.values() for d in x.values()]
+    fallback = median(all_known) if all_known else DEFAULT_DURATION
+
+    by_function = defaultdict(list)
+    for filename, file_durations in durations.items():
+        for test_name, duration in file_durations.items():
+            by_function[filename, test_name.partition('[')[0]].append(duration)
+
+    result = {}
+    for name in test_names:
+        filename, _, test_name = name.partition('::')
+        file_durations = durations.get(filename, {})
+        duration = file_durations.get(test_name)
+        if duration is None:
+            siblings = by_function.get((filename, test_name.partition('[')[0]))
+            if siblings:
+                duration = mean(siblings)
+            elif file_durations:
+                duration = mean(file_durations.values())
+            else:
+                duration = fallback
+        result[name] = duration
+    return result
+
+
+def db_filename(filename):
+    """
+    The name of a test file as used in the result db.
+    """
+    return filename[2:] if filename.startswith(f'.{os.sep}') else filename
+
+
+def estimate_file_durations(filenames, durations):
+    """
+    Returns a dict from filename to its expected duration in seconds: the sum of the durations of its tests, or the
+    median of the files we know about.
+    """
+    totals = {
+        filename: sum(file_durations.values())
+        for filename, file_durations in durations.items()
+        if file_durations
+    }
+    fallback = median(totals.values()) if totals else DEFAULT_DURATION
+    return {
+        filename: totals.get(db_filename(filename), fallback)
+        for filename in filenames
+    }
+
+
+def lpt_assign(items, count, cost):
+    """
+    Longest processing time first: go through the items from the most to the least expensive and give each to the
+    bucket with the least total cost so far. Returns the buckets (each sorted most expensive first) and their costs.
+
+    Ties are broken on the order of items and buckets, so the result is deterministic.
+    """
+    buckets = [[] for _ in range(count)]
+    loads = [0.0] * count
+    heap = [(0.0, i) for i in range(count)]
+    for item in sorted(items, key=cost, reverse=True):
+        load, i = heapq.heappop(heap)
+        buckets[i].append(item)
+        loads[i] = load + cost(item)
+        heapq.heappush(heap, (loads[i], i))
+    return buckets, loads
+
+
+def shard_filenames(filenames, index, count, durations):
+    """
+    The test files of shard number index (counting from 1) out of count. The files are balanced on their recorded
+    durations if there are any, otherwise they're spread by a hash of the filename. Both are deterministic, so
+    separate processes with the same files and durations agree on the split.
+    """
+    def key(filename):
+        return db_filename(filename).replace(os.sep, '/')
+
+    if not any(durations.values()):
+        return sorted(
+            filename
+            for filename in filenames
+            if zlib.crc32(key(filename).encode()) % count == index - 1
+        )
+
+    estimates = estimate_file_durations(filenames, durations)
+    buckets, _ = lpt_assign(sorted(filenames, key=key), count, estimates.__getitem__)
+    return sorted(buckets[index - 1])
@@ -0,0 +1,304 @@
+"""
+A result cache shared between checkouts and machines, in a directory given by `shared_cache=<path>` in the [hammett]
+section of setup.cfg. It can be on a network file system, there's no server. Only used with --use-cache.
+
+The results of a test file are stored under a key made from the contents of the test file and of every file its tests
+depend on, plus the Python version and the installed packages. Which files those are is only known after running the
+tests (see hammett.footprints and hammett.import_graph), so there are two steps, like ccache does for includes:
+
+- manifests/<key of the test file> lists the sets of dependencies seen for that version of the test file
+- results/<key of the test file and the contents of a set of dependencies> has the results
+
+Before running a test file that has no valid local results, hammett looks for an entry that matches the local files
+and uses those results instead. Afterwards the results of the test files that ran are stored. When the directory grows
+beyond `shared_cache_size` megabytes (default 1024) the least recently used entries are removed.
+"""
+import json
+import os
+import sys
+from datetime import timedelta
+from hashlib import blake2b
+from os.path import (
+    abspath,
+    basename,
+    exists,
+    join,
+)
+
+import hammett
+from hammett.impl import Result
+
+DEFAULT_MAX_SIZE_MB = 1024
+
+# How many sets of dependencies to remember per version of a test file
+MAX_DEPENDENCY_SETS = 8
+
+_environment_fingerprint = None
+
+
+def cache_directory():
+    directory = hammett.g.settings.get('shared_cache')
+    return directory and os.path.expanduser(directory)
+
+
+def is_within(path, root):
+    return path == root or path.startswith(root + os.sep)
+
+
+def is_project_path(path):
+    """
+    Is path, from sys.path, where the code of the project is? Those files are part of the keys by their contents
+    instead. A virtualenv inside the project is not the project.
+    """
+    if any(x in ('site-packages', 'dist-packages') for x in path.split(os.sep)):
+        return False
+    if path == os.getcwd():
+        return True
+    return any(is_within(path, abspath(x)) for x in [hammett.g.source_location or '.', *hammett.test_roots()])
+
+
+def environment_fingerprint():
+    """
+    A hash of the Python version and the installed packages. The names of the directories in site-packages include
+    the versions of the packages, so listing them is enough and much faster than reading the package metadata.
+    """
+    global _environment_fingerprint
+    if _environment_fingerprint is None:
+        h = blake2b(digest_size=16)
+        h.update(repr((hammett.__version__, sys.version_info, sys.implementation.cache_tag, sys.platform)).encode())
+        for path in sys.path:
+            if not path:
+                continue
+            path = abspath(path)
+            if is_project_path(path) or not os.path.isdir(path):
+                continue
+            h.update(repr(sorted(os.listdir(path))).encode())
+        _environment_fingerprint = h.digest()
+    return _environment_fingerprint
+
+
+def content_hash(filename):
+    data = (hammett.g.result_db['file_data'] or {}).get(filename)
+    if data is not None:
+        return data[2]
+    if not exists(filename):
+        return None
+    return hammett.hash_file(filename)
+
+
+def test_file_key(filename):
+    h = blake2b(environment_fingerprint(), digest_size=16)
+    h.update(filename.encode())
+    h.update(content_hash(filename) or b'')
+    return h.hexdigest()
+
+
+def results_key(file_key, dependencies):
+    """
+    Returns None if a dependency doesn't exist here.
+    """
+    h = blake2b(file_key.encode(), digest_size=16)
+    for filename in dependencies:
+        content = content_hash(filename)
+        if content is None:
+            return None
+        h.update(filename.encode() + b'\0' + content)
+    return h.hexdigest()
+
+
+def read(path):
+    """
+    The entries are JSON, never pickle: anyone who can write to the shared directory could otherwise run code on every
+    machine that uses it.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # The modification time is the last use, for the eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written to a temporary file first, so other processes never see half of it
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def result_to_data(result):
+    duration = result.duration
+    return dict(
+        status=result.status,
+        duration=duration.total_seconds() if isinstance(duration, timedelta) else duration,
+        stdout=result.stdout,
+        stderr=result.stderr,
+        stack_trace=result.stack_trace,
+        feedback_for_exception=result.feedback_for_exception,
+        footprint=sorted(result.footprint) if result.footprint is not None else None,
+    )
+
+
+def result_from_data(data):
+    footprint = data['footprint']
+    return Result(
+        status=str(data['status']),
+        duration=timedelta(seconds=data['duration']),
+        stdout=str(data['stdout']),
+        stderr=str(data['stderr']),
+        stack_trace=str(data['stack_trace']),
+        feedback_for_exception=str(data['feedback_for_exception']),
+        footprint=frozenset(str(x) for x in footprint) if footprint is not None else None,
+    )
+
+
+def entry_from_data(data):
+    """
+    The results, load footprint, durations and import graph of an entry, or None if it's not what we wrote.
+    """
+    try:
+        load_footprint = data['load_footprint']
+        return (
+            {str(test_name): result_from_data(x) for test_name, x in data['results'].items()},
+            frozenset(str(x) for x in load_footprint) if load_footprint is not None else None,
+            {str(test_name): float(x) for test_name, x in data['durations'].items()},
+            {str(importer): {str(x) for x in imported} for importer, imported in data['import_graph'].items()},
+        )
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+
+def fetch(filenames):
+    """
+    Get the results of the test files that have no valid local results from the shared cache, if it has them.
+    """
+    directory = cache_directory()
+    if directory is None:
+        return
+
+    from hammett.scheduling import db_filename
+
+    result_db = hammett.g.result_db
+    for test_filename in filenames:
+        filename = db_filename(test_filename)
+        if filename in result_db['test_results'] and filename not in result_db['stale_tests']:
+            continue
+
+        file_key = test_file_key(filename)
+        dependency_sets = read(join(directory, 'manifests', file_key))
+        if not isinstance(dependency_sets, list):
+            continue
+        for dependencies in dependency_sets:
+            if not isinstance(dependencies, list) or not all(isinstance(x, str) for x in dependencies):
+                continue
+            key = results_key(file_key, dependencies)
+            entry = key and read(join(directory, 'results', key))
+            entry = entry and entry_from_data(entry)
+            if entry:
+                results, load_footprint, durations, import_graph = entry
+                result_db['test_results'][filename] = results
+                result_db['stale_tests'].pop(filename, None)
+                result_db['load_footprints'][filename] = load_footprint
+                result_db['durations'][filename] = durations
+                result_db['import_graph'].update(import_graph)
+                break
+
+
+def file_dependencies(filename, results, conftest_files):
+    """
+    The files the results of filename depend on, or None if we can't tell.
+    """
+    from hammett.import_graph import dependencies
+
+    result_db = hammett.g.result_db
+    load_footprint = result_db['load_footprints'].get(filename)
+    footprints = [result.footprint for result in results.values()]
+    if load_footprint is None or any(x is None for x in footprints):
+        return None
+
+    files = load_footprint.union({filename}, *footprints)
+    return sorted(dependencies(result_db['import_graph'], files) | set(conftest_files))
+
+
+def publish(filenames):
+    """
+    Store the results of filenames in the shared cache.
+    """
+    directory = cache_directory()
+    if directory is None:
+        return
+
+    from hammett.scheduling import db_filename
+
+    result_db = hammett.g.result_db
+    conftest_files = [db_filename(x) for x in hammett.g.collected_files if basename(x) == 'conftest.py']
+    wrote = False
+    for filename in sorted(filenames):
+        results = result_db['test_results'].get(filename)
+        if not results or filename in result_db['stale_tests']:
+            continue
+        dependencies = file_dependencies(filename, results, conftest_files)
+        if dependencies is None:
+            # Everything in the project then
+            dependencies = sorted(set(result_db['file_data'] or ()) | {filename})
+
+        file_key = test_file_key(filename)
+        key = results_key(file_key, dependencies)
+        if key is None:
+            continue
+
+        graph = result_db['import_graph']
+        load_footprint = result_db['load_footprints'].get(filename)
+        write(join(directory, 'results', key), dict(
+            results={test_name: result_to_data(result) for test_name, result in results.items()},
+            load_footprint=sorted(load_footprint) if load_footprint is not None else None,
+            durations=dict(result_db['durations'].get(filename) or {}),
+            import_graph={x: sorted(graph[x]) for x in dependencies if x in graph},
+        ))
+
+        manifest_path = join(directory, 'manifests', file_key)
+        dependency_sets = read(manifest_path)
+        if not isinstance(dependency_sets, list):
+            dependency_sets = []
+        if dependencies in dependency_sets:
+            dependency_sets.remove(dependencies)
+        write(manifest_path, [dependencies, *dependency_sets][:MAX_DEPENDENCY_SETS])
+        wrote = True
+
+    if wrote:
+        max_size = int(hammett.g.settings.get('shared_cache_size', DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+        evict(directory, max_size)
+
+
+def evict(directory, max_size):
+    """
+    Remove the least recently used entries until the cache is no larger than max_size bytes.
+    """
+    entries = []
+    for subdirectory in ('manifests', 'results'):
+        path = join(directory, subdirectory)
+        if not os.path.isdir(path):
+            continue
+        for entry in os.scandir(path):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
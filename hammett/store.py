@@ -0,0 +1,560 @@
+"""
+Storage of the result db in sqlite, with a table for each part of the db (see write_result_db for what they are).
+
+In memory the db is a dict like it always was, but its parts record which of their keys change. Saving only writes
+those rows, so results can be saved as they come in: a crash doesn't lose the tests that finished, and the cost of
+a run that only reruns a few tests doesn't depend on the size of the suite. sqlite takes care of the locking when
+several hammett processes use the same db.
+"""
+import os
+import pickle
+import sqlite3
+import sys
+from collections import Counter
+from datetime import timedelta
+from os.path import abspath
+
+import hammett
+from hammett.impl import Result
+
+# table name -> the number of key columns. The rows of tables with two are (filename, test name)
+TABLES = {
+    'file_data': 1,
+    'load_footprints': 1,
+    'import_graph': 1,
+    'test_results': 2,
+    'durations': 2,
+    'stale_tests': 2,
+    'inventories': 1,
+}
+
+# The rest of the db is stored in the meta table
+META_KEYS = ('db_version', 'git')
+
+# The parts of a Result that are stored separately from the rest, see StoredResult
+PAYLOAD_FIELDS = ('stdout', 'stderr', 'stack_trace', 'feedback_for_exception')
+
+
+# The value of the files in a LazyTable that haven't been read from the db yet
+UNLOADED = object()
+
+
+class TrackedDict(dict):
+    """
+    A dict that records the keys that are set or deleted in changed. Like a defaultdict, missing values are created
+    with factory, and the values made by factory record their changes as (key, inner key) in the same set.
+    """
+    def __init__(self, data=(), factory=None, changed=None, key=None):
+        super().__init__()
+        self.factory = factory
+        self.changed = set() if changed is None else changed
+        self.key = key
+        for k, v in dict(data).items():
+            dict.__setitem__(self, k, self._wrap(k, v))
+
+    def _mark(self, k):
+        self.changed.add((k,) if self.key is None else (self.key, k))
+
+    def _wrap(self, k, v):
+        if self.factory is None or (type(v) is self.factory and v.changed is self.changed and v.key == k):
+            return v
+        return self.factory(v, changed=self.changed, key=k)
+
+    def __missing__(self, k):
+        if self.factory is None:
+            raise KeyError(k)
+        self[k] = self.factory()
+        return dict.__getitem__(self, k)
+
+    def __setitem__(self, k, v):
+        v = self._wrap(k, v)
+        if k in self:
+            old = dict.__getitem__(self, k)
+            if old is v or (old is not UNLOADED and old == v):
+                return
+        dict.__setitem__(self, k, v)
+        self._mark(k)
+
+    def __delitem__(self, k):
+        dict.__delitem__(self, k)
+        self._mark(k)
+
+    def pop(self, k, *default):
+        if k in self:
+            self._mark(k)
+        return dict.pop(self, k, *default)
+
+    def setdefault(self, k, default=None):
+        if k not in self:
+            self[k] = default
+        return self[k]
+
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
+
+    def clear(self):
+        for k in self:
+            self._mark(k)
+        dict.clear(self)
+
+    def popitem(self):
+        k, v = dict.popitem(self)
+        self._mark(k)
+        return k, v
+
+
+class TrackedSet(set):
+    """
+    A set that records in changed that key needs saving when it's modified.
+    """
+    def __init__(self, data=(), changed=None, key=None):
+        super().__init__(data)
+        self.changed = set() if changed is None else changed
+        self.key = key
+
+
+def _tracked(method):
+    def f(self, *args):
+        self.changed.add((self.key,))
+        return method(self, *args)
+    return f
+
+
+for _name in ('add', 'discard', 'remove', 'pop', 'clear', 'update', 'difference_update', 'intersection_update', 'symmetric_difference_update', '__ior__', '__isub__', '__iand__', '__ixor__'):
+    setattr(TrackedSet, _name, _tracked(getattr(set, _name)))
+
+
+class LazyTable(TrackedDict):
+    """
+    A table with (filename, test name) keys, where the rows of a file are only read from the db, by loader, when
+    they're used. For test results the number of tests of each status is known without reading them, see
+    status_counts.
+    """
+    def __init__(self, data=(), factory=None, loader=None, unloaded=(), counts=None):
+        super().__init__(data, factory=factory)
+        self.loader = loader
+        # filename -> {status: count} for the files that aren't loaded
+        self.counts = {} if counts is None else counts
+        for filename in unloaded:
+            dict.__setitem__(self, filename, UNLOADED)
+
+    def _load(self, k):
+        v = dict.__getitem__(self, k)
+        if v is UNLOADED:
+            v = self._wrap(k, self.loader(k))
+            dict.__setitem__(self, k, v)
+            self.counts.pop(k, None)
+        return v
+
+    def __getitem__(self, k):
+        if k in self:
+            return self._load(k)
+        return self.__missing__(k)
+
+    def get(self, k, default=None):
+        return self._load(k) if k in self else default
+
+    def items(self):
+        return [(k, self._load(k)) for k in self]
+
+    def values(self):
+        return [self._load(k) for k in self]
+
+    def pop(self, k, *default):
+        if k in self:
+            self._load(k)
+            self.counts.pop(k, None)
+        return super().pop(k, *default)
+
+    def popitem(self):
+        for k in self:
+            return k, self.pop(k)
+        raise KeyError('popitem(): dictionary is empty')
+
+    def __setitem__(self, k, v):
+        self.counts.pop(k, None)
+        super().__setitem__(k, v)
+
+    def __delitem__(self, k):
+        self.counts.pop(k, None)
+        super().__delitem__(k)
+
+    def clear(self):
+        self.counts.clear()
+        super().clear()
+
+    def __eq__(self, other):
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def status_counts(self, filename=None):
+        """
+        Returns {status: number of tests} for the results of filename, or of all files.
+        """
+        if filename is not None:
+            if dict.__getitem__(self, filename) is UNLOADED:
+                return Counter(self.counts.get(filename, {}))
+            return Counter(result.status for result in self._load(filename).values())
+
+        total = Counter()
+        for k, v in dict.items(self):
+            if v is UNLOADED:
+                total.update(self.counts.get(k, {}))
+            else:
+                total.update(result.status for result in v.values())
+        return total
+
+
+def new_table(name, data=()):
+    if isinstance(data, TrackedDict):
+        return data
+    if name in ('test_results', 'durations'):
+        return LazyTable(data, factory=TrackedDict)
+    if name == 'inventories':
+        return LazyTable(data)
+    if name == 'stale_tests':
+        return TrackedDict(data, factory=TrackedSet)
+    return TrackedDict(data)
+
+
+class ResultDb(dict):
+    """
+    The result db in memory. Assigning a part of the db replaces all of it on the next save.
+    """
+    def __init__(self, data, replaced=()):
+        super().__init__()
+        self.replaced = set(replaced)
+        for k, v in data.items():
+            dict.__setitem__(self, k, new_table(k, v) if k in TABLES and v is not None else v)
+
+    def __setitem__(self, k, v):
+        if k in TABLES and v is not None:
+            v = new_table(k, v)
+        dict.__setitem__(self, k, v)
+        self.replaced.add(k)
+
+
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value BLOB);
+CREATE TABLE file_data (filename TEXT PRIMARY KEY, value BLOB);
+CREATE TABLE load_footprints (filename TEXT PRIMARY KEY, value BLOB);
+CREATE TABLE import_graph (filename TEXT PRIMARY KEY, value BLOB);
+CREATE TABLE test_results (filename TEXT, test_name TEXT, status TEXT, duration REAL, footprint BLOB, payload_id INTEGER, PRIMARY KEY (filename, test_name));
+CREATE TABLE payloads (id INTEGER PRIMARY KEY AUTOINCREMENT, stdout TEXT, stderr TEXT, stack_trace TEXT, feedback_for_exception TEXT);
+CREATE TRIGGER delete_payload AFTER DELETE ON test_results WHEN OLD.payload_id IS NOT NULL BEGIN
+    DELETE FROM payloads WHERE id = OLD.payload_id;
+END;
+CREATE TABLE status_counts (filename TEXT, status TEXT, count INTEGER, PRIMARY KEY (filename, status));
+CREATE TRIGGER count_inserted AFTER INSERT ON test_results BEGIN
+    INSERT INTO status_counts VALUES (NEW.filename, NEW.status, 1)
+        ON CONFLICT (filename, status) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER count_deleted AFTER DELETE ON test_results BEGIN
+    UPDATE status_counts SET count = count - 1 WHERE filename = OLD.filename AND status = OLD.status;
+    DELETE FROM status_counts WHERE filename = OLD.filename AND status = OLD.status AND count = 0;
+END;
+CREATE TABLE durations (filename TEXT, test_name TEXT, value BLOB, PRIMARY KEY (filename, test_name));
+CREATE TABLE stale_tests (filename TEXT, test_name TEXT, value BLOB, PRIMARY KEY (filename, test_name));
+CREATE TABLE inventories (filename TEXT PRIMARY KEY, value BLOB);
+'''
+
+MMAP_SIZE = 256 * 1024 * 1024
+
+# (absolute filename, pid) -> connection. Forked children must not use the connections of their parent.
+_connections = {}
+
+
+def _create_schema(conn):
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchall():
+        conn.execute(f'DROP TABLE {name}')
+    # executescript() would commit the transaction we're in, so the statements are run one by one
+    statement = ''
+    for line in SCHEMA.strip().splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ''
+    conn.execute('INSERT INTO meta VALUES (?, ?)', ('db_version', pickle.dumps(hammett.DB_VERSION)))
+
+
+def connect(filename):
+    """
+    Returns a connection to the db in filename, creating the db if needed. A db of another version, or a file that
+    isn't an sqlite db (like the pickled dbs of older versions), is replaced with an empty db.
+    """
+    key = (abspath(filename), os.getpid())
+    if key in _connections:
+        return _connections[key]
+
+    conn = sqlite3.connect(filename, timeout=30, isolation_level=None, check_same_thread=False)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+    except sqlite3.DatabaseError:
+        conn.close()
+        os.remove(filename)
+        return connect(filename)
+    # In WAL mode this is still safe from corruption, a power loss can only lose the last commits
+    conn.execute('PRAGMA synchronous=NORMAL')
+    # Reading the payloads of results goes through the page cache of the OS instead of copying
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+
+    with transaction(conn):
+        try:
+            version = read_meta(conn).get('db_version')
+        except sqlite3.OperationalError:
+            version = None
+        if version != hammett.DB_VERSION:
+            _create_schema(conn)
+
+    _connections[key] = conn
+    return conn
+
+
+class transaction:
+    """
+    Holds the write lock of the db for the duration of the with block, and commits at the end of it.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+
+
+def read_meta(conn):
+    return {key: pickle.loads(value) for key, value in conn.execute('SELECT key, value FROM meta')}
+
+
+def _intern_files(files):
+    return frozenset(map(sys.intern, files))
+
+
+class StoredResult(Result):
+    """
+    A Result loaded from the db. The captured output and the traceback are only read from the db when they're used,
+    which for a cached run is only for the failed tests.
+    """
+    def __init__(self, status, duration, footprint, payload_id, db_filename):
+        self.status = status
+        self.duration = duration
+        self.footprint = footprint
+        self._payload_id = payload_id
+        self._db_filename = db_filename
+        self._payload = None
+
+    def payload(self):
+        if self._payload is None:
+            values = None
+            if self._payload_id is not None:
+                values = connect(self._db_filename).execute(
+                    f'SELECT {", ".join(PAYLOAD_FIELDS)} FROM payloads WHERE id = ?',
+                    (self._payload_id,),
+                ).fetchone()
+            self._payload = dict(zip(PAYLOAD_FIELDS, values or ('',) * len(PAYLOAD_FIELDS)))
+        return self._payload
+
+
+def _payload_property(name):
+    def get(self):
+        return self.payload()[name]
+
+    def set(self, value):
+        self.payload()[name] = value
+
+    return property(get, set)
+
+
+for _name in PAYLOAD_FIELDS:
+    setattr(StoredResult, _name, _payload_property(_name))
+
+
+def _load_value(name, value):
+    if value is None:
+        return None
+    value = pickle.loads(value)
+    # Footprints share the file names, interning them saves a lot of memory
+    if name in ('load_footprints', 'import_graph'):
+        value = _intern_files(value)
+    return value
+
+
+def _load_test_results(db_filename):
+    counts = {}
+    for filename, status, count in connect(db_filename).execute('SELECT filename, status, count FROM status_counts'):
+        counts.setdefault(sys.intern(filename), {})[sys.intern(status)] = count
+
+    def loader(filename):
+        results = {}
+        rows = connect(db_filename).execute(
+            'SELECT test_name, status, duration, footprint, payload_id FROM test_results WHERE filename = ?',
+            (filename,),
+        )
+        for test_name, status, duration, footprint, payload_id in rows:
+            if footprint is not None:
+                footprint = _intern_files(pickle.loads(footprint))
+            duration = timedelta(seconds=duration) if duration else 0
+            results[test_name] = StoredResult(sys.intern(status), duration, footprint, payload_id, db_filename)
+        return results
+
+    return LazyTable(factory=TrackedDict, loader=loader, unloaded=list(counts), counts=counts)
+
+
+def _load_durations(db_filename):
+    def loader(filename):
+        rows = connect(db_filename).execute('SELECT test_name, value FROM durations WHERE filename = ?', (filename,))
+        return {test_name: pickle.loads(value) for test_name, value in rows}
+
+    filenames = [sys.intern(filename) for (filename,) in connect(db_filename).execute('SELECT DISTINCT filename FROM durations')]
+    return LazyTable(factory=TrackedDict, loader=loader, unloaded=filenames)
+
+
+def _load_inventories(db_filename):
+    def loader(filename):
+        (value,) = connect(db_filename).execute('SELECT value FROM inventories WHERE filename = ?', (filename,)).fetchone()
+        return pickle.loads(value)
+
+    filenames = [sys.intern(filename) for (filename,) in connect(db_filename).execute('SELECT filename FROM inventories')]
+    return LazyTable(loader=loader, unloaded=filenames)
+
+
+def load(filename):
+    """
+    Read the db in filename. Returns None if there is no db, or if it can't be read.
+    """
+    if not os.path.exists(filename):
+        return None
+    try:
+        conn = connect(filename)
+        meta = read_meta(conn)
+        data = dict(git=meta.get('git'), db_version=hammett.DB_VERSION)
+        # The results, durations and inventory of a file are read when they're used
+        data['test_results'] = _load_test_results(abspath(filename))
+        data['durations'] = _load_durations(abspath(filename))
+        data['inventories'] = _load_inventories(abspath(filename))
+        for name, key_columns in TABLES.items():
+            if name in data:
+                continue
+            rows = conn.execute(f'SELECT * FROM {name}')
+            if key_columns == 1:
+                data[name] = {sys.intern(k): _load_value(name, value) for k, value in rows}
+            else:
+                table = {}
+                for k, test_name, value in rows:
+                    if name == 'stale_tests':
+                        table.setdefault(sys.intern(k), set()).add(test_name)
+                    else:
+                        table.setdefault(sys.intern(k), {})[test_name] = _load_value(name, value)
+                data[name] = table
+    except sqlite3.DatabaseError:
+        return None
+
+    # An empty project and one we haven't seen are the same thing
+    if not data['file_data']:
+        data['file_data'] = None
+    return ResultDb(data)
+
+
+def _rows(name, key, value):
+    if TABLES[name] == 1:
+        return [(key, pickle.dumps(value))]
+    if name == 'stale_tests':
+        return [(key, test_name, None) for test_name in value]
+    if name == 'test_results':
+        return [_result_row(key, test_name, x) for test_name, x in value.items()]
+    return [(key, test_name, pickle.dumps(x)) for test_name, x in value.items()]
+
+
+def _result_row(filename, test_name, result):
+    duration = result.duration.total_seconds() if isinstance(result.duration, timedelta) else result.duration
+    footprint = pickle.dumps(result.footprint) if result.footprint is not None else None
+    payload = tuple(getattr(result, x) or '' for x in PAYLOAD_FIELDS)
+    return filename, test_name, result.status, duration, footprint, payload
+
+
+def _insert_rows(conn, name, rows):
+    if name != 'test_results':
+        placeholders = ', '.join('?' * (TABLES[name] + 1))
+        conn.executemany(f'INSERT INTO {name} VALUES ({placeholders})', rows)
+        return
+
+    for *row, payload in rows:
+        payload_id = None
+        if any(payload):
+            payload_id = conn.execute(f'INSERT INTO payloads ({", ".join(PAYLOAD_FIELDS)}) VALUES (?, ?, ?, ?)', payload).lastrowid
+        conn.execute('INSERT INTO test_results VALUES (?, ?, ?, ?, ?, ?)', (*row, payload_id))
+
+
+def _write_table(conn, name, table, keys, replace_all=False):
+    """
+    Write the rows of table for the changed keys, which are (filename,) or (filename, test name). With replace_all
+    everything in the table is replaced.
+    """
+    filenames = {key[0] for key in keys if len(key) == 1}
+    single = [key for key in keys if len(key) == 2 and key[0] not in filenames]
+
+    # The rows are made before anything is deleted, since the payloads of stored results are read lazily
+    rows = [row for filename in filenames if filename in table for row in _rows(name, filename, table[filename])]
+    for filename, test_name in single:
+        inner = table.get(filename)
+        if inner is not None and test_name in inner:
+            rows.extend(_rows(name, filename, {test_name: inner[test_name]}))
+
+    if replace_all:
+        conn.execute(f'DELETE FROM {name}')
+    else:
+        conn.executemany(f'DELETE FROM {name} WHERE filename = ?', [(filename,) for filename in filenames])
+        if single:
+            conn.executemany(f'DELETE FROM {name} WHERE filename = ? AND test_name = ?', single)
+    _insert_rows(conn, name, rows)
+
+
+def save_changes(result_db, filename):
+    """
+    Write what has changed in result_db since it was loaded or last saved.
+    """
+    replaced = set(result_db.replaced)
+    changes = {}
+    for name in TABLES:
+        table = result_db.get(name)
+        if name not in replaced and table is not None and table.changed:
+            changes[name] = set(table.changed)
+    if not replaced and not changes:
+        return
+
+    conn = connect(filename)
+    with transaction(conn):
+        for name in replaced:
+            if name in TABLES:
+                table = result_db[name] or {}
+                _write_table(conn, name, table, [(key,) for key in table], replace_all=True)
+            elif name in META_KEYS:
+                conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (name, pickle.dumps(result_db.get(name))))
+        for name, keys in changes.items():
+            _write_table(conn, name, result_db[name], keys)
+
+    result_db.replaced -= replaced
+    for name, keys in changes.items():
+        result_db[name].changed -= keys
+    for name in replaced & set(TABLES):
+        if result_db[name] is not None:
+            result_db[name].changed.clear()
+
+
+def save(result_db, filename):
+    """
+    Replace everything in the db in filename with result_db.
+    """
+    if not isinstance(result_db, ResultDb):
+        result_db = ResultDb(result_db)
+    result_db.replaced |= set(TABLES) | set(META_KEYS)
+    save_changes(result_db, filename)
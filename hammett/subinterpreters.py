@@ -0,0 +1,220 @@
+"""
+Run test files concurrently in subinterpreters that have their own GIL (CPython 3.12+). Each thread owns an
+interpreter that loads plugins and conftests once and then runs one test file at a time, reporting back over a pipe.
+
+Files that import extension modules that can't be loaded in a subinterpreter are run in the worker pool afterwards.
+"""
+import importlib
+import os
+import queue
+import select
+import sys
+import threading
+
+import hammett
+from hammett.ipc import (
+    REPORT_MESSAGES,
+    MessageReader,
+    receive_report,
+    report_to,
+    write_message,
+)
+
+SCRIPT = '''
+import sys
+sys.path[:] = {sys_path!r}
+from hammett.subinterpreters import interpreter_main
+interpreter_main({args!r})
+'''
+
+FINISH_SCRIPT = '''
+from hammett.subinterpreters import interpreter_finish
+interpreter_finish()
+'''
+
+
+def interpreters_module():
+    """
+    The low level interpreters module, or None if this Python doesn't have a per-interpreter GIL.
+    """
+    if sys.version_info < (3, 12):
+        return None
+    for name in ('_interpreters', '_xxsubinterpreters'):
+        try:
+            return importlib.import_module(name)
+        except ImportError:
+            pass
+    return None
+
+
+def is_unsupported_in_subinterpreter(e):
+    return isinstance(e, ImportError) and 'subinterpreter' in str(e)
+
+
+# The state of hammett inside a subinterpreter, kept between the runs of interpreter_main
+_params = None
+_session_request = None
+_write_f = None
+_send_output = None
+_unsupported = False
+
+
+def interpreter_main(args):
+    """
+    Runs inside a subinterpreter: run the tests of args['filename'] and report to the pipe args['write_fd'].
+    """
+    global _params, _session_request, _write_f, _send_output, _unsupported
+    filename = args['filename']
+
+    if _params is None and not _unsupported:
+        _write_f = os.fdopen(args['write_fd'], 'wb', closefd=False)
+        # The output is sent to the parent, which prints it. The subinterpreter shares its stdout.
+        _params = hammett.main_setup(**{**args['setup_kwargs'], 'quiet': True})
+        hammett.g.in_subinterpreter = True
+        hammett.set_record_footprints(args['record_footprints'])
+        _send_output = report_to(_write_f)
+        from hammett.impl import (
+            load_conftests,
+            load_plugins,
+        )
+        try:
+            load_plugins()
+            load_conftests(_params['conftest_files'])
+        except ImportError as e:
+            if not is_unsupported_in_subinterpreter(e):
+                raise
+            # The plugins can't run here, so nothing can
+            _unsupported = True
+        _session_request = hammett.Request(scope='session', parent=None)
+
+    if _unsupported:
+        write_message(_write_f, ['fallback', filename])
+        return
+
+    aborts_before = hammett.g.results['abort']
+    tests = args['tests']
+    hammett.g.tests = set(tests) if tests is not None else None
+    try:
+        hammett.run_tests_for_filename(filename, _session_request, _params['markers'], args['match'], hammett.test_module_name(filename), tests)
+    except ImportError as e:
+        if not is_unsupported_in_subinterpreter(e):
+            raise
+        write_message(_write_f, ['fallback', filename])
+    _send_output()
+    if hammett.g.results['abort'] != aborts_before:
+        write_message(_write_f, ['abort'])
+
+
+def interpreter_finish():
+    if _session_request is not None:
+        _session_request.teardown()
+        _send_output()
+
+
+def interpreter_thread(interpreters, work, stop, write_fd, setup_kwargs, match, record_footprints):
+    """
+    Take test files from the work queue and run them in a subinterpreter owned by this thread.
+    """
+    with os.fdopen(write_fd, 'wb') as write_f:
+        try:
+            interpreter = interpreters.create()
+        except Exception as e:
+            write_message(write_f, ['crash', f'Failed to create subinterpreter: {e}'])
+            return
+
+        def run(script):
+            # Depending on the Python version errors are raised or returned
+            try:
+                error = interpreters.run_string(interpreter, script)
+            except Exception as e:
+                error = e
+            if error is not None:
+                # Python 3.13 returns a snapshot of the exception with the formatted traceback
+                error = getattr(error, 'errdisplay', error)
+                write_message(write_f, ['crash', f'Error in subinterpreter: {error}'])
+
+        try:
+            while not stop.is_set():
+                try:
+                    filename, tests = work.get_nowait()
+                except queue.Empty:
+                    break
+                args = dict(filename=filename, tests=tests, write_fd=write_fd, setup_kwargs=setup_kwargs, match=match, record_footprints=record_footprints)
+                run(SCRIPT.format(sys_path=sys.path, args=args))
+            run(FINISH_SCRIPT)
+        finally:
+            interpreters.destroy(interpreter)
+
+
+def run_subinterpreters(filenames, conftest_files, markers, clean_up_sys_path, setup_kwargs, match=None, processes=None):
+    from hammett.pool import (
+        print_cached_results,
+        run_pool,
+    )
+
+    interpreters = interpreters_module()
+    if interpreters is None:
+        hammett.print('Subinterpreters with their own GIL need Python 3.12 or later, using worker processes instead.')
+        return run_pool(filenames, conftest_files, markers, clean_up_sys_path, match=match, processes=processes)
+
+    if not filenames:
+        return hammett.main_run_tests(filenames, conftest_files, markers, clean_up_sys_path)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    from hammett.collect import skip_unselected
+    from hammett.impl import FAILED
+    from hammett.scheduling import estimate_file_durations
+
+    to_run = print_cached_results(skip_unselected(filenames, markers, match))
+    estimates = estimate_file_durations([filename for filename, _ in to_run], hammett.g.result_db['durations'])
+    work = queue.Queue()
+    for unit in sorted(to_run, key=lambda unit: estimates[unit[0]], reverse=True):
+        work.put(unit)
+
+    # The subinterpreters don't touch the result db, the results are stored here
+    record_footprints = hammett.g.record_footprints
+    setup_kwargs = {**setup_kwargs, 'use_cache': False}
+    stop = threading.Event()
+    threads = []
+    readers = []
+    for _ in range(min(processes, len(to_run))):
+        read_fd, write_fd = os.pipe()
+        readers.append(MessageReader(read_fd))
+        thread = threading.Thread(target=interpreter_thread, args=(interpreters, work, stop, write_fd, setup_kwargs, match, record_footprints))
+        thread.start()
+        threads.append(thread)
+
+    fallback = []
+    while readers:
+        readable, _, _ = select.select(readers, [], [])
+        for reader in readable:
+            messages = reader.read_available()
+            if messages is None:
+                os.close(reader.fd)
+                readers.remove(reader)
+                continue
+
+            for message in messages:
+                if message[0] in REPORT_MESSAGES:
+                    result = receive_report(message)
+                    if hammett.g.fail_fast and result is not None and result.status == FAILED:
+                        stop.set()
+                elif message[0] == 'fallback':
+                    fallback.append(message[1])
+                elif message[0] == 'crash':
+                    hammett.print(message[1])
+                    hammett.g.results['abort'] += 1
+                else:
+                    assert message[0] == 'abort'
+                    hammett.g.results['abort'] += 1
+                    stop.set()
+
+    for thread in threads:
+        thread.join()
+
+    if fallback and not stop.is_set():
+        return run_pool(fallback, conftest_files, markers, clean_up_sys_path, match=match, processes=processes)
+
+    return hammett.main_finish(clean_up_sys_path)
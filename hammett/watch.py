@@ -0,0 +1,102 @@
+"""
+Watch mode: `hammett --watch` keeps plugins, conftests and test modules imported like the daemon does, and reruns the
+tests affected by a change every time a source file is saved. Each run is forked off with --use-cache, so only the
+tests whose footprint changed run again.
+
+Changes are found by polling the size and modification time of the python files, which needs no dependencies and
+costs a few milliseconds even for big projects. When imported code that isn't a test module changes, the process
+restarts itself to get rid of the old version.
+"""
+import os
+import sys
+import time
+from os.path import join
+
+import hammett
+
+
+def snapshot(path):
+    """
+    Returns a dict from filename to (size, nanosecond modification time) of the python files under path, skipping the
+    same directories as collect_file_data.
+    """
+    from hammett.scan import scan
+    return scan([], path).files
+
+
+def wait_for_change(path, previous, interval, debounce):
+    """
+    Poll until the files under path differ from previous and then have been left alone for debounce seconds, so that
+    saving several files, or an editor writing a file in steps, results in one run. Returns the new snapshot.
+    """
+    while True:
+        time.sleep(interval)
+        current = snapshot(path)
+        if current != previous:
+            break
+
+    while True:
+        time.sleep(debounce)
+        settled = snapshot(path)
+        if settled == current:
+            return current
+        current = settled
+
+
+def run(setup_kwargs, match):
+    """
+    Run the tests in a forked child, which inherits everything that's already imported. Returns the exit code.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if not pid:
+        exit_code = 2
+        try:
+            params = hammett.main_setup(**setup_kwargs)
+            exit_code = hammett.main_run_tests(match=match, plugins_loaded=True, conftests_loaded=True, **params)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 2
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    from hammett.ipc import exit_code_from_status
+    _, status = os.waitpid(pid, 0)
+    return exit_code_from_status(status)
+
+
+def restart():
+    hammett._orig_print('hammett watch: imported code has changed, restarting')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, [sys.executable, '-m', 'hammett'] + sys.argv[1:])
+
+
+def watch(match=None, interval=0.2, debounce=0.1, **kwargs):
+    """
+    Run the tests, then rerun the affected ones each time a source file changes, until interrupted.
+    """
+    from hammett.daemon import stale_imports
+
+    setup_kwargs = {**kwargs, 'use_cache': True}
+    params = hammett.main_setup(**setup_kwargs)
+    if not hammett.main_preload(**params):
+        return 2
+    file_data = hammett.collect_file_data(hammett.g.source_location)
+    path = join(hammett.g.orig_cwd, hammett.g.source_location)
+
+    try:
+        files = snapshot(path)
+        while True:
+            run(setup_kwargs, match)
+            hammett._orig_print('hammett watch: waiting for changes')
+            files = wait_for_change(path, files, interval, debounce)
+            if stale_imports(file_data):
+                restart()
+    except KeyboardInterrupt:
+        return 0
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+from os.path import (
+    abspath,
+    dirname,
+)
+
+base = dirname(dirname(abspath(__file__)))
+
+
+def write(path, content=''):
+    os.makedirs(dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+    # Make sure the modification time changes even on file systems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000))
+
+
+def hammett_env():
+    """
+    The environment for running hammett from this checkout in a subprocess.
+    """
+    return {**os.environ, 'PYTHONPATH': base}
+
+
+def run_hammett(cwd, *args, **kwargs):
+    """
+    Run python -m hammett with args in cwd. The output is in stdout of the result, as text.
+    """
+    kwargs.setdefault('stdout', subprocess.PIPE)
+    return subprocess.run(
+        [sys.executable, '-m', 'hammett', *args],
+        cwd=cwd,
+        env=hammett_env(),
+        universal_newlines=True,
+        **kwargs,
+    )
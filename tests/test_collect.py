@@ -0,0 +1,197 @@
+import os
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett import (
+    load_result_db,
+    parse_markers,
+)
+from hammett.collect import (
+    Inventory,
+    parse,
+    select,
+)
+from hammett.store import save_changes
+from tests.helpers import (
+    run_hammett,
+    write,
+)
+
+
+source = '''
+import os
+import pytest
+from helpers import make_test, Base, CONSTANT
+
+pytestmark = pytest.mark.slow
+
+VALUES = [1, 2]
+
+
+def helper():
+    pass
+
+
+@pytest.fixture
+def fixture():
+    pass
+
+
+@pytest.mark.parametrize('x', [1, 'a'])
+@pytest.mark.parametrize('y', range(2))
+def test_parametrized(x, y):
+    pass
+
+
+@pytest.mark.db(5)
+def test_db():
+    pass
+
+
+@some_decorator
+def test_decorated():
+    pass
+
+
+class TestFoo:
+    def test_b(self):
+        pass
+
+    def test_a(self):
+        pass
+
+
+class TestInherited(Base):
+    pass
+
+
+test_generated = make_test()
+'''
+
+
+def selected(markers=None, match=None, tests=None):
+    return {test.name: x for test, x in select(parse(source), 'tests/test_foo.py', parse_markers(markers), match, tests)}
+
+
+class CollectTests(unittest.TestCase):
+    def test_parse(self):
+        inventory = parse(source)
+        assert inventory.module_markers == [('slow', ())]
+        tests = {test.name: test for test in inventory.tests}
+        assert list(tests) == ['Base', 'test_parametrized', 'test_db', 'test_decorated', 'TestFoo', 'TestInherited', 'test_generated']
+        assert tests['test_parametrized'].test_names == [
+            "test_parametrized[x=1, y=0]",
+            "test_parametrized[x='a', y=0]",
+            "test_parametrized[x=1, y=1]",
+            "test_parametrized[x='a', y=1]",
+        ]
+        assert tests['test_db'].markers == [('db', (5,))]
+        assert tests['test_decorated'].markers is None
+        assert tests['TestFoo'].test_names == ['TestFoo.test_a', 'TestFoo.test_b']
+        assert tests['TestInherited'].test_names is None
+        assert tests['test_generated'].is_test is None
+
+    def test_dynamic(self):
+        assert parse('from foo import *\n') is None
+        assert parse('globals()["test_foo"] = lambda: None\n') is None
+        assert parse('def test_foo(:\n') is None
+
+    def test_tests_added_to_classes(self):
+        tests = {test.name: test for test in parse('class TestFoo:\n    def test_a(self):\n        pass\n\n\nTestFoo.test_b = TestFoo.test_a\n').tests}
+        assert tests['TestFoo'].test_names is None
+        assert parse('class TestFoo:\n    pass\n\n\nfor i in range(3):\n    setattr(TestFoo, f"test_{i}", lambda self: None)\n') is None
+
+        with TemporaryDirectory() as d:
+            write(join(d, 'tests', 'test_foo.py'), 'class TestFoo:\n    pass\n\n\nfor i in range(2):\n    setattr(TestFoo, f"test_{i}", lambda self: None)\n\n\nTestFoo.test_x = lambda self: None\n')
+            assert run_hammett(d, '--collect-only').stdout.split() == ['tests/test_foo.py::TestFoo.test_0', 'tests/test_foo.py::TestFoo.test_1', 'tests/test_foo.py::TestFoo.test_x']
+
+    def test_select(self):
+        assert selected(match='db') == {'test_db': True}
+        assert selected(match='nothing') == {}
+        assert selected(markers='db[5]') == {'Base': None, 'test_decorated': None, 'TestInherited': None, 'test_generated': None, 'test_db': True}
+        assert selected(markers='db[6]', match='test_') == {'test_decorated': None, 'test_generated': None}
+        assert selected(markers='slow', match='Foo') == {'TestFoo': True}
+        assert selected(match='test_ and not (db or decorated)') == {'test_parametrized': True, 'test_generated': None}
+        # Not being a db test is known even for the test with an unknown decorator, since the module is slow
+        assert selected(markers='not slow or db(5)') == {'Base': None, 'test_decorated': None, 'TestInherited': None, 'test_generated': None, 'test_db': True}
+        # Keyword arguments of markers aren't in the inventory
+        assert selected(markers='db(using="x")', match='db') == {'test_db': None}
+        assert selected(tests=['tests/test_foo.py::TestFoo.test_a']) == {'TestFoo': True}
+
+    def test_unselected_files_are_not_imported(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'tests'))
+            write(join(d, 'tests', 'test_foo.py'), 'def test_foo():\n    pass\n')
+            write(join(d, 'tests', 'test_bar.py'), 'raise Exception("imported")\n\n\ndef test_bar():\n    pass\n')
+
+            process = run_hammett(d, '-k', 'foo')
+            assert process.returncode == 0
+            assert '1 succeeded, 0 failed, 0 skipped' in process.stdout
+
+            process = run_hammett(d, '-k', 'not bar and (foo or nothing)')
+            assert process.returncode == 0
+            assert '1 succeeded, 0 failed, 0 skipped' in process.stdout
+
+            process = run_hammett(d, '--collect-only', '-k', 'foo')
+            assert process.returncode == 0
+            assert process.stdout.split() == ['tests/test_foo.py::test_foo']
+
+            # Without -k the file has to be imported
+            assert run_hammett(d).returncode == 2
+
+    def test_inventory_cache(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'tests'))
+            write(join(d, 'tests', 'test_foo.py'), 'def test_foo():\n    pass\n')
+
+            def collect():
+                return run_hammett(d, '--use-cache', '1', '--collect-only', check=True).stdout.split()
+
+            assert collect() == ['tests/test_foo.py::test_foo']
+
+            # The next run uses what's in the db, as long as the file is the same
+            db_filename = join(d, '.hammett-db')
+            result_db = load_result_db(db_filename)
+            fingerprint, inventory = result_db['inventories']['tests/test_foo.py']
+            assert [x.name for x in inventory.tests] == ['test_foo']
+            result_db['inventories']['tests/test_foo.py'] = (fingerprint, Inventory(tests=[], module_markers=[]))
+            save_changes(result_db, db_filename)
+            assert collect() == []
+
+            write(join(d, 'tests', 'test_foo.py'), 'def test_foo():\n    pass\n\n\ndef test_bar():\n    pass\n')
+            assert collect() == ['tests/test_foo.py::test_foo', 'tests/test_foo.py::test_bar']
+
+    def test_evaluate(self):
+        def skipif(condition, header='import sys\nimport os\n'):
+            inventory = parse(f'{header}\n\n@pytest.mark.skipif({condition}, reason="x")\ndef test_foo():\n    pass\n')
+            (test,) = inventory.tests
+            (marker,) = test.markers
+            return marker[1]
+
+        assert skipif('sys.version_info < (3, 0)') == (False,)
+        assert skipif('sys.version_info[:2] >= (3, 0) and os.name == "nonexistent"') == (False,)
+        assert skipif('not sys.platform.startswith("nonexistent")') == (True,)
+        assert skipif('version_info.major == 2', header='from sys import version_info') == (False,)
+        assert skipif('platform.python_implementation() == "Jython"', header='import platform') == (False,)
+        # Only what's imported from the standard library, and only what doesn't change
+        assert skipif('sys.version_info < (3, 0)', header='from foo import sys') is None
+        assert skipif('sys.argv') is None
+        assert skipif('foo()') is None
+
+    def test_skipped_files_are_not_imported(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'tests'))
+            write(join(d, 'tests', 'test_foo.py'), 'import pytest\nraise Exception("imported")\n\npytestmark = pytest.mark.skip\n\n\n@pytest.mark.parametrize("x", [1, 2])\ndef test_foo(x):\n    pass\n')
+            write(join(d, 'tests', 'test_bar.py'), 'import sys\nimport pytest\nraise Exception("imported")\n\n\n@pytest.mark.skipif(sys.version_info >= (3, 0), reason="old")\ndef test_bar():\n    pass\n')
+
+            process = run_hammett(d)
+            assert process.returncode == 0
+            assert '0 succeeded, 0 failed, 3 skipped' in process.stdout
+
+    def test_plain_runs_only_parse_files_that_might_skip(self):
+        with TemporaryDirectory() as d:
+            write(join(d, 'tests', 'test_foo.py'), 'def test_foo():\n    pass\n')
+            write(join(d, 'tests', 'test_bar.py'), 'import pytest\n\n\n@pytest.mark.skip\ndef test_bar():\n    pass\n')
+            assert run_hammett(d, '--use-cache', '1').returncode == 0
+            assert set(load_result_db(join(d, '.hammett-db'))['inventories']) == {'tests/test_bar.py'}
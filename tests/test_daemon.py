@@ -0,0 +1,92 @@
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from os.path import (
+    exists,
+    join,
+)
+from tempfile import TemporaryDirectory
+
+from hammett.daemon import EXIT_CODE_FORMAT
+from tests.helpers import (
+    hammett_env,
+    run_hammett,
+    write,
+)
+
+
+class DaemonTests(unittest.TestCase):
+    def test_daemon(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'tests'))
+            write(join(d, 'helper.py'), 'VALUE = 1\n')
+            write(join(d, 'tests', 'test_foo.py'), 'from helper import VALUE\n\n\ndef test_foo():\n    assert VALUE == 1\n')
+
+            daemon = subprocess.Popen(
+                [sys.executable, '-m', 'hammett', '--daemon'],
+                cwd=d,
+                env=hammett_env(),
+                stdout=subprocess.DEVNULL,
+            )
+            try:
+                for _ in range(100):
+                    if exists(join(d, '.hammett-daemon')):
+                        break
+                    time.sleep(0.05)
+
+                result = run_hammett(d, stderr=subprocess.STDOUT)
+                assert result.returncode == 0, result.stdout
+                assert '1 succeeded, 0 failed, 0 skipped' in result.stdout
+
+                # Test modules are reloaded when changed...
+                write(join(d, 'tests', 'test_foo.py'), 'def test_foo():\n    assert False\n')
+                result = run_hammett(d, stderr=subprocess.STDOUT)
+                assert result.returncode == 1, result.stdout
+                assert '0 succeeded, 1 failed, 0 skipped' in result.stdout
+
+                # ...and changes to other imported modules restart the daemon
+                write(join(d, 'tests', 'test_foo.py'), 'from helper import VALUE\n\n\ndef test_foo():\n    assert VALUE == 1\n')
+                result = run_hammett(d, stderr=subprocess.STDOUT)
+                assert result.returncode == 0, result.stdout
+                write(join(d, 'helper.py'), 'VALUE = 2\n')
+                result = run_hammett(d, stderr=subprocess.STDOUT)
+                assert result.returncode == 1, result.stdout
+            finally:
+                daemon.terminate()
+                daemon.wait()
+
+            assert not exists(join(d, '.hammett-daemon'))
+
+    def test_pdb_bypasses_daemon(self):
+        with TemporaryDirectory() as d:
+            write(join(d, 'tests', 'test_foo.py'), 'def test_foo():\n    pass\n')
+
+            # A daemon that answers every request with exit code 7
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(join(d, '.hammett-daemon'))
+            server.listen()
+
+            def serve():
+                while True:
+                    try:
+                        connection, _ = server.accept()
+                    except OSError:
+                        return
+                    with connection:
+                        connection.recv(65536)
+                        connection.sendall(struct.pack(EXIT_CODE_FORMAT, 7))
+
+            thread = threading.Thread(target=serve, daemon=True)
+            thread.start()
+            try:
+                assert run_hammett(d, stdin=subprocess.DEVNULL).returncode == 7
+                result = run_hammett(d, '--pdb', stdin=subprocess.DEVNULL)
+                assert result.returncode == 0, result.stdout
+                assert '1 succeeded, 0 failed, 0 skipped' in result.stdout
+            finally:
+                server.close()
@@ -0,0 +1,85 @@
+import os
+import socket
+import subprocess
+import sys
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett import (
+    coordinator_main,
+    g,
+)
+from hammett.distributed import parse_address
+from tests.helpers import (
+    base,
+    hammett_env,
+    run_hammett,
+    write,
+)
+
+suites_base = join(base, 'tests', 'suites')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class DistributedTests(unittest.TestCase):
+    def test_parse_address(self):
+        assert parse_address('example.com:1234') == ('example.com', 1234)
+        assert parse_address(':1234') == ('localhost', 1234)
+
+    def test_coordinator_and_workers(self):
+        cwd = join(suites_base, 'suite_3_parametrize')
+        address = f'127.0.0.1:{free_port()}'
+        # The workers wait for the coordinator to start listening
+        workers = [
+            subprocess.Popen(
+                [sys.executable, '-m', 'hammett', '--worker', address],
+                cwd=cwd,
+                env=hammett_env(),
+                stdout=subprocess.DEVNULL,
+            )
+            for _ in range(2)
+        ]
+        orig_cwd = os.getcwd()
+        try:
+            exit_code = coordinator_main(match=None, address=address, cwd=cwd, quiet=True)
+        finally:
+            os.chdir(orig_cwd)
+            for worker in workers:
+                worker.wait()
+
+        assert exit_code == 0
+        assert g.results == {'success': 5, 'failed': 0, 'skipped': 0, 'abort': 0}
+        assert set(g.result_db['durations']['tests/test_foo.py']) == {f'test_foo[foo={i}]' for i in range(5)}
+        assert [worker.returncode for worker in workers] == [0, 0]
+
+    def test_use_cache(self):
+        with TemporaryDirectory() as d:
+            write(join(d, 'helper.py'), 'VALUE = 1\n')
+            write(join(d, 'tests', 'test_foo.py'), 'from helper import VALUE\n\n\ndef test_foo():\n    assert VALUE == 1\n')
+
+            def run():
+                address = f'127.0.0.1:{free_port()}'
+                worker = subprocess.Popen(
+                    [sys.executable, '-m', 'hammett', '--worker', address],
+                    cwd=d,
+                    env=hammett_env(),
+                    stdout=subprocess.DEVNULL,
+                )
+                try:
+                    return run_hammett(d, '--use-cache', '1', '--coordinator', address)
+                finally:
+                    worker.wait()
+
+            result = run()
+            assert '1 succeeded, 0 failed' in result.stdout, result.stdout
+
+            # The workers record what the test files import, so the cached result isn't used
+            write(join(d, 'helper.py'), 'VALUE = 2\n')
+            result = run()
+            assert '0 succeeded, 1 failed' in result.stdout, result.stdout
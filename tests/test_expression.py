@@ -0,0 +1,75 @@
+import pickle
+import unittest
+
+from hammett.expression import (
+    ExpressionError,
+    compile_expression,
+)
+
+
+def keywords(source, name):
+    return compile_expression(source, 'keywords').matches_name(name)
+
+
+def markers(source, test_markers):
+    return compile_expression(source, 'markers').matches_markers(test_markers)
+
+
+class ExpressionTests(unittest.TestCase):
+    def test_keywords(self):
+        assert keywords('foo', 'test_foo')
+        assert not keywords('bar', 'test_foo')
+        assert keywords('', 'test_foo')
+        assert keywords('foo and not bar', 'test_foo')
+        assert not keywords('foo and not bar', 'test_foo_bar')
+        assert keywords('baz or foo and not bar', 'test_baz_bar')
+        assert not keywords('(baz or foo) and not bar', 'test_baz_bar')
+        assert keywords('not not foo', 'test_foo')
+        assert keywords('test_foo[1]', 'test_foo[1]')
+        assert keywords('android', 'test_android')
+
+    def test_markers(self):
+        slow_db = [('slow', [], {}), ('db', [5], {'using': 'other'})]
+        assert markers('slow', slow_db)
+        assert markers('slow and db', slow_db)
+        assert not markers('slow and not db', slow_db)
+        assert markers('db(5)', slow_db)
+        assert not markers('db(6)', slow_db)
+        assert markers('db(using="other")', slow_db)
+        assert markers('db(5, using="other")', slow_db)
+        assert not markers('db(using="default")', slow_db)
+        assert markers('db[5]', slow_db)
+        assert markers('fast; db[5]', slow_db)
+        assert markers('fast or db(")(")', [('db', [')('], {})])
+
+    def test_unknown(self):
+        # Unknown args
+        assert markers('db(5)', [('db', None, None)]) is None
+        assert markers('db', [('db', None, None)]) is True
+        assert markers('db and not slow', [('db', None, None)]) is True
+        # Unknown markers, unless the rest decides it
+        assert markers('slow', None) is None
+        assert markers('not slow', None) is None
+        assert compile_expression('a and b', 'keywords').evaluate(lambda term: {'a': None, 'b': False}[term]) is False
+        assert compile_expression('a or b', 'keywords').evaluate(lambda term: {'a': None, 'b': True}[term]) is True
+        assert compile_expression('a or b', 'keywords').evaluate(lambda term: {'a': None, 'b': False}[term]) is None
+
+    def test_errors(self):
+        for kind, source in [
+            ('keywords', 'foo bar'),
+            ('keywords', '(foo'),
+            ('keywords', 'foo and'),
+            ('keywords', 'not'),
+            ('keywords', 'foo)'),
+            ('markers', 'db(x)'),
+            ('markers', 'db(5'),
+            ('markers', 'db[5'),
+            ('markers', 'db.x'),
+        ]:
+            with self.assertRaises(ExpressionError):
+                compile_expression(source, kind)
+
+    def test_pickle(self):
+        expression = pickle.loads(pickle.dumps(compile_expression('slow and not db', 'markers')))
+        assert expression.matches_markers([('slow', [], {})])
+        assert not expression.matches_markers([('slow', [], {}), ('db', [], {})])
@@ -0,0 +1,73 @@
+import os
+import sys
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett import main
+from hammett.impl import fixtures
+from tests.helpers import write
+
+
+class FootprintTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.orig_cwd = os.getcwd()
+        self.orig_fixtures = fixtures.copy()
+
+    def tearDown(self) -> None:
+        os.chdir(self.orig_cwd)
+        fixtures.clear()
+        fixtures.update(self.orig_fixtures)
+        for name in [x for x in sys.modules if x.partition('.')[0] == 'footprint_project']:
+            sys.modules.pop(name, None)
+
+    def test_only_affected_tests_run_again(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'footprint_project'))
+            os.mkdir(join(d, 'tests'))
+            write(join(d, 'setup.cfg'), '[hammett]\nmodules=footprint_project\n')
+            write(join(d, 'footprint_project', '__init__.py'), '')
+            write(join(d, 'footprint_project', 'a.py'), 'def a():\n    return 1\n')
+            write(join(d, 'footprint_project', 'b.py'), 'def b():\n    return 2\n\n\nCONSTANT = 3\n')
+            write(join(d, 'tests', 'test_foo.py'), 'from footprint_project.a import a\nfrom footprint_project.b import b\n\n\ndef test_a():\n    assert a() == 1\n\n\ndef test_b():\n    assert b() == 2\n')
+            write(join(d, 'tests', 'test_bar.py'), 'from footprint_project.b import CONSTANT\n\n\ndef test_constant():\n    assert CONSTANT == 3\n')
+
+            def run():
+                ran = []
+                assert main(cwd=d, quiet=True, use_cache=True, pre_test_callback=lambda name, **_: ran.append(name)) == 0
+                return sorted(ran)
+
+            assert run() == ['tests/test_bar.py::test_constant', 'tests/test_foo.py::test_a', 'tests/test_foo.py::test_b']
+            assert run() == []
+
+            write(join(d, 'footprint_project', 'a.py'), 'def a():\n    return 0 + 1\n')
+            assert run() == ['tests/test_foo.py::test_a']
+
+            # test_bar.py imports a value from b.py, so it depends on all of it
+            write(join(d, 'footprint_project', 'b.py'), 'def b():\n    return 1 + 1\n\n\nCONSTANT = 3\n')
+            assert run() == ['tests/test_bar.py::test_constant', 'tests/test_foo.py::test_b']
+
+            write(join(d, 'tests', 'test_foo.py'), 'def test_a():\n    pass\n')
+            assert run() == ['tests/test_foo.py::test_a']
+
+    def test_imported_values(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'footprint_project'))
+            os.mkdir(join(d, 'tests'))
+            write(join(d, 'setup.cfg'), '[hammett]\nmodules=footprint_project\n')
+            write(join(d, 'footprint_project', '__init__.py'), '')
+            write(join(d, 'footprint_project', 'a.py'), 'from footprint_project.c import TABLE\n\n\ndef a():\n    return TABLE[0]\n')
+            write(join(d, 'footprint_project', 'b.py'), 'def b():\n    return 2\n')
+            write(join(d, 'footprint_project', 'c.py'), 'TABLE = [1]\n')
+            write(join(d, 'tests', 'test_foo.py'), 'from footprint_project.a import a\nfrom footprint_project.b import b\n\n\ndef test_a():\n    assert a() == 1\n\n\ndef test_b():\n    assert b() == 2\n')
+
+            def run():
+                ran = []
+                assert main(cwd=d, quiet=True, use_cache=True, pre_test_callback=lambda name, **_: ran.append(name)) == 0
+                return sorted(ran)
+
+            assert run() == ['tests/test_foo.py::test_a', 'tests/test_foo.py::test_b']
+
+            # test_a executes a.py, which imports a value from c.py
+            write(join(d, 'footprint_project', 'c.py'), 'TABLE = [1, 2]\n')
+            assert run() == ['tests/test_foo.py::test_a']
@@ -0,0 +1,48 @@
+import os
+import unittest
+from os.path import (
+    abspath,
+    dirname,
+    join,
+)
+
+from hammett import ForkServer
+from hammett.impl import fixtures
+
+suites_base = join(dirname(abspath(__file__)), 'suites')
+
+
+class ForkServerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.orig_cwd = os.getcwd()
+        self.orig_fixtures = fixtures.copy()
+
+    def tearDown(self) -> None:
+        os.chdir(self.orig_cwd)
+        fixtures.clear()
+        fixtures.update(self.orig_fixtures)
+
+    def test_run_all(self):
+        server = ForkServer(cwd=join(suites_base, 'suite_2_skipif'))
+        run_result = server.run()
+        assert run_result.exit_code == 1
+        assert {k: v.status for k, v in run_result.results.items()} == {
+            'tests/test_foo.py::test_foo': 'skipped',
+            'tests/test_foo.py::test_bar': 'failed',
+        }
+        assert 'AssertionError' in run_result.results['tests/test_foo.py::test_bar'].stack_trace
+
+        # Runs don't affect each other
+        assert server.run().results.keys() == run_result.results.keys()
+
+    def test_run_subset(self):
+        server = ForkServer(cwd=join(suites_base, 'suite_3_parametrize'))
+        run_result = server.run(tests=['tests/test_foo.py::test_foo[foo=1]', 'tests/test_foo.py::test_foo[foo=3]'])
+        assert run_result.exit_code == 0
+        assert {k: v.status for k, v in run_result.results.items()} == {
+            'tests/test_foo.py::test_foo[foo=1]': 'success',
+            'tests/test_foo.py::test_foo[foo=3]': 'success',
+        }
+
+        run_result = server.run(tests=['tests/test_foo.py::test_foo'])
+        assert len(run_result.results) == 5
@@ -0,0 +1,72 @@
+import os
+import shutil
+import subprocess
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett import (
+    collect_file_data,
+    new_result_db,
+)
+from hammett.git import collect_file_data_from_git
+from tests.helpers import write
+
+
+def git(*args):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@unittest.skipIf(shutil.which('git') is None, 'needs git')
+class GitTests(unittest.TestCase):
+    def setUp(self):
+        self.orig_cwd = os.getcwd()
+        self.dir = TemporaryDirectory()
+        os.chdir(self.dir.name)
+
+    def tearDown(self):
+        os.chdir(self.orig_cwd)
+        self.dir.cleanup()
+
+    def test_not_a_checkout(self):
+        assert collect_file_data_from_git('.', new_result_db()) is None
+
+    def test_collect_file_data_from_git(self):
+        git('init', '-q')
+        os.mkdir('lib')
+        write(join('lib', 'a.py'), 'a = 1\n')
+        write(join('lib', 'b.py'), 'b = 1\n')
+        write('notes.txt', 'foo\n')
+        git('add', '.')
+        git('commit', '-q', '-m', 'first')
+
+        # The first run looks at everything
+        result_db = new_result_db()
+        result_db['file_data'] = collect_file_data_from_git('.', result_db)
+        assert result_db['file_data'] == collect_file_data('.')
+
+        # A change that isn't committed, and a new file
+        write(join('lib', 'a.py'), 'a = 2\n')
+        write(join('lib', 'c.py'), 'c = 1\n')
+        result_db['file_data'] = collect_file_data_from_git('.', result_db)
+        assert result_db['file_data'] == collect_file_data('.')
+        assert result_db['git']['uncommitted'] == {'lib/a.py', 'lib/c.py'}
+
+        # Reverting the change makes the file clean again, which we only know from the last run
+        write(join('lib', 'a.py'), 'a = 1\n')
+        result_db['file_data'] = collect_file_data_from_git('.', result_db)
+        assert result_db['file_data'] == collect_file_data('.')
+
+        # Committed changes and deleted files
+        write(join('lib', 'b.py'), 'b = 2\n')
+        git('add', '.')
+        git('commit', '-q', '-m', 'second')
+        os.remove(join('lib', 'c.py'))
+        git('commit', '-q', '-a', '-m', 'third')
+        result_db['file_data'] = collect_file_data_from_git('.', result_db)
+        assert result_db['file_data'] == collect_file_data('.')
+        assert set(result_db['file_data']) == {join('lib', 'a.py'), join('lib', 'b.py')}
+
+        # Files that can't have changed aren't looked at
+        result_db['file_data'][join('lib', 'a.py')] = (0, 0, b'')
+        assert collect_file_data_from_git('.', result_db)[join('lib', 'a.py')] == (0, 0, b'')
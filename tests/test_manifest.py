@@ -0,0 +1,51 @@
+import os
+import subprocess
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett.manifest import cached_run
+from tests.helpers import (
+    run_hammett,
+    write,
+)
+
+
+class ManifestTests(unittest.TestCase):
+    def setUp(self):
+        self.orig_cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.orig_cwd)
+
+    def test_cached_run(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'tests'))
+            write(join(d, 'tests', 'test_foo.py'), 'def test_foo():\n    pass\n')
+
+            # The first run runs the tests, the second finds everything cached and writes the manifest
+            for _ in range(2):
+                run_hammett(d, '--use-cache', '1', stdout=subprocess.DEVNULL, check=True)
+            os.chdir(d)
+
+            def run(*args):
+                output = StringIO()
+                with redirect_stdout(output):
+                    exit_code = cached_run(list(args))
+                return exit_code, output.getvalue()
+
+            exit_code, output = run('--use-cache', '1')
+            assert exit_code == 0
+            assert '1 succeeded, 0 failed, 0 skipped' in output
+
+            assert run('--use-cache', '1', '-v') == (None, '')
+
+            write(join(d, 'tests', 'test_bar.py'), 'def test_bar():\n    pass\n')
+            assert run('--use-cache', '1') == (None, '')
+            os.remove(join(d, 'tests', 'test_bar.py'))
+            assert run('--use-cache', '1')[0] == 0
+
+            write(join(d, 'tests', 'test_foo.py'), 'def test_foo():\n    assert False\n')
+            assert run('--use-cache', '1') == (None, '')
@@ -102,4 +102,9 @@ class MiscTests(unittest.TestCase):
 }'''
 
     def test_parse_markers(self):
-        assert parse_markers('foo;bar[5]') == {'foo': None, 'bar': '5'}
+        markers = parse_markers('foo;bar[5]')
+        assert markers.matches_markers([('foo', [], {})])
+        assert markers.matches_markers([('bar', [5], {})])
+        assert not markers.matches_markers([('bar', [6], {})])
+        assert not markers.matches_markers([('baz', [], {})])
+        assert parse_markers(None) is None
@@ -0,0 +1,66 @@
+import os
+import unittest
+from os.path import (
+    abspath,
+    dirname,
+    join,
+)
+
+from hammett import (
+    g,
+    multi_process_main,
+)
+from hammett.pool import (
+    WorkQueues,
+    make_work_units,
+)
+
+suites_base = join(dirname(abspath(__file__)), 'suites')
+
+
+class PoolTests(unittest.TestCase):
+    def test_make_work_units(self):
+        units = make_work_units({'a.py': ['a1', 'a2', 'a3'], 'b.py': ['b1']}, processes=1)
+        assert units == [('a.py', ['a1']), ('a.py', ['a2']), ('a.py', ['a3']), ('b.py', ['b1'])]
+
+        units = make_work_units({'a.py': [str(x) for x in range(100)]}, processes=2)
+        assert len(units) == 8
+        assert [x for _, names in units for x in names] == [str(x) for x in range(100)]
+
+    def test_make_work_units_with_estimates(self):
+        estimates = {'a1': 10, 'a2': 1, 'a3': 1, 'b1': 1}
+        units = make_work_units({'a.py': ['a1', 'a2', 'a3'], 'b.py': ['b1']}, processes=1, estimates=estimates)
+        assert units == [('a.py', ['a1']), ('a.py', ['a2', 'a3']), ('b.py', ['b1'])]
+
+    def test_work_stealing(self):
+        queues = WorkQueues(['a', 'b', 'c', 'd', 'e', 'f'], 2)
+        assert queues.next_for(0) == 'a'
+        assert queues.next_for(0) == 'c'
+        assert queues.next_for(0) == 'e'
+        # worker 0 is out of work and steals from the back of the queue of worker 1
+        assert queues.next_for(0) == 'f'
+        assert queues.next_for(1) == 'b'
+        assert queues.next_for(1) == 'd'
+        assert queues.next_for(0) is None
+        assert queues.next_for(1) is None
+
+    def test_longest_first(self):
+        cost = dict(a=1, b=5, c=2, d=4).__getitem__
+        queues = WorkQueues(['a', 'b', 'c', 'd'], 2, cost=cost)
+        assert queues.next_for(0) == 'b'
+        assert queues.next_for(1) == 'd'
+        assert queues.next_for(1) == 'c'
+        assert queues.next_for(0) == 'a'
+
+    def test_multi_process_main(self):
+        orig_cwd = os.getcwd()
+        try:
+            assert multi_process_main(match=None, processes=2, cwd=join(suites_base, 'suite_1_one_success'), quiet=True) == 0
+            assert multi_process_main(match=None, processes=2, cwd=join(suites_base, 'suite_2_skipif'), quiet=True) == 1
+            assert g.results == {'success': 0, 'failed': 1, 'skipped': 1, 'abort': 0}
+            assert {k: v.status for k, v in g.result_db['test_results']['tests/test_foo.py'].items()} == {'test_foo': 'skipped', 'test_bar': 'failed'}
+            assert 'AssertionError' in g.result_db['test_results']['tests/test_foo.py']['test_bar'].stack_trace
+            assert 'Failed: tests/test_foo.py::test_bar' in ''.join(str(arg) + end for arg, end, _ in g.output)
+            assert multi_process_main(match=None, processes=2, cwd=join(suites_base, 'suite_1_no_tests_failure'), quiet=True) == 3
+        finally:
+            os.chdir(orig_cwd)
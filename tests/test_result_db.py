@@ -0,0 +1,204 @@
+import os
+import shutil
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett import (
+    collect_file_data,
+    load_result_db,
+    main_cli,
+    merge_result_dbs,
+    new_result_db,
+    save_result_db,
+)
+from hammett.impl import Result
+from hammett.store import (
+    UNLOADED,
+    connect,
+    save_changes,
+)
+from tests.helpers import (
+    run_hammett,
+    write,
+)
+
+
+def make_db(file_data, test_results, durations):
+    result_db = new_result_db()
+    result_db['file_data'] = file_data
+    for filename, results in test_results.items():
+        result_db['test_results'][filename].update({name: Result(status=status) for name, status in results.items()})
+    for filename, x in durations.items():
+        result_db['durations'][filename].update(x)
+    return result_db
+
+
+class ResultDbTests(unittest.TestCase):
+    def test_merge_result_dbs(self):
+        a = make_db(
+            file_data={'foo__tests.py': (10, 1, b'foo'), 'bar__tests.py': (10, 1, b'bar')},
+            test_results={'foo__tests.py': {'test_foo': 'success'}, 'bar__tests.py': {'test_bar': 'failed'}},
+            durations={'foo__tests.py': {'test_foo': 1.0}, 'bar__tests.py': {'test_bar': 2.0}},
+        )
+        # bar__tests.py has changed since a was recorded, and foo__tests.py was touched without changing
+        b = make_db(
+            file_data={'foo__tests.py': (10, 2, b'foo'), 'bar__tests.py': (11, 2, b'bar2')},
+            test_results={},
+            durations={'bar__tests.py': {'test_bar': 3.0}},
+        )
+        merged = merge_result_dbs([a, b])
+        assert merged['file_data'] == {'foo__tests.py': (10, 2, b'foo'), 'bar__tests.py': (11, 2, b'bar2')}
+        assert {k: {name: r.status for name, r in v.items()} for k, v in merged['test_results'].items()} == {'foo__tests.py': {'test_foo': 'success'}}
+        assert merged['durations'] == {'foo__tests.py': {'test_foo': 1.0}, 'bar__tests.py': {'test_bar': 3.0}}
+
+        # The input isn't modified
+        assert 'bar__tests.py' in a['test_results']
+
+    def test_merge_db_cli(self):
+        with TemporaryDirectory() as d:
+            a = make_db({'foo__tests.py': (10, 1, b'foo')}, {'foo__tests.py': {'test_foo': 'success'}}, {})
+            b = make_db({'bar__tests.py': (10, 1, b'bar')}, {'bar__tests.py': {'test_bar': 'success'}}, {})
+            save_result_db(a, join(d, 'a'))
+            save_result_db(b, join(d, 'b'))
+
+            assert main_cli(['merge-db', join(d, 'a'), join(d, 'b'), '-o', join(d, 'merged')]) == 0
+            assert set(load_result_db(join(d, 'merged'))['test_results']) == {'foo__tests.py', 'bar__tests.py'}
+
+            assert main_cli(['merge-db', join(d, 'does_not_exist')]) == 2
+
+    def test_results_survive_a_crash(self):
+        with TemporaryDirectory() as d:
+            write(join(d, 'tests', 'test_a.py'), 'def test_a():\n    pass\n\n\ndef test_b():\n    pass\n')
+            write(join(d, 'tests', 'test_b.py'), 'import os\n\n\ndef test_crash():\n    os._exit(3)\n')
+            assert run_hammett(d, '--use-cache', '1').returncode == 3
+
+            # The results are saved after each test file
+            result_db = load_result_db(join(d, '.hammett-db'))
+            assert set(result_db['test_results']['tests/test_a.py']) == {'test_a', 'test_b'}
+
+    def test_merge_dbs_of_runs(self):
+        with TemporaryDirectory() as d:
+            write(join(d, 'tests', 'test_a.py'), 'def test_a():\n    pass\n')
+            write(join(d, 'tests', 'test_b.py'), 'def test_b():\n    pass\n')
+            # Like two CI jobs, each running some of the tests. With -k the test files are parsed, so the dbs have
+            # inventories too.
+            for i, name in enumerate(['a', 'b'], start=1):
+                assert run_hammett(d, '--use-cache', '1', '-k', 'test_', join('tests', f'test_{name}.py')).returncode == 0
+                shutil.move(join(d, '.hammett-db'), join(d, f'{i}.db'))
+                for x in os.listdir(d):
+                    if x.startswith('.hammett-db'):
+                        os.remove(join(d, x))
+
+            assert main_cli(['merge-db', join(d, '1.db'), join(d, '2.db'), '-o', join(d, 'merged')]) == 0
+            merged = load_result_db(join(d, 'merged'))
+            assert {k: set(v) for k, v in merged['test_results'].items()} == {'tests/test_a.py': {'test_a'}, 'tests/test_b.py': {'test_b'}}
+            assert set(merged['inventories']) == {'tests/test_a.py', 'tests/test_b.py'}
+            assert [x.name for x in merged['inventories']['tests/test_a.py'][1].tests] == ['test_a']
+
+    def test_collect_file_data(self):
+        with TemporaryDirectory() as d:
+            with open(join(d, 'foo.py'), 'w') as f:
+                f.write('foo = 1\n')
+            with open(join(d, 'empty.py'), 'w'):
+                pass
+
+            file_data = collect_file_data(d)
+            size, mtime, h = file_data[join(d, 'foo.py')]
+            assert size == 8
+
+            # Touching a file doesn't change the hash
+            os.utime(join(d, 'foo.py'), ns=(mtime + 10_000_000, mtime + 10_000_000))
+            new_file_data = collect_file_data(d, file_data)
+            assert new_file_data[join(d, 'foo.py')] == (size, mtime + 10_000_000, h)
+            assert new_file_data[join(d, 'empty.py')] == file_data[join(d, 'empty.py')]
+
+            with open(join(d, 'foo.py'), 'w') as f:
+                f.write('foo = 2\n')
+            assert collect_file_data(d, new_file_data)[join(d, 'foo.py')][2] != h
+
+    def test_save_changes(self):
+        with TemporaryDirectory() as d:
+            filename = join(d, 'db')
+            result_db = make_db(
+                file_data={'foo__tests.py': (10, 1, b'foo')},
+                test_results={'foo__tests.py': {'test_a': 'success', 'test_b': 'success'}},
+                durations={},
+            )
+            save_result_db(result_db, filename)
+
+            result_db = load_result_db(filename)
+            assert set(result_db['test_results']['foo__tests.py']) == {'test_a', 'test_b'}
+            result_db['test_results']['foo__tests.py']['test_b'] = Result(status='failed')
+            result_db['stale_tests']['foo__tests.py'].add('test_c')
+            result_db['durations']['foo__tests.py']['test_b'] = 0.5
+
+            # Only the changed rows are written: the result is replaced (a delete and an insert, which both update the
+            # status counts), plus the stale test and the duration
+            conn = connect(filename)
+            before = conn.total_changes
+            save_changes(result_db, filename)
+            assert conn.total_changes - before == 6
+            save_changes(result_db, filename)
+            assert conn.total_changes - before == 6
+
+            result_db = load_result_db(filename)
+            assert {name: r.status for name, r in result_db['test_results']['foo__tests.py'].items()} == {'test_a': 'success', 'test_b': 'failed'}
+            assert result_db['stale_tests'] == {'foo__tests.py': {'test_c'}}
+            assert result_db['durations'] == {'foo__tests.py': {'test_b': 0.5}}
+
+            del result_db['test_results']['foo__tests.py']
+            save_changes(result_db, filename)
+            assert load_result_db(filename)['test_results'] == {}
+
+    def test_replace_old_db(self):
+        with TemporaryDirectory() as d:
+            filename = join(d, 'db')
+            # The dbs of older versions were pickled
+            with open(filename, 'wb') as f:
+                f.write(b'not an sqlite db')
+            assert load_result_db(filename)['file_data'] is None
+
+            save_result_db(make_db({'foo__tests.py': (10, 1, b'foo')}, {}, {}), filename)
+            assert load_result_db(filename)['file_data'] == {'foo__tests.py': (10, 1, b'foo')}
+
+    def test_payloads_are_loaded_lazily(self):
+        with TemporaryDirectory() as d:
+            filename = join(d, 'db')
+            result_db = make_db({'foo__tests.py': (10, 1, b'foo')}, {}, {})
+            result_db['test_results']['foo__tests.py']['test_a'] = Result(status='failed', stdout='out', stack_trace='trace')
+            result_db['test_results']['foo__tests.py']['test_b'] = Result(status='success')
+            save_result_db(result_db, filename)
+
+            results = load_result_db(filename)['test_results']['foo__tests.py']
+            assert results['test_a'].status == 'failed'
+            assert results['test_a']._payload is None
+            assert (results['test_a'].stdout, results['test_a'].stderr, results['test_a'].stack_trace) == ('out', '', 'trace')
+            assert results['test_b'].stdout == ''
+
+            # Replacing a result deletes its payload
+            result_db = load_result_db(filename)
+            result_db['test_results']['foo__tests.py']['test_a'] = Result(status='success')
+            save_changes(result_db, filename)
+            assert connect(filename).execute('SELECT count(*) FROM payloads').fetchone() == (0,)
+
+    def test_status_counts(self):
+        with TemporaryDirectory() as d:
+            filename = join(d, 'db')
+            save_result_db(make_db(
+                file_data={'foo__tests.py': (10, 1, b'foo'), 'bar__tests.py': (10, 1, b'bar')},
+                test_results={'foo__tests.py': {'test_a': 'success', 'test_b': 'failed'}, 'bar__tests.py': {'test_c': 'success'}},
+                durations={},
+            ), filename)
+
+            result_db = load_result_db(filename)
+            test_results = result_db['test_results']
+            assert test_results.status_counts() == {'success': 2, 'failed': 1}
+            assert test_results.status_counts('foo__tests.py') == {'success': 1, 'failed': 1}
+            # The counts come from the db, the results haven't been read
+            assert all(dict.__getitem__(test_results, x) is UNLOADED for x in test_results)
+
+            test_results['foo__tests.py']['test_b'] = Result(status='success')
+            assert test_results.status_counts() == {'success': 3}
+            save_changes(result_db, filename)
+            assert load_result_db(filename)['test_results'].status_counts('foo__tests.py') == {'success': 2}
@@ -0,0 +1,89 @@
+import os
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett import g
+from hammett.scan import (
+    is_ignored,
+    parse_rules,
+    scan,
+)
+from tests.helpers import write
+
+
+class ScanTests(unittest.TestCase):
+    def setUp(self):
+        self.orig_cwd = os.getcwd()
+        self.orig_settings = g.settings
+        g.settings = {}
+
+    def tearDown(self):
+        os.chdir(self.orig_cwd)
+        g.settings = self.orig_settings
+
+    def test_rules(self):
+        rules = parse_rules(['# comment', '', '*.gen.py', '/build', 'docs/_*/', '!keep.gen.py', 'a/**/b.py'], '')
+        assert is_ignored('foo.gen.py', False, rules)
+        assert is_ignored('x/foo.gen.py', False, rules)
+        assert not is_ignored('keep.gen.py', False, rules)
+        assert is_ignored('build', True, rules)
+        assert not is_ignored('x/build', True, rules)
+        assert is_ignored('docs/_static', True, rules)
+        assert not is_ignored('docs/_static', False, rules)
+        assert is_ignored('a/b.py', False, rules)
+        assert is_ignored('a/x/y/b.py', False, rules)
+        assert not is_ignored('foo.py', False, rules)
+
+        # Rules of a nested .gitignore only apply below it
+        rules = parse_rules(['/generated.py'], 'lib')
+        assert is_ignored('lib/generated.py', False, rules)
+        assert not is_ignored('generated.py', False, rules)
+        assert not is_ignored('lib/x/generated.py', False, rules)
+
+    def test_scan(self):
+        with TemporaryDirectory() as d:
+            os.chdir(d)
+            write('.gitignore', 'build/\n')
+            write(join('foo', '__init__.py'))
+            write(join('foo', 'bar.py'))
+            write(join('foo', '.gitignore'), 'generated.py\n')
+            write(join('foo', 'generated.py'))
+            write(join('foo', 'bar__tests.py'))
+            write(join('tests', 'conftest.py'))
+            write(join('tests', 'test_a.py'))
+            write(join('tests', 'sub', 'conftest.py'))
+            write(join('tests', 'sub', 'test_b.py'))
+            write(join('tests', 'helpers.py'))
+            write(join('tests', 'fixtures', 'test_data.py'))
+            write(join('build', 'lib', 'foo', 'bar.py'))
+            write(join('node_modules', 'x', 'test_x.py'))
+            write(join('venv', 'lib', 'test_y.py'))
+            g.settings = dict(exclude='\ntests/fixtures\n')
+
+            result = scan(['tests', 'foo'], '.')
+            assert result.test_files == [join('foo', 'bar__tests.py'), join('tests', 'sub', 'test_b.py'), join('tests', 'test_a.py')]
+            assert result.conftest_files == [join('tests', 'conftest.py'), join('tests', 'sub', 'conftest.py')]
+            assert sorted(result.files) == sorted([
+                join('foo', '__init__.py'),
+                join('foo', 'bar.py'),
+                join('foo', 'bar__tests.py'),
+                join('tests', 'conftest.py'),
+                join('tests', 'helpers.py'),
+                join('tests', 'sub', 'conftest.py'),
+                join('tests', 'sub', 'test_b.py'),
+                join('tests', 'test_a.py'),
+            ])
+            assert result.files[join('foo', 'bar.py')] == (0, os.stat(join('foo', 'bar.py')).st_mtime_ns)
+
+            # Only the test files, and the .gitignore of the working directory still applies
+            write(join('tests', 'build', 'test_c.py'))
+            result = scan(['tests'])
+            assert result.files == {}
+            assert result.test_files == [join('tests', 'sub', 'test_b.py'), join('tests', 'test_a.py')]
+
+            # Walking in threads finds the same things
+            g.settings = dict(exclude='tests/fixtures')
+            expected = scan(['tests', 'foo'], '.')
+            g.settings['scan_threads'] = '4'
+            assert scan(['tests', 'foo'], '.') == expected
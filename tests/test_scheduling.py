@@ -0,0 +1,56 @@
+import unittest
+
+from hammett.scheduling import (
+    DEFAULT_DURATION,
+    estimate_durations,
+    lpt_assign,
+    shard_filenames,
+)
+
+
+class SchedulingTests(unittest.TestCase):
+    def test_estimate_durations(self):
+        durations = {
+            'tests/test_a.py': {'test_known': 4.0, 'test_param[x=1]': 2.0, 'test_param[x=2]': 4.0},
+            'tests/test_b.py': {'test_b': 1.0},
+        }
+        assert estimate_durations([
+            'tests/test_a.py::test_known',
+            'tests/test_a.py::test_param[x=3]',
+            'tests/test_a.py::test_new',
+            'tests/test_b.py::test_b',
+            'tests/test_c.py::test_c',
+        ], durations) == {
+            'tests/test_a.py::test_known': 4.0,
+            'tests/test_a.py::test_param[x=3]': 3.0,
+            'tests/test_a.py::test_new': 10.0 / 3,
+            'tests/test_b.py::test_b': 1.0,
+            'tests/test_c.py::test_c': 3.0,
+        }
+
+    def test_estimate_durations_without_history(self):
+        assert estimate_durations(['tests/test_a.py::test_a'], {}) == {'tests/test_a.py::test_a': DEFAULT_DURATION}
+
+    def test_lpt_assign(self):
+        cost = dict(a=7, b=5, c=4, d=3, e=3).__getitem__
+        buckets, loads = lpt_assign(['a', 'b', 'c', 'd', 'e'], 2, cost)
+        assert buckets == [['a', 'd'], ['b', 'c', 'e']]
+        assert loads == [10, 12]
+
+    def test_shard_filenames(self):
+        filenames = ['tests/test_a.py', 'tests/test_b.py', 'tests/test_c.py', './tests/test_d.py']
+        durations = {
+            'tests/test_a.py': {'test_a': 5.0},
+            'tests/test_b.py': {'test_b': 3.0, 'test_b2': 1.0},
+            'tests/test_c.py': {'test_c': 2.0},
+            'tests/test_d.py': {'test_d': 1.0},
+        }
+        assert shard_filenames(filenames, 1, 2, durations) == ['./tests/test_d.py', 'tests/test_a.py']
+        assert shard_filenames(filenames, 2, 2, durations) == ['tests/test_b.py', 'tests/test_c.py']
+
+    def test_shard_filenames_without_history(self):
+        filenames = [f'tests/test_{i}.py' for i in range(20)]
+        shards = [shard_filenames(filenames, i, 3, {}) for i in (1, 2, 3)]
+        assert sorted(sum(shards, [])) == sorted(filenames)
+        # Adding a file doesn't move the others to another shard
+        assert shard_filenames(filenames + ['tests/test_new.py'], 2, 3, {}) in (shards[1], sorted(shards[1] + ['tests/test_new.py']))
@@ -0,0 +1,108 @@
+import os
+import sys
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import hammett.shared_cache
+from hammett import g
+from hammett.shared_cache import (
+    environment_fingerprint,
+    evict,
+    read,
+)
+from tests.helpers import (
+    run_hammett,
+    write,
+)
+
+
+class SharedCacheTests(unittest.TestCase):
+    def test_checkouts(self):
+        with TemporaryDirectory() as d:
+            runs = join(d, 'runs')
+
+            def checkout(name, value):
+                path = join(d, name)
+                write(join(path, 'setup.cfg'), f'[hammett]\nshared_cache={join(d, "cache")}\n')
+                write(join(path, 'helper.py'), f'def value():\n    return {value}\n')
+                write(join(path, 'tests', 'test_foo.py'), f'from helper import value\n\n\ndef test_foo():\n    with open({runs!r}, "a") as f:\n        f.write("x")\n    assert value() == 1\n')
+                return path
+
+            def run(path):
+                return run_hammett(path, '--use-cache', '1').stdout
+
+            def run_count():
+                with open(runs) as f:
+                    return len(f.read())
+
+            assert '1 succeeded, 0 failed' in run(checkout('a', 1))
+            assert run_count() == 1
+
+            # Another checkout of the same code gets the results from the shared cache
+            assert '1 succeeded, 0 failed' in run(checkout('b', 1))
+            assert run_count() == 1
+
+            # But not if a file the test depends on is different
+            assert '0 succeeded, 1 failed' in run(checkout('c', 2))
+            assert run_count() == 2
+
+            # Failures are shared too
+            assert '0 succeeded, 1 failed' in run(checkout('d', 2))
+            assert run_count() == 2
+
+    def test_evict(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'results'))
+            for i, name in enumerate(['old', 'middle', 'new']):
+                path = join(d, 'results', name)
+                write(path, 'x' * 10)
+                os.utime(path, (i, i))
+
+            evict(d, 20)
+            assert sorted(os.listdir(join(d, 'results'))) == ['middle', 'new']
+
+    def test_environment_fingerprint(self):
+        orig_cwd, orig_path = os.getcwd(), list(sys.path)
+        orig_source_location, orig_modules = g.source_location, g.modules
+        with TemporaryDirectory() as d:
+            project = join(d, 'app')
+            site_packages = join(project, '.venv', 'lib', 'site-packages')
+            os.makedirs(join(site_packages, 'foo-1.0.dist-info'))
+            os.makedirs(join(project, 'lib'))
+            # Next to the project, but not in it
+            os.makedirs(join(d, 'app2'))
+            try:
+                os.chdir(project)
+                g.source_location, g.modules = 'lib', []
+                sys.path[:0] = [project, join(project, 'lib'), site_packages, join(d, 'app2')]
+
+                def fingerprint():
+                    hammett.shared_cache._environment_fingerprint = None
+                    return environment_fingerprint()
+
+                before = fingerprint()
+                write(join(project, 'lib', 'foo.py'), '')
+                write(join(project, 'bar.py'), '')
+                assert fingerprint() == before
+
+                # Upgrading a package in a virtualenv inside the project changes it
+                os.rename(join(site_packages, 'foo-1.0.dist-info'), join(site_packages, 'foo-2.0.dist-info'))
+                upgraded = fingerprint()
+                assert upgraded != before
+
+                write(join(d, 'app2', 'baz.py'), '')
+                assert fingerprint() != upgraded
+            finally:
+                os.chdir(orig_cwd)
+                sys.path[:] = orig_path
+                g.source_location, g.modules = orig_source_location, orig_modules
+                hammett.shared_cache._environment_fingerprint = None
+
+    def test_entries_are_not_pickles(self):
+        import pickle
+        with TemporaryDirectory() as d:
+            path = join(d, 'entry')
+            with open(path, 'wb') as f:
+                pickle.dump(dict(results={}), f)
+            assert read(path) is None
@@ -0,0 +1,57 @@
+import os
+import shutil
+import unittest
+from os.path import (
+    abspath,
+    dirname,
+    join,
+)
+from tempfile import TemporaryDirectory
+
+from hammett import (
+    g,
+    subinterpreters_main,
+)
+from hammett.subinterpreters import is_unsupported_in_subinterpreter
+from tests.helpers import (
+    run_hammett,
+    write,
+)
+
+suites_base = join(dirname(abspath(__file__)), 'suites')
+
+
+class SubinterpretersTests(unittest.TestCase):
+    def test_is_unsupported_in_subinterpreter(self):
+        assert is_unsupported_in_subinterpreter(ImportError('module _ctypes does not support loading in subinterpreters'))
+        assert not is_unsupported_in_subinterpreter(ImportError('No module named foo'))
+
+    def test_subinterpreters_main(self):
+        # On Pythons without per-interpreter GIL this falls back to the worker pool, so this should pass either way
+        orig_cwd = os.getcwd()
+        try:
+            assert subinterpreters_main(match=None, processes=2, cwd=join(suites_base, 'suite_2_skipif'), quiet=True) == 1
+            assert g.results == {'success': 0, 'failed': 1, 'skipped': 1, 'abort': 0}
+            assert {k: v.status for k, v in g.result_db['test_results']['tests/test_foo.py'].items()} == {'test_foo': 'skipped', 'test_bar': 'failed'}
+        finally:
+            os.chdir(orig_cwd)
+
+    def test_output_is_printed_once(self):
+        with TemporaryDirectory() as d:
+            shutil.copytree(join(suites_base, 'suite_2_skipif', 'tests'), join(d, 'tests'))
+            output = run_hammett(d, '-v', '--subinterpreters', '2').stdout
+            lines = [x for x in output.splitlines() if x.startswith('tests/test_foo.py::')]
+            assert len(lines) == 2, output
+            assert output.count('Failed: tests/test_foo.py::test_bar') == 1, output
+
+    def test_use_cache(self):
+        with TemporaryDirectory() as d:
+            write(join(d, 'helper.py'), 'VALUE = 1\n')
+            write(join(d, 'tests', 'test_foo.py'), 'from helper import VALUE\n\n\ndef test_foo():\n    assert VALUE == 1\n')
+            output = run_hammett(d, '--use-cache', '1', '--subinterpreters', '2').stdout
+            assert '1 succeeded, 0 failed' in output, output
+
+            # The subinterpreters record what the test files import, so the cached result isn't used
+            write(join(d, 'helper.py'), 'VALUE = 2\n')
+            output = run_hammett(d, '--use-cache', '1', '--subinterpreters', '2').stdout
+            assert '0 succeeded, 1 failed' in output, output
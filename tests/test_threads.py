@@ -0,0 +1,62 @@
+import os
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett import (
+    g,
+    main,
+)
+from hammett.impl import fixtures
+
+TEST_FILE = '''
+import threading
+import time
+
+import hammett
+
+pytestmark = hammett.mark.thread_safe
+
+created = []
+barrier = threading.Barrier(4, timeout=10)
+
+
+@hammett.fixture(scope='session')
+def expensive():
+    time.sleep(0.1)
+    created.append(1)
+    return len(created)
+
+
+@hammett.mark.parametrize('x', [1, 2, 3, 4])
+def test_concurrent(x, expensive, capsys):
+    # All four cases have to be running at the same time to get past this
+    barrier.wait()
+    print(x)
+    assert capsys.readouterr().out == f'{x}\\n'
+    assert expensive == 1
+    assert x != 4
+'''
+
+
+class ThreadsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.orig_cwd = os.getcwd()
+        self.orig_fixtures = fixtures.copy()
+
+    def tearDown(self) -> None:
+        os.chdir(self.orig_cwd)
+        fixtures.clear()
+        fixtures.update(self.orig_fixtures)
+
+    def test_threads(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'tests'))
+            with open(join(d, 'tests', 'test_threads.py'), 'w') as f:
+                f.write(TEST_FILE)
+
+            assert main(cwd=d, quiet=True, threads=4) == 1
+            assert g.results == {'success': 3, 'failed': 1, 'skipped': 0, 'abort': 0}
+            result = g.result_db['test_results']['tests/test_threads.py']['test_concurrent[x=4]']
+            assert result.stdout == '4\n'
+            assert 'assert x != 4' in result.stack_trace
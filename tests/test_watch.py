@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from hammett.watch import snapshot
+from tests.helpers import (
+    hammett_env,
+    write,
+)
+
+
+class WatchTests(unittest.TestCase):
+    def test_snapshot(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'venv'))
+            write(join(d, 'venv', 'foo.py'), '')
+            write(join(d, 'foo.py'), 'foo = 1\n')
+            write(join(d, 'foo.txt'), '')
+            assert set(snapshot(d)) == {join(d, 'foo.py')}
+
+    def test_watch(self):
+        with TemporaryDirectory() as d:
+            os.mkdir(join(d, 'tests'))
+            write(join(d, 'helper.py'), 'def value():\n    return 1\n')
+            write(join(d, 'tests', 'test_foo.py'), 'from helper import value\n\n\ndef test_foo():\n    assert value() == 1\n')
+            # test_bar counts its runs
+            write(join(d, 'tests', 'test_bar.py'), 'def test_bar():\n    with open("runs", "a") as f:\n        f.write("x")\n')
+
+            watcher = subprocess.Popen(
+                [sys.executable, '-m', 'hammett', '--watch'],
+                cwd=d,
+                env=hammett_env(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+            )
+            try:
+                def next_run():
+                    lines = []
+                    for line in watcher.stdout:
+                        if 'waiting for changes' in line:
+                            return ''.join(lines)
+                        lines.append(line)
+                    raise AssertionError(''.join(lines))
+
+                assert '2 succeeded, 0 failed, 0 skipped' in next_run()
+
+                # Only the test that calls the changed function runs again
+                write(join(d, 'helper.py'), 'def value():\n    return 2\n')
+                assert '1 succeeded, 1 failed, 0 skipped' in next_run()
+
+                write(join(d, 'helper.py'), 'def value():\n    return 1\n')
+                assert '2 succeeded, 0 failed, 0 skipped' in next_run()
+
+                with open(join(d, 'runs')) as f:
+                    assert f.read() == 'x'
+            finally:
+                watcher.terminate()
+                watcher.wait()
+                watcher.stdout.close()